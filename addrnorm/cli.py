@@ -0,0 +1,168 @@
+from __future__ import annotations
+import argparse, os, time
+from typing import Optional
+
+from .logging_cfg.setup import setup_logging
+from .io.batch import CheckpointMismatch, run_batch
+from .io.output import infer_compression
+from .io.writer import parse_fields
+from .libpostal.client import get_client
+from .libpostal.router import parse_thresholds
+from .qa.consistency import get_index
+from .qa.reports import save_examples_txt
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m addrnorm", description="AddrNormalizer — пакетная нормализация CSV")
+    ap.add_argument("input", help="входной CSV (.csv, .csv.gz, .csv.zst) или база SQLite (с --sqlite-table)")
+    ap.add_argument("-o", "--output", help="путь результата (по умолчанию data/output/addrnorm_<ts>.csv); "
+                                           ".gz/.zst — сжатие в фоне")
+    ap.add_argument("--compress", choices=["gzip", "zstd"], help="сжать результат (добавит .gz/.zst к пути)")
+    ap.add_argument("--output-mode", choices=["addr-only", "extended"], default="addr-only")
+    ap.add_argument("--fields", help="только эти колонки результата через запятую (zip_norm, zip_valid, "
+                                     "country_norm, country_iso2, ...): считаются только нужные им этапы")
+    ap.add_argument("--use-libpostal", action="store_true", help="пост-обработка через libpostal REST")
+    ap.add_argument("--libpostal-url", default="http://localhost:8080",
+                    help="URL libpostal-rest; несколько инстансов — через запятую")
+    ap.add_argument("--libpostal-balance", choices=["least_inflight", "latency"], default="least_inflight",
+                    help="балансировка между инстансами: меньше запросов в полёте или меньше задержка")
+    ap.add_argument("--libpostal-gate", nargs="?", const="default", metavar="THRESHOLDS",
+                    help="в libpostal только строки с низкой локальной уверенностью; пороги по компонентам "
+                         "zip/country/street/locality, например zip=1,country=0.5 (без значения — по умолчанию)")
+    ap.add_argument("--zip-index", metavar="PATH",
+                    help="индекс ZIP ↔ населённый пункт/регион (python -m addrnorm.qa.consistency): "
+                         "колонка zip_consistency с результатом проверки")
+    ap.add_argument("--fill-locality", action="store_true", help="с --zip-index: заполнять пустой населённый пункт по ZIP")
+    ap.add_argument("--logs-dir", default="logs")
+    ap.add_argument("--log-json", action="store_true", help="лог-файл в JSON-lines (run_id, chunk_id, метрики этапов)")
+    ap.add_argument("--chunk-rows", type=int, default=100_000, help="строк в чанке (чекпоинт после каждого)")
+    ap.add_argument("--sqlite-table", help="нормализовать таблицу SQLite (input — путь к базе) в <table>_norm")
+    ap.add_argument("--sqlite-key", default="id", help="ключевая колонка таблицы (keyset-пагинация, upsert)")
+    ap.add_argument("--sink-table", help="таблица результатов (по умолчанию <table>_norm)")
+    ap.add_argument("--force", action="store_true", help="SQLite: обработать все строки, не сверяя хэш источника")
+    ap.add_argument("--memory-budget", type=float, metavar="MB",
+                    help="бюджет памяти процесса, МБ: размер чанка подбирается по замеренной стоимости строки")
+    ap.add_argument("--resume", action="store_true",
+                    help="продолжить прерванный прогон с последнего зафиксированного чанка")
+    ap.add_argument("--checkpoint-dir", help="каталог чекпоинта (по умолчанию data/checkpoints/job_<hash>)")
+    ap.add_argument("--dry-run", action="store_true",
+                    help="не обрабатывать файл, а оценить время/изменения/память по стратифицированной выборке")
+    ap.add_argument("--sample-size", type=int, default=5000, help="размер выборки для --dry-run")
+    ap.add_argument("--memory-target-mb", type=float, default=1024.0,
+                    help="целевая память для рекомендации chunk_size в --dry-run")
+    return ap
+
+def run_dry(args, logger) -> int:
+    from .qa.dryrun import estimate_file
+    rep = estimate_file(
+        args.input, output_mode=args.output_mode, use_libpostal=args.use_libpostal,
+        libpostal_url=args.libpostal_url, libpostal_thresholds=args.libpostal_gate,
+        sample_size=args.sample_size,
+        memory_target_mb=args.memory_target_mb,
+    )
+    for line in rep.to_lines():
+        print(line)
+    logger.info("Dry-run %s: %s rows, est %.1fs", args.input, rep.total_rows, rep.est_runtime_s)
+    return 0
+
+def _output_path(args) -> Optional[str]:
+    path = args.output
+    if not args.compress:
+        return path
+    if not path and args.resume:
+        return None  # путь возьмётся из чекпоинта
+    path = path or os.path.join("data", "output", f"addrnorm_{int(time.time())}.csv")
+    if infer_compression(path) is None:
+        path += ".gz" if args.compress == "gzip" else ".zst"
+    return path
+
+def run(args, logger) -> int:
+    try:
+        res = run_batch(
+            args.input, output_path=_output_path(args), output_mode=args.output_mode,
+            use_libpostal=args.use_libpostal, libpostal_url=args.libpostal_url,
+            chunk_rows=args.chunk_rows, resume=args.resume, checkpoint_dir=args.checkpoint_dir,
+            memory_budget_mb=args.memory_budget, fields=args.fields, libpostal_thresholds=args.libpostal_gate,
+            zip_index=args.zip_index, fill_locality=args.fill_locality,
+        )
+    except CheckpointMismatch as e:
+        logger.error("%s", e)
+        return 2
+    logger.info("Processed %s rows in %.2fs (mode=%s, libpostal=%s, chunks=%s, resumed from row %s) → %s",
+                res.rows, res.elapsed_s, args.output_mode, args.use_libpostal,
+                res.chunks, res.resumed_from_row, res.output_path)
+    if args.use_libpostal and args.libpostal_gate:
+        _log_routing(logger, res.stats)
+    if args.zip_index:
+        _log_zip_check(logger, res.stats)
+    if res.chunk_metrics:
+        sizes = [m["rows"] for m in res.chunk_metrics]
+        logger.info("Chunks: %s..%s rows, peak RSS %.0f MB%s", min(sizes), max(sizes), res.peak_rss_bytes / 2**20,
+                    f" (budget {args.memory_budget:.0f} MB)" if args.memory_budget else "")
+
+    examples_path = save_examples_txt(res.report_lines, logs_dir=args.logs_dir)
+    logger.info("Examples: %s", examples_path)
+    return 0
+
+def _log_routing(logger, stats: dict):
+    rows, routed = stats.get("libpostal_rows", 0), stats.get("libpostal_routed_rows", 0)
+    calls, avoided = stats.get("libpostal_calls", 0), stats.get("libpostal_calls_avoided", 0)
+    logger.info("libpostal routing: %s of %s rows below confidence thresholds, %s calls, %s avoided (%.0f%%)",
+                routed, rows, calls, avoided, 100.0 * avoided / (calls + avoided) if calls + avoided else 0.0)
+
+def _log_zip_check(logger, stats: dict):
+    logger.info("ZIP consistency: %s rows checked, %s inconsistent, %s ZIPs not in index, %s localities filled",
+                stats.get("zip_checked", 0), stats.get("zip_inconsistent", 0), stats.get("zip_unknown", 0),
+                stats.get("locality_filled", 0))
+
+def run_sqlite(args, logger) -> int:
+    from .io.sqlite import connect, sync_table
+    conn = connect(args.input)
+    try:
+        res = sync_table(
+            conn, args.sqlite_table, key=args.sqlite_key, sink_table=args.sink_table,
+            output_mode=args.output_mode, use_libpostal=args.use_libpostal, libpostal_url=args.libpostal_url,
+            batch_size=args.chunk_rows, force=args.force, fields=args.fields,
+            libpostal_thresholds=args.libpostal_gate, zip_index=args.zip_index, fill_locality=args.fill_locality,
+        )
+    finally:
+        conn.close()
+    logger.info("SQLite %s.%s: %s rows scanned, %s processed, %s unchanged in %.2fs (%s batches)",
+                args.input, args.sqlite_table, res.scanned, res.processed, res.skipped, res.elapsed_s, res.batches)
+    if args.use_libpostal and args.libpostal_gate:
+        _log_routing(logger, res.stats)
+    if args.zip_index:
+        _log_zip_check(logger, res.stats)
+    return 0
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = build_parser()
+    args = ap.parse_args(argv)
+    try:
+        args.fields = parse_fields(args.fields)
+        args.libpostal_gate = parse_thresholds(args.libpostal_gate)
+    except ValueError as e:
+        ap.error(str(e))
+    if args.dry_run and args.sqlite_table:
+        ap.error("--dry-run оценивает CSV-файлы, с --sqlite-table не совместим")
+    if args.fields and "zip_consistency" in args.fields and not args.zip_index:
+        ap.error("--fields zip_consistency требует --zip-index")
+    if args.zip_index:
+        try:
+            get_index(args.zip_index)
+        except (OSError, ValueError) as e:
+            ap.error(f"--zip-index: {e}")
+    logger = setup_logging(logs_dir=args.logs_dir, level="INFO", json_format=args.log_json)
+    if args.use_libpostal:
+        lp = get_client(args.libpostal_url, balance=args.libpostal_balance)
+        logger.info("libpostal: %s instance(s), balance=%s", len(lp.endpoints), lp.balance)
+    if args.dry_run:
+        rc = run_dry(args, logger)
+    elif args.sqlite_table:
+        rc = run_sqlite(args, logger)
+    else:
+        rc = run(args, logger)
+    if args.use_libpostal:
+        for st in lp.stats():
+            logger.info("libpostal %(url)s: %(requests)s req, %(errors)s err, %(latency_ms)s ms, %(rps)s rps, "
+                        "healthy=%(healthy)s", st)
+    return rc
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import hashlib, json, logging, os, shutil, tempfile, time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+from .reader import iter_csv_chunks
+from .writer import parse_fields, process_dataframe
+from ..libpostal.router import parse_thresholds
+from ..qa.consistency import get_index
+from ..qa.reports import ORDER, change_lines, build_report_from_files
+from ..rules.registry import get_profile_fingerprint
+from ..logging_cfg.setup import log_context
+from .memory import ChunkSizer, RssSampler, rss_bytes
+from .output import ChunkedCsvWriter, infer_compression
+
+# Пакетный прогон файла чанками с чекпоинтом после каждого чанка.
+# Каталог чекпоинта: state.json + строки изменений по колонкам (changes_<col>.txt);
+# результат пишется в <output>.part и переименовывается в <output> в конце
+# (.gz/.zst — сжатие в фоне, по отдельному gzip-члену / zstd-кадру на чанк).
+# После сбоя --resume обрезает .part и файлы изменений до последнего
+# зафиксированного размера и продолжает с сохранённого смещения во входе —
+# результат и отчёт байт-в-байт совпадают с непрерывным прогоном.
+
+STATE_VERSION = 1
+DEFAULT_CHECKPOINT_ROOT = os.path.join("data", "checkpoints")
+
+logger = logging.getLogger("addrnorm")
+
+class CheckpointMismatch(RuntimeError):
+    """Чекпоинт не подходит к текущему запуску (другой вход, профиль или параметры)."""
+
+@dataclass
+class BatchResult:
+    output_path: str
+    rows: int
+    chunks: int
+    resumed_from_row: int
+    elapsed_s: float
+    stats: dict = field(default_factory=dict)
+    report_lines: List[str] = field(default_factory=list)
+    chunk_metrics: List[dict] = field(default_factory=list)  # по чанку: rows, rows_per_s, rss/peak, next_rows
+    peak_rss_bytes: int = 0
+
+def checkpoint_dir_for(input_path: str, output_mode: str, root: str = DEFAULT_CHECKPOINT_ROOT) -> str:
+    key = hashlib.sha1(f"{os.path.abspath(input_path)}|{output_mode}".encode("utf-8")).hexdigest()[:12]
+    return os.path.join(root, f"job_{key}")
+
+def _input_stamp(path: str) -> dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+def _write_state(ckpt_dir: str, state: dict):
+    fd, tmp = tempfile.mkstemp(prefix=".state_", suffix=".tmp", dir=ckpt_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+            _fsync(f)
+        os.replace(tmp, os.path.join(ckpt_dir, "state.json"))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def load_state(ckpt_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(ckpt_dir, "state.json"), encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+def _check_state(state: dict, params: dict):
+    for key, expected in params.items():
+        if state.get(key) != expected:
+            raise CheckpointMismatch(
+                f"Чекпоинт не подходит: {key} = {state.get(key)!r}, сейчас {expected!r}. "
+                f"Запустите без --resume, чтобы начать заново."
+            )
+
+def _open_truncated(path: str, size: int):
+    """Файл для дозаписи, обрезанный до зафиксированного размера (хвост после сбоя отбрасывается)."""
+    f = open(path, "a+b")
+    f.truncate(size)
+    f.seek(size)
+    return f
+
+def _merge_stats(total: dict, chunk: dict):
+    for k, v in chunk.items():
+        if isinstance(v, dict):
+            _merge_stats(total.setdefault(k, {}), v)
+        else:
+            total[k] = total.get(k, 0) + v
+
+def run_batch(input_path: str, output_path: Optional[str] = None, output_mode: str = "addr-only",
+              use_libpostal: bool = False, libpostal_url: str = "http://localhost:8080",
+              chunk_rows: int = 100_000, resume: bool = False, checkpoint_dir: Optional[str] = None,
+              per_col_limit: int = 20, memory_budget_mb: Optional[float] = None,
+              fields: Optional[Sequence[str]] = None, libpostal_thresholds=None,
+              zip_index: Optional[str] = None, fill_locality: bool = False) -> BatchResult:
+    """
+    Обработка файла чанками с фиксацией после каждого чанка.
+    resume=True — продолжить с последнего зафиксированного чанка (output_path можно не указывать —
+    берётся из чекпоинта). Несовпадение входа, профиля или параметров — CheckpointMismatch.
+    memory_budget_mb — подбирать размер чанка по замеренной стоимости строки, чтобы пик RSS
+    оставался в бюджете (chunk_rows — верхняя граница стартового размера).
+    fields — только эти колонки результата (см. writer.FIELDS), считаются только нужные им этапы.
+    libpostal_thresholds — в libpostal только строки с уверенностью ниже порогов (libpostal.router).
+    zip_index — путь к индексу ZIP ↔ населённый пункт (qa.consistency): колонка zip_consistency;
+    fill_locality — заполнять пустой населённый пункт по ZIP.
+    """
+    fields = parse_fields(fields)
+    thresholds = parse_thresholds(libpostal_thresholds) if use_libpostal else None
+    ckpt_dir = checkpoint_dir or checkpoint_dir_for(input_path, output_mode)
+    params = {
+        "input": _input_stamp(input_path),
+        "output_mode": output_mode,
+        "fields": fields,
+        "use_libpostal": bool(use_libpostal),
+        "libpostal_url": libpostal_url if use_libpostal else None,
+        "libpostal_thresholds": thresholds,
+        "zip_index": get_index(zip_index).digest if zip_index else None,
+        "fill_locality": bool(fill_locality and zip_index),
+        "profile_fingerprint": get_profile_fingerprint(),
+    }
+
+    state = load_state(ckpt_dir) if resume else None
+    if state is not None:
+        _check_state(state, params)
+        if output_path and os.path.abspath(output_path) != state["output_path"]:
+            raise CheckpointMismatch(f"Чекпоинт пишет в {state['output_path']}, а не в {output_path}")
+        logger.info("Resume %s from row %s (offset %s, chunk %s)",
+                    input_path, state["rows_done"], state["input_offset"], state["chunks_done"])
+    else:
+        if resume:
+            logger.info("No checkpoint in %s — starting from scratch", ckpt_dir)
+        elif load_state(ckpt_dir) is not None:
+            logger.info("Discarding previous checkpoint %s", ckpt_dir)
+        shutil.rmtree(ckpt_dir, ignore_errors=True)
+        if not output_path:
+            output_path = os.path.join("data", "output", f"addrnorm_{int(time.time())}.csv")
+        state = {
+            "version": STATE_VERSION, **params,
+            "output_path": os.path.abspath(output_path),
+            "input_offset": 0, "rows_done": 0, "chunks_done": 0,
+            "output_bytes": 0, "changes_bytes": {col: 0 for col in ORDER},
+            "stats": {}, "elapsed_s": 0.0,
+        }
+    os.makedirs(ckpt_dir, exist_ok=True)
+    out_final = state["output_path"]
+    out_part = out_final + ".part"
+    os.makedirs(os.path.dirname(out_final) or ".", exist_ok=True)
+    spools = {col: os.path.join(ckpt_dir, f"changes_{col}.txt") for col in ORDER}
+    resumed_from = state["rows_done"]
+    stats = state["stats"]
+
+    sizer = None
+    if memory_budget_mb:
+        if rss_bytes() is None:
+            logger.warning("RSS is not measurable here (no psutil, no /proc) — memory budget ignored")
+        else:
+            sizer = ChunkSizer(int(memory_budget_mb * 1024 * 1024), initial_rows=min(chunk_rows, 20_000),
+                               min_rows=min(1_000, chunk_rows))
+    sampler = RssSampler().start()
+    chunk_metrics: List[dict] = []
+    peak_total = 0
+
+    out_f = _open_truncated(out_part, state["output_bytes"])
+    out_w = ChunkedCsvWriter(out_f, compression=infer_compression(out_final), header=state["output_bytes"] == 0)
+    spool_f = {col: _open_truncated(p, state["changes_bytes"].get(col, 0)) for col, p in spools.items()}
+    try:
+        t_run = t_prev = time.perf_counter()
+        elapsed0 = state["elapsed_s"]
+        baseline = rss_bytes() or 0
+        sampler.reset()
+        for df, offset in iter_csv_chunks(input_path, chunk_rows=sizer or chunk_rows,
+                                          start_offset=state["input_offset"],
+                                          address_only=output_mode == "extended" or fields is not None):
+            n = len(df)
+            chunk_stats: dict = {}
+            frames = 0
+            if n:
+                with log_context(chunk_id=state["chunks_done"] + 1):
+                    out, changes = process_dataframe(df, output_mode=output_mode, use_libpostal=use_libpostal,
+                                                     libpostal_url=libpostal_url, stats=chunk_stats,
+                                                     fields=fields, libpostal_thresholds=thresholds,
+                                                     zip_index=zip_index, fill_locality=fill_locality,
+                                                     measure_bytes=sizer is not None)
+                # тот же текст, что и у write_csv целиком: заголовок — только в первом чанке;
+                # сжатие идёт в фоне, пока пишутся строки изменений
+                out_w.write(out)
+                for col, lines in change_lines(changes, row_offset=state["rows_done"]).items():
+                    if lines:
+                        spool_f[col].write(("\n".join(lines) + "\n").encode("utf-8"))
+                # вход, результат и промежуточные Series этапов (замер — в process_dataframe)
+                frames = chunk_stats.pop("frame_bytes", 0)
+                out = changes = None
+            df = None  # чанк не должен дожить до чтения следующего
+
+            # сначала данные на диск, затем состояние: state.json никогда не опережает файлы
+            out_w.flush()
+            _fsync(out_f)
+            for f in spool_f.values():
+                _fsync(f)
+            state["input_offset"] = offset
+            state["rows_done"] += n
+            state["chunks_done"] += 1
+            state["output_bytes"] = out_f.tell()
+            state["changes_bytes"] = {col: f.tell() for col, f in spool_f.items()}
+            state["elapsed_s"] = elapsed0 + (time.perf_counter() - t_run)
+            _merge_stats(stats, chunk_stats)
+            _write_state(ckpt_dir, state)
+
+            now = time.perf_counter()
+            dt, t_prev = now - t_prev, now
+            peak = sampler.reset()
+            peak_total = max(peak_total, peak)
+            m = {"rows": n, "seconds": round(dt, 4), "rows_per_s": round(n / dt, 1) if dt > 0 else None,
+                 "rss_before_mb": round(baseline / 2**20, 1), "rss_peak_mb": round(peak / 2**20, 1)}
+            if sizer is not None:
+                m["frames_mb"] = round(frames / 2**20, 1)
+                m["next_rows"] = sizer.update(n, baseline, peak, frames)
+                m["bytes_per_row"] = round(sizer.per_row or 0)
+            chunk_metrics.append(m)
+            logger.info("Chunk %s: %s rows in %.2fs (%s rows/s, peak RSS %.0f MB%s), total %s",
+                        state["chunks_done"], n, dt, m["rows_per_s"], m["rss_peak_mb"],
+                        f", next {m['next_rows']} rows" if sizer is not None else "", state["rows_done"],
+                        extra={"chunk_id": state["chunks_done"], "metrics": {**m, **chunk_stats}})
+            baseline = rss_bytes() or 0
+    finally:
+        sampler.stop()
+        out_w.close()
+        out_f.close()
+        for f in spool_f.values():
+            f.close()
+
+    if state["output_bytes"] == 0:
+        # во входе нет ни одной записи — результат пустой
+        open(out_part, "wb").close()
+    report = build_report_from_files(spools, per_col_limit=per_col_limit)
+    os.replace(out_part, out_final)
+    shutil.rmtree(ckpt_dir, ignore_errors=True)
+    return BatchResult(
+        output_path=out_final, rows=state["rows_done"], chunks=state["chunks_done"],
+        resumed_from_row=resumed_from, elapsed_s=state["elapsed_s"], stats=stats, report_lines=report,
+        chunk_metrics=chunk_metrics, peak_rss_bytes=peak_total,
+    )
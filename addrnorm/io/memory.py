@@ -0,0 +1,107 @@
+from __future__ import annotations
+import os, sys, threading
+from typing import Iterable, Optional
+
+import pandas as pd
+
+# Память процесса для режима --memory-budget: RSS (psutil, иначе /proc/self/statm),
+# фоновый замер пика между чанками и подбор размера чанка под бюджет.
+
+def rss_bytes() -> Optional[int]:
+    """Текущий RSS процесса в байтах (None, если измерить нечем)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def frame_bytes(objs: Iterable) -> int:
+    """
+    Суммарный размер DataFrame/Series (deep — вместе со строками). dict — по значениям
+    (промежуточные узлы writer), list/tuple — по элементам: Series внутри или сами объекты.
+    """
+    total = 0
+    for o in objs:
+        if isinstance(o, pd.DataFrame):
+            total += int(o.memory_usage(deep=True, index=False).sum())
+        elif isinstance(o, pd.Series):
+            total += int(o.memory_usage(deep=True, index=False))
+        elif isinstance(o, dict):
+            total += frame_bytes(o.values())
+        elif isinstance(o, (list, tuple)):
+            if o and isinstance(o[0], (pd.DataFrame, pd.Series, dict, list, tuple)):
+                total += frame_bytes(o)
+            else:
+                # список значений по строкам: сам список + различные объекты в нём (короткие строки общие)
+                total += sys.getsizeof(o) + sum(sys.getsizeof(x) for x in {id(x): x for x in o}.values())
+    return total
+
+class RssSampler:
+    """Фоновый поток: пик RSS с последнего reset() (опрос раз в interval_s)."""
+
+    def __init__(self, interval_s: float = 0.02):
+        self.interval_s = interval_s
+        self._peak = rss_bytes() or 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="addrnorm-rss", daemon=True)
+
+    @property
+    def available(self) -> bool:
+        return rss_bytes() is not None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            cur = rss_bytes() or 0
+            with self._lock:
+                if cur > self._peak:
+                    self._peak = cur
+
+    def start(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def reset(self) -> int:
+        """Пик с прошлого reset(); новый отсчёт — от текущего RSS."""
+        cur = rss_bytes() or 0
+        with self._lock:
+            peak = max(self._peak, cur)
+            self._peak = cur
+        return peak
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+class ChunkSizer:
+    """
+    Размер следующего чанка под бюджет: baseline (RSS между чанками) + rows * стоимость строки
+    не выше budget * headroom. Стоимость строки — максимум из прироста пика RSS и размера
+    промежуточных Series на строку, сглаженный (рост — медленно, падение — сразу).
+    Рост ограничен x2 за шаг, уменьшение — без ограничений.
+    """
+
+    def __init__(self, budget_bytes: int, initial_rows: int = 20_000, min_rows: int = 1_000,
+                 max_rows: int = 1_000_000, headroom: float = 0.85):
+        self.budget_bytes = budget_bytes
+        self.rows = max(min_rows, min(initial_rows, max_rows))
+        self.min_rows, self.max_rows, self.headroom = min_rows, max_rows, headroom
+        self.per_row: Optional[float] = None
+
+    def __call__(self) -> int:
+        return self.rows
+
+    def update(self, rows: int, baseline_bytes: int, peak_bytes: int, frames_bytes: int = 0) -> int:
+        if rows <= 0:
+            return self.rows
+        cost = max(peak_bytes - baseline_bytes, frames_bytes, 1) / rows
+        self.per_row = cost if self.per_row is None or cost > self.per_row else 0.7 * self.per_row + 0.3 * cost
+        room = self.budget_bytes * self.headroom - baseline_bytes
+        target = int(room / self.per_row) if room > 0 else self.min_rows
+        self.rows = max(self.min_rows, min(self.max_rows, target, self.rows * 2))
+        return self.rows
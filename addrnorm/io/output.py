@@ -0,0 +1,161 @@
+from __future__ import annotations
+import contextlib, gzip, io, os, queue, tempfile, threading
+from typing import IO, Optional
+
+import pandas as pd
+
+# Потоковая запись результата: чанки DataFrame -> CSV-байты -> (сжатие в фоновом потоке) -> приёмник.
+# Каждый write() сжимается отдельным gzip-членом / zstd-кадром: их конкатенация — корректный
+# .gz/.zst, поэтому файл можно дописывать и обрезать по границе чанка (resume в io.batch).
+
+WRITE_CHUNK_ROWS = 100_000
+COMPRESSIONS = (None, "gzip", "zstd")
+
+def infer_compression(path: Optional[str]) -> Optional[str]:
+    n = (path or "").lower()
+    if n.endswith(".gz"):
+        return "gzip"
+    if n.endswith(".zst") or n.endswith(".zstd"):
+        return "zstd"
+    return None
+
+def _compressor(compression: Optional[str], level: Optional[int]):
+    if compression is None:
+        return lambda data: data
+    if compression == "gzip":
+        lvl = 6 if level is None else level
+        return lambda data: gzip.compress(data, compresslevel=lvl, mtime=0)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("Для записи .zst нужен пакет 'zstandard' (pip install zstandard)") from e
+        cctx = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return cctx.compress
+    raise ValueError(f"Неизвестное сжатие: {compression!r}")
+
+class ChunkedCsvWriter:
+    """
+    CSV по чанкам в бинарный приёмник (файл, BytesIO). Сериализация в CSV — в вызывающем
+    потоке, сжатие и запись — в фоновом; очередь ограничена max_pending чанками.
+    Ошибка фонового потока поднимается на следующем write()/flush().
+    """
+
+    def __init__(self, sink: IO[bytes], compression: Optional[str] = None, level: Optional[int] = None,
+                 header: bool = True, max_pending: int = 4):
+        self.sink = sink
+        self.compression = compression
+        self._compress = _compressor(compression, level)
+        self._header = header
+        self._q: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="addrnorm-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            try:
+                if item is None:
+                    return
+                if isinstance(item, threading.Event):
+                    item.set()
+                    continue
+                if self._error is None:
+                    self.sink.write(self._compress(item))
+            except BaseException as e:  # noqa: BLE001 — отдаём вызывающему потоку
+                self._error = e
+            finally:
+                self._q.task_done()
+
+    def _raise(self):
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def write(self, df: pd.DataFrame):
+        self._raise()
+        data = df.to_csv(index=False, header=self._header).encode("utf-8")
+        self._header = False
+        if data:
+            self._q.put(data)
+
+    def flush(self):
+        """Дождаться записи всех чанков в приёмник."""
+        done = threading.Event()
+        self._q.put(done)
+        done.wait()
+        self._raise()
+        self.sink.flush()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join()
+        self._raise()
+        self.sink.flush()
+
+def _read_umask() -> int:
+    # umask общий на процесс: os.umask(0) на время чтения дал бы файлам других потоков права 0666,
+    # поэтому читаем его один раз при импорте (на Linux — из /proc без изменения)
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+_UMASK = _read_umask()
+
+@contextlib.contextmanager
+def atomic_file(path: str):
+    """Бинарный файл, который появляется под именем path только после успешной записи."""
+    d = os.path.dirname(os.path.abspath(path))
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=d)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(os, "fchmod"):
+                os.fchmod(fd, 0o666 & ~_UMASK)  # mkstemp создаёт 0600 — права как у обычного open()
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def write_frames(sink: IO[bytes], df: pd.DataFrame, compression: Optional[str] = None,
+                 level: Optional[int] = None, chunk_rows: int = WRITE_CHUNK_ROWS):
+    w = ChunkedCsvWriter(sink, compression=compression, level=level)
+    try:
+        if not len(df):
+            w.write(df)
+        for start in range(0, len(df), chunk_rows):
+            w.write(df.iloc[start:start + chunk_rows])
+    finally:
+        w.close()
+
+def write_csv_atomic(df: pd.DataFrame, path: str, compression: Optional[str] = "infer",
+                     level: Optional[int] = None, chunk_rows: int = WRITE_CHUNK_ROWS):
+    """CSV (utf-8, без индекса) с атомарной заменой; сжатие по расширению, если не указано явно."""
+    comp = infer_compression(path) if compression == "infer" else compression
+    with atomic_file(path) as f:
+        write_frames(f, df, compression=comp, level=level, chunk_rows=chunk_rows)
+
+def write_bytes_atomic(data: bytes, path: str):
+    with atomic_file(path) as f:
+        f.write(data)
+
+def csv_bytes(df: pd.DataFrame, compression: Optional[str] = None, level: Optional[int] = None,
+              chunk_rows: int = WRITE_CHUNK_ROWS) -> io.BytesIO:
+    """Результат в памяти (для скачивания без записи и повторного чтения файла)."""
+    buf = io.BytesIO()
+    write_frames(buf, df, compression=compression, level=level, chunk_rows=chunk_rows)
+    buf.seek(0)
+    return buf
@@ -1,10 +1,224 @@
 # reader.py
+from __future__ import annotations
+import codecs, csv, gzip, io, os
+from typing import IO, Callable, Optional, Sequence, Union
+
 import pandas as pd
 
 DEFAULT_COLS = ["address","zip","country","region","district","locality","street"]
 
-def read_csv_any(path: str, dtype="string") -> pd.DataFrame:
-    return pd.read_csv(path, dtype=dtype, keep_default_na=False, na_values=[])
+SAMPLE_BYTES = 1 << 16  # префикс (после распаковки) для определения кодировки и заголовка
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+Source = Union[str, os.PathLike, IO[bytes]]
+
+class _PrefixedStream(io.RawIOBase):
+    """Поток, который сначала отдаёт уже прочитанный префикс, затем — остаток исходного потока."""
+
+    def __init__(self, prefix: bytes, rest: IO[bytes]):
+        self._prefix = memoryview(prefix)
+        self._rest = rest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._prefix:
+            n = min(len(b), len(self._prefix))
+            b[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        chunk = self._rest.read(len(b))
+        n = len(chunk)
+        b[:n] = chunk
+        return n
+
+def detect_compression(head: bytes, name: Optional[str] = None) -> Optional[str]:
+    """'gzip' | 'zstd' | None — по сигнатуре, при её отсутствии — по расширению."""
+    if head.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(_ZSTD_MAGIC):
+        return "zstd"
+    n = (name or "").lower()
+    if n.endswith(".gz"):
+        return "gzip"
+    if n.endswith(".zst") or n.endswith(".zstd"):
+        return "zstd"
+    return None
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Кодировка по префиксу файла: utf-8 (с BOM -> utf-8-sig), иначе cp1251
+    для кириллических выгрузок, иначе latin-1 (декодирует любые байты).
+    """
+    if sample.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    try:
+        # final=False: обрезанный на границе префикса многобайтовый символ не считается ошибкой
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    high = [b for b in sample if b >= 0x80]
+    cyr = sum(1 for b in high if b >= 0xC0 or b in (0xA8, 0xB8))  # А..я, Ё/ё в cp1251
+    # кириллическое слово — подряд идущие старшие байты; у латиницы (Köln, São) они одиночные
+    paired = sum(1 for a, b in zip(sample, sample[1:]) if a >= 0x80 and b >= 0x80)
+    if high and cyr / len(high) >= 0.7 and paired >= len(high) / 2:
+        return "cp1251"
+    return "latin-1"
+
+def _header_columns(sample: bytes, encoding: str) -> list[str]:
+    text = sample.decode(encoding, errors="ignore")
+    line = next(iter(text.splitlines()), "")
+    try:
+        return next(csv.reader([line]))
+    except (StopIteration, csv.Error):
+        return []
+
+def _address_cols(sample: bytes, encoding: str) -> Optional[list[str]]:
+    # ни одной адресной колонки — читаем как есть (пустой usecols движки трактуют по-разному)
+    cols = [c for c in _header_columns(sample, encoding) if c in DEFAULT_COLS]
+    return cols or None
+
+def _default_engine() -> str:
+    try:
+        import pyarrow  # noqa: F401
+        return "pyarrow"  # многопоточный парсер
+    except ImportError:
+        return "c"
+
+def _decompressed(raw: IO[bytes], compression: Optional[str]) -> IO[bytes]:
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("Для чтения .zst нужен пакет 'zstandard' (pip install zstandard)") from e
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)  # наш вывод — кадр на чанк
+    return raw
+
+def open_csv_stream(src: Source, name: Optional[str] = None):
+    """
+    Открыть источник (путь или бинарный file-like) как распакованный бинарный поток
+    без чтения файла целиком. Возвращает (stream, sample, encoding, close_fn).
+    """
+    own = isinstance(src, (str, os.PathLike))
+    raw: IO[bytes] = open(src, "rb") if own else src
+    if name is None:
+        name = os.fspath(src) if own else getattr(src, "name", None)
+
+    head = raw.read(4)
+    body = _PrefixedStream(head, raw)
+    comp = detect_compression(head, name if isinstance(name, str) else None)
+    stream = _decompressed(io.BufferedReader(body, buffer_size=SAMPLE_BYTES), comp)
+
+    sample = stream.read(SAMPLE_BYTES)
+    enc = detect_encoding(sample)
+    out = io.BufferedReader(_PrefixedStream(sample, stream), buffer_size=1 << 20)
+
+    def close():
+        stream.close()
+        if own:
+            raw.close()
+    return out, sample, enc, close
+
+def read_csv_any(src: Source, dtype="string", usecols: Optional[Sequence[str]] = None,
+                 address_only: bool = False, encoding: Optional[str] = None,
+                 engine: Optional[str] = None, name: Optional[str] = None) -> pd.DataFrame:
+    """
+    CSV из пути или бинарного буфера (в т.ч. UploadedFile) — без промежуточных копий в str.
+    gzip/zstd распаковываются потоково, кодировка определяется по префиксу.
+    address_only=True — грузить только адресные колонки (DEFAULT_COLS), остальные не парсятся.
+    engine: 'pyarrow' (многопоточный, если установлен) | 'c'.
+    """
+    engine = engine or _default_engine()
+    start = None if isinstance(src, (str, os.PathLike)) else (src.tell() if src.seekable() else None)
+    stream, sample, enc, close = open_csv_stream(src, name=name)
+    try:
+        enc = encoding or enc
+        if address_only and usecols is None:
+            usecols = _address_cols(sample, enc)
+        kw = dict(dtype=dtype, keep_default_na=False, na_values=[], encoding=enc,
+                  usecols=list(usecols) if usecols is not None else None)
+        if engine != "pyarrow":
+            # битые байты заменяем, а не падаем (как раньше в загрузчике UI)
+            return pd.read_csv(stream, engine=engine, encoding_errors="replace", **kw)
+        try:
+            return pd.read_csv(stream, engine="pyarrow", **kw)
+        except UnicodeDecodeError:
+            # pyarrow не умеет encoding_errors — перечитываем C-движком, если источник позволяет
+            if not isinstance(src, (str, os.PathLike)) and start is None:
+                raise
+    finally:
+        close()
+    if start is not None:
+        src.seek(start)
+    return read_csv_any(src, dtype=dtype, usecols=usecols, encoding=encoding, engine="c", name=name)
+
+def _read_record(stream: IO[bytes]) -> bytes:
+    """Одна CSV-запись в байтах (строки склеиваются, пока кавычки не закрыты)."""
+    line = stream.readline()
+    quotes = line.count(b'"')
+    while quotes % 2:
+        more = stream.readline()
+        if not more:
+            break
+        line += more
+        quotes += more.count(b'"')
+    return line
+
+def _parse_bytes(data: bytes, engine: str, kw: dict) -> pd.DataFrame:
+    if engine == "pyarrow":
+        try:
+            return pd.read_csv(io.BytesIO(data), engine="pyarrow", **kw)
+        except UnicodeDecodeError:
+            pass
+    return pd.read_csv(io.BytesIO(data), engine="c" if engine == "pyarrow" else engine,
+                       encoding_errors="replace", **kw)
+
+def iter_csv_chunks(src: Source, chunk_rows: Union[int, Callable[[], int]] = 100_000, start_offset: int = 0, dtype="string",
+                    address_only: bool = False, encoding: Optional[str] = None,
+                    engine: Optional[str] = None, name: Optional[str] = None):
+    """
+    Чтение CSV чанками по chunk_rows записей. Отдаёт (df, offset), где offset — смещение
+    в распакованном потоке сразу после чанка (граница записи). start_offset — продолжить
+    с такого смещения: заголовок читается заново, байты до смещения пропускаются
+    (у gzip/zstd — распаковкой, seek им недоступен). chunk_rows может быть функцией —
+    она вызывается перед каждым чанком (адаптивный размер).
+    """
+    engine = engine or _default_engine()
+    stream, sample, enc, close = open_csv_stream(src, name=name)
+    try:
+        enc = encoding or enc
+        header = _read_record(stream)
+        pos = len(header)
+        usecols = _address_cols(sample, enc) if address_only else None
+        kw = dict(dtype=dtype, keep_default_na=False, na_values=[], encoding=enc, usecols=usecols)
+
+        while pos < start_offset:
+            skipped = stream.read(min(start_offset - pos, 1 << 20))
+            if not skipped:
+                break
+            pos += len(skipped)
+
+        while True:
+            records = []
+            for _ in range(chunk_rows() if callable(chunk_rows) else chunk_rows):
+                rec = _read_record(stream)
+                if not rec:
+                    break
+                records.append(rec)
+            if not records:
+                return
+            data = b"".join(records)
+            pos += len(data)
+            # заголовок — к каждому чанку: те же колонки, BOM и dtype, что и при чтении целиком
+            yield _parse_bytes(header + data, engine, kw), pos
+    finally:
+        close()
 
 def safe_get(df, col):
     return df[col] if col in df.columns else pd.Series([""]*len(df), dtype="string")
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import hashlib, logging, sqlite3, time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .reader import DEFAULT_COLS
+from .writer import parse_fields, process_dataframe
+from ..libpostal.router import parse_thresholds
+from ..qa.consistency import get_index
+from ..rules.registry import get_profile_fingerprint
+
+# Источник и приёмник в локальной SQLite: исходная таблица читается батчами по ключу
+# (keyset: WHERE key > последний ORDER BY key LIMIT n, без OFFSET), результат пишется
+# в таблицу <table>_norm (key PRIMARY KEY, src_hash, нормализованные колонки) пакетным
+# upsert в одной транзакции на батч. Строка обрабатывается, только если изменился её
+# src_hash — хэш адресных колонок вместе с режимом вывода, libpostal и отпечатком профиля.
+
+logger = logging.getLogger("addrnorm")
+
+# колонки результата, которые пишутся в приёмник
+SINK_COLUMNS = {
+    "addr-only": ["country_norm", "addr_norm"],
+    "extended": ["street", "locality_norm", "district_norm", "region_norm", "zip_norm", "country_norm", "addr_norm"],
+}
+
+def _q(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def connect(path: str) -> sqlite3.Connection:
+    """Одно соединение на весь прогон: WAL, ожидание блокировки, транзакции — явно (with conn)."""
+    conn = sqlite3.connect(path, timeout=30.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({_q(table)})")]
+
+class SqliteSource:
+    """Исходная таблица: батчи (keys, DataFrame адресных колонок, dtype string) в порядке ключа."""
+
+    def __init__(self, conn: sqlite3.Connection, table: str, key: str = "id",
+                 columns: Optional[Sequence[str]] = None):
+        existing = _table_columns(conn, table)
+        if not existing:
+            raise ValueError(f"Таблица {table!r} не найдена")
+        if key not in existing:
+            raise ValueError(f"В таблице {table!r} нет ключевой колонки {key!r}")
+        self.conn, self.table, self.key = conn, table, key
+        self.columns = [c for c in (columns or DEFAULT_COLS) if c in existing and c != key]
+
+    def iter_batches(self, batch_size: int = 5000, after=None) -> Iterator[Tuple[list, pd.DataFrame]]:
+        cols = ", ".join([_q(self.key)] + [_q(c) for c in self.columns])
+        base = f"SELECT {cols} FROM {_q(self.table)}"
+        order = f" ORDER BY {_q(self.key)} LIMIT ?"
+        last = after
+        while True:
+            if last is None:
+                rows = self.conn.execute(base + order, (batch_size,)).fetchall()
+            else:
+                rows = self.conn.execute(base + f" WHERE {_q(self.key)} > ?" + order, (last, batch_size)).fetchall()
+            if not rows:
+                return
+            keys = [r[0] for r in rows]
+            data = {c: ["" if r[i + 1] is None else str(r[i + 1]) for r in rows] for i, c in enumerate(self.columns)}
+            yield keys, pd.DataFrame(data, columns=self.columns, dtype="string")
+            last = keys[-1]
+
+class SqliteSink:
+    """Таблица результатов: key PRIMARY KEY, src_hash, колонки SINK_COLUMNS[output_mode] (или fields), updated_at."""
+
+    def __init__(self, conn: sqlite3.Connection, table: str, key: str = "id", output_mode: str = "addr-only",
+                 fields: Optional[Sequence[str]] = None, zip_check: bool = False):
+        self.conn, self.table, self.key = conn, table, key
+        self.columns = list(fields) if fields else SINK_COLUMNS[output_mode] + (["zip_consistency"] if zip_check else [])
+        self._ensure()
+        names = [self.key, "src_hash", *self.columns, "updated_at"]
+        updates = ", ".join(f"{_q(c)}=excluded.{_q(c)}" for c in names[1:])
+        self._upsert_sql = (
+            f"INSERT INTO {_q(self.table)} ({', '.join(map(_q, names))}) "
+            f"VALUES ({', '.join('?' * len(names))}) "
+            f"ON CONFLICT({_q(self.key)}) DO UPDATE SET {updates}"
+        )
+
+    def _ensure(self):
+        cols = ", ".join(f"{_q(c)} TEXT" for c in self.columns)
+        with self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {_q(self.table)} "
+                f"({_q(self.key)} PRIMARY KEY, src_hash TEXT, {cols}, updated_at REAL)"
+            )
+            # таблица могла быть создана в другом режиме — недостающие колонки добавляем
+            existing = set(_table_columns(self.conn, self.table))
+            for c in self.columns:
+                if c not in existing:
+                    self.conn.execute(f"ALTER TABLE {_q(self.table)} ADD COLUMN {_q(c)} TEXT")
+
+    def hashes_between(self, lo, hi) -> dict:
+        """src_hash для ключей в [lo, hi] — батч источника идёт по ключу, поэтому это один диапазон по PK."""
+        rows = self.conn.execute(
+            f"SELECT {_q(self.key)}, src_hash FROM {_q(self.table)} WHERE {_q(self.key)} BETWEEN ? AND ?", (lo, hi)
+        )
+        return dict(rows.fetchall())
+
+    def upsert(self, keys: Sequence, hashes: Sequence[str], out: pd.DataFrame):
+        now = time.time()
+        vals = [out[c].fillna("").tolist() for c in self.columns]
+        rows = [(k, h, *(v[i] for v in vals), now) for i, (k, h) in enumerate(zip(keys, hashes))]
+        with self.conn:  # одна транзакция на батч
+            self.conn.executemany(self._upsert_sql, rows)
+
+def row_hashes(df: pd.DataFrame, columns: Sequence[str], salt: str = "") -> List[str]:
+    cols = [df[c].fillna("").tolist() for c in columns]
+    out = []
+    for vals in zip(*cols) if cols else ([()] * len(df)):
+        h = hashlib.blake2b(salt.encode("utf-8"), digest_size=16)
+        for v in vals:
+            h.update(b"\x1f")
+            h.update(v.encode("utf-8"))
+        out.append(h.hexdigest())
+    return out
+
+@dataclass
+class SyncResult:
+    scanned: int = 0
+    processed: int = 0
+    skipped: int = 0
+    batches: int = 0
+    elapsed_s: float = 0.0
+    batch_metrics: List[dict] = field(default_factory=list)  # по батчу: scanned, processed, seconds, rows_per_s
+    stats: dict = field(default_factory=dict)                # метрики process_dataframe за весь прогон
+
+def sync_table(conn: sqlite3.Connection, table: str, key: str = "id", sink_table: Optional[str] = None,
+               output_mode: str = "addr-only", use_libpostal: bool = False,
+               libpostal_url: str = "http://localhost:8080", batch_size: int = 5000,
+               force: bool = False, fields: Optional[Sequence[str]] = None,
+               libpostal_thresholds=None, zip_index: Optional[str] = None,
+               fill_locality: bool = False) -> SyncResult:
+    """
+    Нормализовать таблицу table в sink_table (по умолчанию <table>_norm) той же базы.
+    force=True — обработать всё, не сверяя src_hash. fields — писать (и считать) только эти поля.
+    libpostal_thresholds — в libpostal только строки с уверенностью ниже порогов (libpostal.router).
+    zip_index/fill_locality — проверка ZIP ↔ населённый пункт по индексу (qa.consistency).
+    """
+    fields = parse_fields(fields)
+    thresholds = parse_thresholds(libpostal_thresholds) if use_libpostal else None
+    src = SqliteSource(conn, table, key=key)
+    sink = SqliteSink(conn, sink_table or f"{table}_norm", key=key, output_mode=output_mode,
+                      fields=fields, zip_check=bool(zip_index))
+    salt = f"{output_mode}|{bool(use_libpostal)}|{get_profile_fingerprint() or ''}"
+    if fields:
+        salt += "|" + ",".join(fields)
+    if thresholds:
+        salt += "|" + ",".join(f"{k}={v:g}" for k, v in sorted(thresholds.items()))
+    if zip_index:
+        # новый индекс — другой результат проверки: строки пересчитываются
+        salt += f"|zip:{get_index(zip_index).digest}:{bool(fill_locality)}"
+    res = SyncResult()
+    t_start = time.perf_counter()
+    for keys, df in src.iter_batches(batch_size):
+        t0 = time.perf_counter()
+        hashes = row_hashes(df, src.columns, salt)
+        known = {} if force else sink.hashes_between(keys[0], keys[-1])
+        todo = [i for i, (k, h) in enumerate(zip(keys, hashes)) if known.get(k) != h]
+        if todo:
+            sub = df.iloc[todo].reset_index(drop=True)
+            out, _ = process_dataframe(sub, output_mode=output_mode, use_libpostal=use_libpostal,
+                                       libpostal_url=libpostal_url, fields=fields,
+                                       libpostal_thresholds=thresholds, stats=res.stats,
+                                       zip_index=zip_index, fill_locality=fill_locality)
+            sink.upsert([keys[i] for i in todo], [hashes[i] for i in todo], out)
+        dt = time.perf_counter() - t0
+        res.batches += 1
+        res.scanned += len(keys)
+        res.processed += len(todo)
+        res.skipped += len(keys) - len(todo)
+        m = {"scanned": len(keys), "processed": len(todo), "seconds": round(dt, 4),
+             "rows_per_s": round(len(keys) / dt, 1) if dt > 0 else None}
+        res.batch_metrics.append(m)
+        logger.info("Batch %s (%s..%s): %s rows, %s processed, %s unchanged, %.2fs (%s rows/s)",
+                    res.batches, keys[0], keys[-1], len(keys), len(todo), len(keys) - len(todo), dt,
+                    m["rows_per_s"], extra={"chunk_id": res.batches, "metrics": m})
+    res.elapsed_s = time.perf_counter() - t_start
+    return res
@@ -1,183 +1,339 @@
+import time
+from typing import Sequence
 import pandas as pd
 from ..clean.text_normalize import norm_text
-from ..synth.assemble import assemble_addr_norm
+from ..synth.assemble import assemble_columns, combine_street
 from .reader import safe_get
+from .output import write_csv_atomic
+from .memory import frame_bytes
 from ..parse.zipcode import normalize_zip
 from ..parse.country import normalize_country
 from ..parse.region import normalize_region
 from ..parse.locality import normalize_locality
 from ..parse.street import normalize_street
-from ..libpostal.client import LibPostalClient
-from ..libpostal.postprocess import (
-    pick_street, pick_locality, pick_region, pick_postcode, pick_country
-)
+from ..libpostal.client import get_client
+from ..qa.consistency import ConsistencyIndex, get_index
+from ..libpostal.router import component_scores, confidence, needs_libpostal, parse_thresholds
+from ..libpostal.postprocess import parse_safe, merge_components
 
 def _combine_street(street_norm: pd.Series, house_number: pd.Series) -> pd.Series:
-    combined = []
-    for s, h in zip(street_norm.fillna(""), house_number.fillna("")):
-        s = str(s).strip()
-        h = str(h).strip()
-        combined.append(f"{s} {h}".strip() if s and h else (s or h))
+    combined = [combine_street(s, h) for s, h in zip(street_norm.fillna(""), house_number.fillna(""))]
     return pd.Series(combined, dtype="string")
 
-def _apply_libpostal_row(addr_norm: str, lp: LibPostalClient):
-    try:
-        comps = lp.parse(addr_norm)
-        return comps
-    except Exception:
-        return []
+def _assemble(country, region, district, locality, street, house_number, zip_norm, country_iso) -> pd.Series:
+    return assemble_columns({
+        "street": street, "house": house_number, "locality": locality, "region": region,
+        "district": district, "zip": zip_norm, "country": country,
+    }, country_iso)
 
-def process_dataframe(df: pd.DataFrame, output_mode: str = "addr-only",
-                      use_libpostal: bool = False, libpostal_url: str = "http://localhost:8080"):
-    # before (для логов)
-    country_b  = safe_get(df, "country")
-    region_b   = safe_get(df, "region")
-    district_b = safe_get(df, "district")
-    locality_b = safe_get(df, "locality")
-    street_b   = safe_get(df, "street")
-    zipc_b     = safe_get(df, "zip")
-
-    # базовая чистка для некоторых полей
-    district = district_b.map(norm_text)
-    zipc     = zipc_b.map(norm_text)
-
-    # ZIP
-    zip_results = [normalize_zip(None if not c else c, z) for c, z in zip(country_b.map(norm_text), zipc)]
-    zip_norm = pd.Series([zr.zip_norm for zr in zip_results], dtype="string")
-    zip_inferred_iso2 = [zr.country_inferred for zr in zip_results]
-
-    # COUNTRY
-    country_res = [normalize_country(c, zi) for c, zi in zip(country_b.map(norm_text), zip_inferred_iso2)]
-    country     = pd.Series([cr.name for cr in country_res], dtype="string")
-    country_iso = [cr.iso2 for cr in country_res]
-
-    # REGION
-    region_norm_list = [normalize_region(r, iso2, cname) for r, iso2, cname in zip(region_b, country_iso, country)]
-    region = pd.Series(region_norm_list, dtype="string")
-
-    # LOCALITY
-    locality_norm_list = [normalize_locality(loc, iso2, cname) for loc, iso2, cname in zip(locality_b, country_iso, country)]
-    locality = pd.Series(locality_norm_list, dtype="string")
-
-    # STREET
-    street_norm_list = [normalize_street(s) for s in street_b]
-    street = pd.Series(street_norm_list, dtype="string")
+class _StageClock:
+    """Секундомер этапов process_dataframe: stats["stages"][name] += dt (no-op без stats)."""
+
+    def __init__(self, stats: dict | None):
+        self.stages = None if stats is None else stats.setdefault("stages", {})
+        self.last = time.perf_counter()
+
+    def lap(self, name: str):
+        if self.stages is None:
+            return
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self.last)
+        self.last = now
+
+# ---------- граф полей ----------
+# Узел графа: (зависимости, функция(df, значения узлов[, ctx]) -> значение, этап для stats["stages"]);
+# ctx (параметры прогона: libpostal, индекс ZIP, stats) получают узлы из _WITH_CTX.
+# Узлы считаются лениво и один раз: запрошенное поле тянет только свои зависимости,
+# например zip_norm/country_norm не требуют региона, улицы и сборки addr_norm.
+
+def _n_country_in(df, v):
+    return safe_get(df, "country").map(norm_text)
+
+def _n_zip(df, v):
+    zipc = safe_get(df, "zip").map(norm_text)
+    zr = [normalize_zip(None if not c else c, z) for c, z in zip(v["country_in"], zipc)]
+    return {
+        "zip_clean": zipc,
+        "zip_norm": pd.Series([r.zip_norm for r in zr], dtype="string"),
+        "inferred_iso2": [r.country_inferred for r in zr],
+    }
+
+def _n_country(df, v):
+    cr = [normalize_country(c, zi) for c, zi in zip(v["country_in"], v["zip"]["inferred_iso2"])]
+    return {
+        "country_norm": pd.Series([r.name for r in cr], dtype="string"),
+        "country_iso2": [r.iso2 for r in cr],
+        "country_source": pd.Series([r.source for r in cr], dtype="string"),
+    }
+
+def _n_zip_valid(df, v):
+    # проверка по итоговой стране (в узле zip страна ещё сырая — «United States», а не US);
+    # индекс совпал с выведенной по ZIP страной — шаблон уже подошёл
+    out = []
+    for z, zi, iso2 in zip(v["zip"]["zip_clean"], v["zip"]["inferred_iso2"], v["country"]["country_iso2"]):
+        out.append(bool(z) and iso2 is not None and (iso2 == zi or normalize_zip(iso2, z).valid))
+    return pd.Series(out, dtype="boolean")
+
+def _n_region(df, v):
+    c = v["country"]
+    return pd.Series([normalize_region(r, iso2, cname) for r, iso2, cname
+                      in zip(safe_get(df, "region"), c["country_iso2"], c["country_norm"])], dtype="string")
+
+def _n_locality(df, v, ctx):
+    c = v["country"]
+    locs = [normalize_locality(loc, iso2, cname) for loc, iso2, cname
+            in zip(safe_get(df, "locality"), c["country_iso2"], c["country_norm"])]
+    if ctx.zip_index is not None and ctx.fill_locality:
+        # пустой населённый пункт — из индекса по ZIP (до сборки addr_norm и libpostal)
+        locs, filled = ctx.zip_index.fill_locality(c["country_iso2"], v["zip"]["zip_norm"], locs)
+        if ctx.stats is not None:
+            ctx.stats["locality_filled"] = ctx.stats.get("locality_filled", 0) + filled
+    return pd.Series(locs, dtype="string")
+
+def _n_district(df, v):
+    return safe_get(df, "district").map(norm_text)
+
+def _n_street(df, v):
+    return pd.Series([normalize_street(s) for s in safe_get(df, "street")], dtype="string")
 
+def _n_house(df, v):
     # дом пока не выделяем
-    house_number = pd.Series([""] * len(df), dtype="string")
+    return pd.Series([""] * len(df), dtype="string")
 
-    # addr_norm из наших нормализованных компонент
-    addr_norm = [
-        assemble_addr_norm(
-            country[i], region[i], district[i], locality[i],
-            street[i], house_number[i], zip_norm[i]
+def _n_assemble(df, v):
+    # addr_norm из наших нормализованных компонент (шаблон по стране, по столбцам целиком)
+    c = v["country"]
+    return _assemble(c["country_norm"], v["region"], v["district"], v["locality"], v["street"],
+                     v["house"], v["zip"]["zip_norm"], c["country_iso2"])
+
+def _n_confidence(df, v):
+    return component_scores(v["zip_valid"], v["country"]["country_source"], v["street"], v["locality"])
+
+def _n_libpostal(df, v, ctx):
+    libpostal_url, stats, thresholds = ctx.libpostal_url, ctx.stats, ctx.thresholds
+    # общий клиент пула инстансов (libpostal_url может содержать несколько URL)
+    lp = get_client(libpostal_url, timeout=5.0, retries=1)
+
+    # с порогами в libpostal идут только строки, где локальная уверенность ниже порога
+    addrs = v["assemble"].fillna("").tolist()
+    routed = [True] * len(addrs) if thresholds is None else needs_libpostal(v["confidence"], thresholds).tolist()
+
+    # одинаковые адреса разбираем один раз, уникальные — параллельно по инстансам пула
+    uniq = list(dict.fromkeys(a for a, r in zip(addrs, routed) if r))
+    parsed: dict[str, list] = dict(zip(uniq, lp.map(lambda a: parse_safe(a, lp), uniq)))
+
+    # применяем пост-обработку построчно (уверенные строки остаются как есть)
+    street, locality, region = v["street"], v["locality"], v["region"]
+    zip_norm, country, country_iso = v["zip"]["zip_norm"], v["country"]["country_norm"], v["country"]["country_iso2"]
+    merged = [
+        merge_components(
+            parsed[a],
+            street.iloc[i], locality.iloc[i], region.iloc[i],
+            zip_norm.iloc[i], country.iloc[i], country_iso[i],
+        ) if r else (
+            street.iloc[i], locality.iloc[i], region.iloc[i],
+            zip_norm.iloc[i], country.iloc[i], country_iso[i] or None,
         )
-        for i in range(len(df))
+        for i, (a, r) in enumerate(zip(addrs, routed))
     ]
-    addr_norm = pd.Series(addr_norm, dtype="string")
+    res = {
+        "street":        pd.Series([m[0] for m in merged], dtype="string"),
+        "locality_norm": pd.Series([m[1] for m in merged], dtype="string"),
+        "region_norm":   pd.Series([m[2] for m in merged], dtype="string"),
+        "zip_norm":      pd.Series([m[3] for m in merged], dtype="string"),
+        "country_norm":  pd.Series([m[4] for m in merged], dtype="string"),
+        "country_iso2":  [m[5] for m in merged],
+    }
+    # пересоберём addr_norm после libpostal-уточнений
+    res["addr_norm"] = _assemble(res["country_norm"], res["region_norm"], v["district"], res["locality_norm"],
+                                 res["street"], v["house"], res["zip_norm"], res["country_iso2"])
+    if stats is not None:
+        stats["libpostal_rows"] = stats.get("libpostal_rows", 0) + len(df)
+        calls = sum(1 for a in parsed if a)
+        stats["libpostal_calls"] = stats.get("libpostal_calls", 0) + calls
+        stats["libpostal_routed_rows"] = stats.get("libpostal_routed_rows", 0) + sum(routed)
+        stats["libpostal_calls_avoided"] = (stats.get("libpostal_calls_avoided", 0)
+                                            + sum(1 for a in set(addrs) if a) - calls)
+    return res
 
-    # --------- ПОСЛЕ очистки: прогон через libpostal (опционально) ----------
-    if use_libpostal:
-        lp = LibPostalClient(base_url=libpostal_url, timeout=5.0, retries=1)
+def _n_consistency(df, v, ctx):
+    # проверка итоговых значений (после libpostal, если он включён)
+    res = ctx.zip_index.check(ctx.field("country_iso2", raw=True), ctx.field("zip_norm"),
+                              ctx.field("locality_norm"), ctx.field("region_norm"))
+    if ctx.stats is not None:
+        st = ctx.stats
+        st["zip_checked"] = st.get("zip_checked", 0) + int((res != "").sum())
+        st["zip_unknown"] = st.get("zip_unknown", 0) + int((res == "unknown").sum())
+        st["zip_inconsistent"] = st.get("zip_inconsistent", 0) + int(res.isin(["locality", "region", "locality+region"]).sum())
+    return res
 
-        # применяем пост-обработку построчно
-        street_lp, locality_lp, region_lp, zip_lp, country_lp = [], [], [], [], []
-        for a in addr_norm.fillna(""):
-            comps = _apply_libpostal_row(a, lp)
+_GRAPH = {
+    "country_in": ((), _n_country_in, "zip"),
+    "zip":        (("country_in",), _n_zip, "zip"),
+    "country":    (("country_in", "zip"), _n_country, "country"),
+    "zip_valid":  (("zip", "country"), _n_zip_valid, "zip"),
+    "region":     (("country",), _n_region, "region"),
+    "locality":   (("country",), _n_locality, "locality"),
+    "district":   ((), _n_district, "district"),
+    "street":     ((), _n_street, "street"),
+    "house":      ((), _n_house, "street"),
+    "assemble":   (("country", "region", "district", "locality", "street", "house", "zip"), _n_assemble, "assemble"),
+    "confidence": (("zip_valid", "country", "street", "locality"), _n_confidence, "confidence"),
+    "libpostal":  (("assemble",), _n_libpostal, "libpostal"),  # + confidence, если заданы пороги
+    "consistency": (("zip", "country", "locality", "region"), _n_consistency, "consistency"),  # + libpostal
+}
+_WITH_CTX = {"locality", "libpostal", "consistency"}
 
-            # STREET: road + housenumber (если есть), иначе оставляем как было
-            s2 = pick_street(comps)
-            street_lp.append(s2 if s2 else "")
+# поле результата -> (узел, как достать значение из узла); zip_valid (индекс подходит под шаблон
+# страны) и country_source — локальная оценка до libpostal, остальные поля libpostal уточняет (_LP_FIELDS)
+_FIELD_SOURCES = {
+    "zip_norm":       ("zip", lambda x: x["zip_norm"]),
+    "zip_valid":      ("zip_valid", None),
+    "country_norm":   ("country", lambda x: x["country_norm"]),
+    "country_iso2":   ("country", lambda x: x["country_iso2"]),
+    "country_source": ("country", lambda x: x["country_source"]),
+    "region_norm":    ("region", None),
+    "locality_norm":  ("locality", None),
+    "district_norm":  ("district", None),
+    "street":         ("street", None),
+    "addr_norm":      ("assemble", None),
+    "confidence":     ("confidence", confidence),
+    "zip_consistency": ("consistency", None),
+}
+FIELDS = list(_FIELD_SOURCES)
+_LP_FIELDS = {"zip_norm", "country_norm", "country_iso2", "region_norm", "locality_norm", "street", "addr_norm"}
 
-            # LOCALITY: city/town/village/suburb/...
-            loc2 = pick_locality(comps)
-            locality_lp.append(loc2 if loc2 else "")
+# колонки результата по режиму вывода (addr-only — ещё и все входные колонки)
+MODE_FIELDS = {
+    "addr-only": ["country_norm", "addr_norm"],
+    "extended": ["street", "locality_norm", "district_norm", "region_norm", "zip_norm", "country_norm", "addr_norm"],
+}
 
-            # REGION: state/region/province
-            reg2 = pick_region(comps)
-            region_lp.append(reg2 if reg2 else "")
+# компонент для отчёта об изменениях -> (входная колонка, поле результата)
+_CHANGE_FIELDS = {
+    "street": ("street", "street"), "locality": ("locality", "locality_norm"),
+    "district": ("district", "district_norm"), "region": ("region", "region_norm"),
+    "country": ("country", "country_norm"), "zip": ("zip", "zip_norm"),
+}
 
-            # ZIP: postcode
-            zp2 = pick_postcode(comps)
-            zip_lp.append(zp2 if zp2 else "")
+def parse_fields(spec: str | Sequence[str] | None) -> list[str] | None:
+    """'zip_norm,country_norm' или список -> проверенный список полей (None/пусто — все по режиму)."""
+    if spec is None:
+        return None
+    items = spec.replace(",", " ").split() if isinstance(spec, str) else [str(f).strip() for f in spec]
+    items = list(dict.fromkeys(f for f in items if f))
+    unknown = [f for f in items if f not in _FIELD_SOURCES]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)} (доступны: {', '.join(FIELDS)})")
+    return items or None
 
-            # COUNTRY: country name/code
-            ctry2 = pick_country(comps)
-            country_lp.append(ctry2 if ctry2 else "")
+def _field_node(name: str, use_libpostal: bool) -> str:
+    return "libpostal" if use_libpostal and name in _LP_FIELDS else _FIELD_SOURCES[name][0]
 
-        # обновляем поля «мягко»: если libpostal дал значение — используем, иначе оставляем прежнее
-        # street: заменяем, если libpostal дал улицу (он уже включает дом)
-        street = pd.Series([street_lp[i] or street.iloc[i] for i in range(len(df))], dtype="string")
+def _plan(nodes, order: list[str], use_libpostal: bool = False, gated: bool = False) -> list[str]:
+    for node in nodes:
+        if node not in order:
+            deps = _GRAPH[node][0]
+            if node == "libpostal" and gated:
+                deps = (*deps, "confidence")
+            elif node == "consistency" and use_libpostal:
+                deps = (*deps, "libpostal")
+            _plan(deps, order, use_libpostal, gated)
+            order.append(node)
+    return order
 
-        # locality/region: если libpostal дал — нормализуем через наши функции ещё раз (чтобы титл-кейс и штаты США)
-        locality = pd.Series(
-            [normalize_locality(locality_lp[i], country_iso[i], country.iloc[i]) or locality.iloc[i] for i in range(len(df))],
-            dtype="string"
-        )
-        region = pd.Series(
-            [normalize_region(region_lp[i], country_iso[i], country.iloc[i]) or region.iloc[i] for i in range(len(df))],
-            dtype="string"
-        )
+def field_plan(fields: Sequence[str], use_libpostal: bool = False, gated: bool = False) -> list[str]:
+    """Узлы графа, которые будут посчитаны для полей fields, в порядке вычисления."""
+    return _plan([_field_node(f, use_libpostal) for f in fields], [], use_libpostal, gated)
 
-        # zip: если дал — прогоняем через нашу normalize_zip (чтобы слитная форма)
-        zip_norm = pd.Series(
-            [normalize_zip(country_iso[i], zip_lp[i]).zip_norm if zip_lp[i] else zip_norm.iloc[i] for i in range(len(df))],
-            dtype="string"
-        )
+class _LazyFields:
+    def __init__(self, df: pd.DataFrame, clock: _StageClock, use_libpostal: bool,
+                 libpostal_url: str, stats: dict | None, thresholds: dict | None,
+                 zip_index: ConsistencyIndex | None = None, fill_locality: bool = False):
+        self.df, self.clock, self.use_libpostal = df, clock, use_libpostal
+        self.libpostal_url, self.stats, self.thresholds = libpostal_url, stats, thresholds
+        self.zip_index, self.fill_locality = zip_index, fill_locality
+        self.values: dict = {}
 
-        # country: если дал — нормализуем через нашу normalize_country (канон-имя)
-        country_after = []
-        country_iso_after = []
-        for i in range(len(df)):
-            if country_lp[i]:
-                cres = normalize_country(country_lp[i], None)
-                name = cres.name or country.iloc[i]
-                iso2 = cres.iso2 if cres.iso2 else (country_iso[i] if country_iso[i] else None)
-                country_after.append(name)
-                country_iso_after.append(iso2)
-            else:
-                country_after.append(country.iloc[i])
-                country_iso_after.append(country_iso[i] if country_iso[i] else None)
-        country = pd.Series(country_after, dtype="string")
-        country_iso = country_iso_after
-
-        # пересоберём addr_norm после libpostal-уточнений
-        addr_norm = pd.Series([
-            assemble_addr_norm(
-                country[i], region[i], district[i], locality[i],
-                street[i], house_number[i], zip_norm[i]
-            )
-            for i in range(len(df))
-        ], dtype="string")
-
-    # логи
-    changes = {
-        "street":   (street_b,   street),
-        "locality": (locality_b, locality),
-        "district": (district_b, district),
-        "region":   (region_b,   region),
-        "country":  (country_b,  country),
-        "zip":      (zipc_b,     zip_norm),
-    }
+    def node(self, name: str):
+        if name not in self.values:
+            for node in _plan([name], [], self.use_libpostal, self.thresholds is not None):
+                if node in self.values:
+                    continue
+                _, fn, stage = _GRAPH[node]
+                if node in _WITH_CTX:
+                    self.values[node] = fn(self.df, self.values, self)
+                else:
+                    self.values[node] = fn(self.df, self.values)
+                self.clock.lap(stage)
+        return self.values[name]
+
+    def field(self, name: str, raw: bool = False):
+        """Значение поля; без raw street — вместе с домом, country_iso2 — Series (как в колонке результата)."""
+        node = _field_node(name, self.use_libpostal)
+        value = self.node(node)
+        if node == "libpostal":
+            value = value[name]
+        else:
+            get = _FIELD_SOURCES[name][1]
+            value = get(value) if get else value
+        if name == "street" and not raw:
+            return _combine_street(value, self.node("house"))
+        if name == "country_iso2" and not raw:
+            return pd.Series(value, dtype="string")
+        return value
+
+def process_dataframe(df: pd.DataFrame, output_mode: str = "addr-only",
+                      use_libpostal: bool = False, libpostal_url: str = "http://localhost:8080",
+                      stats: dict | None = None, fields: Sequence[str] | None = None,
+                      libpostal_thresholds: str | dict | None = None,
+                      zip_index: ConsistencyIndex | str | None = None, fill_locality: bool = False,
+                      measure_bytes: bool = False):
+    """
+    fields — вернуть только эти колонки (из FIELDS, в указанном порядке) вместо набора
+    по output_mode; считаются только нужные им этапы, changes — только по посчитанным компонентам.
+    libpostal_thresholds — пороги уверенности по компонентам (libpostal.router.parse_thresholds):
+    в libpostal уходят только строки ниже порога; None — все строки.
+    zip_index — индекс ZIP ↔ населённый пункт/регион (qa.consistency, объект или путь): к результату
+    добавляется zip_consistency (ok/unknown/locality/region/locality+region); fill_locality=True —
+    пустой населённый пункт заполняется по ZIP.
+    stats — необязательный dict для метрик прогона: время по этапам
+    (stats["stages"]: zip/country/region/locality/district/street/assemble/libpostal/output, сек),
+    stats["zip_checked"/"zip_unknown"/"zip_inconsistent"/"locality_filled"] — при zip_index;
+    stats["libpostal_rows"], stats["libpostal_routed_rows"], stats["libpostal_calls"] (уникальные
+    адреса после дедупликации) и stats["libpostal_calls_avoided"] (не понадобились благодаря порогам).
+    measure_bytes=True — stats["frame_bytes"]: размер входа, результата, changes и всех
+    промежуточных Series этапов (io.memory.frame_bytes) — для подбора чанка под бюджет памяти.
+    """
+    fields = parse_fields(fields)
+    # пороги нужны только маршрутизации в libpostal — без него строка порогов не разбирается
+    thresholds = parse_thresholds(libpostal_thresholds) if use_libpostal else None
+    if isinstance(zip_index, str):
+        zip_index = get_index(zip_index)
+    if zip_index is None and fields and "zip_consistency" in fields:
+        raise ValueError("Поле zip_consistency требует zip_index")
+    clock = _StageClock(stats)
+    lazy = _LazyFields(df, clock, use_libpostal, libpostal_url, stats, thresholds, zip_index, fill_locality)
+    wanted = fields or MODE_FIELDS[output_mode] + (["zip_consistency"] if zip_index is not None else [])
+    cols = {f: lazy.field(f) for f in wanted}
+
+    # логи: before -> after по компонентам, которые были посчитаны
+    changes = {}
+    for comp, (src, name) in _CHANGE_FIELDS.items():
+        if _field_node(name, use_libpostal) in lazy.values:
+            changes[comp] = (safe_get(df, src), lazy.field(name, raw=True))
 
-    if output_mode == "addr-only":
+    if fields is None and output_mode == "addr-only":
         out = df.copy()
-        out["country_norm"] = country
-        out["addr_norm"] = addr_norm
-        return out, changes
-
-    # extended
-    street_combined = _combine_street(street, house_number)  # сейчас house_number пуст, но логика на будущее
-    out = pd.DataFrame({
-        "street":        street_combined,
-        "locality_norm": locality,
-        "district_norm": district,
-        "region_norm":   region,
-        "zip_norm":      zip_norm,
-        "country_norm":  country,
-        "addr_norm":     addr_norm,
-    })
+        for f, s in cols.items():
+            out[f] = s
+    else:
+        out = pd.DataFrame(cols)
+    clock.lap("output")
+    if measure_bytes and stats is not None:
+        stats["frame_bytes"] = frame_bytes([df, out, lazy.values, *(s for pair in changes.values() for s in pair)])
     return out, changes
 
-def write_csv(df: pd.DataFrame, path: str):
-    df.to_csv(path, index=False, encoding="utf-8")
+def write_csv(df: pd.DataFrame, path: str, compression: str | None = "infer"):
+    """CSV utf-8 без индекса: по чанкам, сжатие (.gz/.zst) в фоне, атомарная замена файла."""
+    write_csv_atomic(df, path, compression=compression)
@@ -1,20 +1,139 @@
 from __future__ import annotations
+import inspect
 import json
+import threading
+import time
 import urllib.parse
 import urllib.request
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional, Sequence, Union
+
+# Клиент libpostal-rest поверх пула инстансов: base_url — один URL, несколько через
+# запятую/пробел/перевод строки или список. Выбор инстанса — по наименьшему числу
+# запросов в полёте (least_inflight) или по наблюдаемой задержке (latency, EWMA).
+# Инстанс после fail_threshold ошибок подряд выводится из ротации и возвращается,
+# когда фоновая проверка health_path отвечает 200.
+
+BALANCE_STRATEGIES = ("least_inflight", "latency")
+DEFAULT_BALANCE = "least_inflight"
 
 class LibPostalError(Exception):
     pass
 
+def split_urls(base_url: Union[str, Sequence[str]]) -> List[str]:
+    items = base_url.replace(",", " ").split() if isinstance(base_url, str) else list(base_url)
+    urls = list(dict.fromkeys(u.strip().rstrip("/") for u in items if u and u.strip()))
+    return urls or ["http://localhost:8080"]
+
+class _Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.latency_ms: Optional[float] = None  # EWMA успешных запросов
+        self.healthy = True
+        self.down_since: Optional[float] = None
+
+    def snapshot(self, elapsed_s: float) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "rps": round(self.requests / elapsed_s, 1) if elapsed_s > 0 else 0.0,
+        }
+
 class LibPostalClient:
-    def __init__(self, base_url: str = "http://localhost:8080", timeout: float = 5.0, retries: int = 1):
-        self.base_url = base_url.rstrip("/")
+    def __init__(self, base_url: Union[str, Sequence[str]] = "http://localhost:8080", timeout: float = 5.0,
+                 retries: int = 1, balance: str = DEFAULT_BALANCE, fail_threshold: int = 2,
+                 health_path: str = "/health", health_interval_s: float = 2.0,
+                 workers_per_endpoint: int = 4):
+        if balance not in BALANCE_STRATEGIES:
+            raise ValueError(f"balance: одно из {BALANCE_STRATEGIES}")
+        self.endpoints = [_Endpoint(u) for u in split_urls(base_url)]
+        self.base_url = self.endpoints[0].url  # совместимость: первый (или единственный) инстанс
         self.timeout = timeout
         self.retries = max(0, retries)
+        self.balance = balance
+        self.fail_threshold = max(1, fail_threshold)
+        self.health_path = health_path
+        self.health_interval_s = health_interval_s
+        self.workers_per_endpoint = max(1, workers_per_endpoint)
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        self._started = time.monotonic()
+
+    # ---------- выбор инстанса ----------
+    def _pick(self, exclude: set) -> _Endpoint:
+        with self._lock:
+            live = [e for e in self.endpoints if e.healthy and e.url not in exclude]
+            if not live:
+                # все выведены из ротации — пробуем тот, что упал раньше всех (вдруг уже поднялся)
+                live = [e for e in self.endpoints if e.url not in exclude] or self.endpoints
+                live = [min(live, key=lambda e: e.down_since or 0.0)]
+            if self.balance == "latency":
+                # неизвестная задержка — 0: новый/вернувшийся инстанс сразу получает запросы
+                ep = min(live, key=lambda e: ((e.latency_ms or 0.0) * (e.inflight + 1), e.inflight))
+            else:
+                ep = min(live, key=lambda e: (e.inflight, e.latency_ms or 0.0))
+            ep.inflight += 1
+            ep.requests += 1
+            return ep
+
+    def _done(self, ep: _Endpoint, latency_s: Optional[float]):
+        with self._lock:
+            ep.inflight -= 1
+            if latency_s is not None:
+                ms = latency_s * 1000.0
+                ep.latency_ms = ms if ep.latency_ms is None else 0.8 * ep.latency_ms + 0.2 * ms
+                ep.consecutive_errors = 0
+                return
+            ep.errors += 1
+            ep.consecutive_errors += 1
+            if ep.healthy and ep.consecutive_errors >= self.fail_threshold:
+                ep.healthy = False
+                ep.down_since = time.monotonic()
+                self._ensure_health_thread()
+
+    # ---------- health-check ----------
+    def _ensure_health_thread(self):
+        # вызывается под self._lock
+        if self._health_thread is None or not self._health_thread.is_alive():
+            self._health_thread = threading.Thread(target=self._health_loop, name="libpostal-health", daemon=True)
+            self._health_thread.start()
 
-    def _get(self, path: str, q: Dict[str, str]) -> Tuple[int, str]:
-        url = f"{self.base_url}{path}?{urllib.parse.urlencode(q)}"
+    def _probe(self, ep: _Endpoint) -> bool:
+        try:
+            req = urllib.request.Request(f"{ep.url}{self.health_path}", method="GET")
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.getcode() == 200
+        except Exception:
+            return False
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval_s)
+            with self._lock:
+                down = [e for e in self.endpoints if not e.healthy]
+                if not down:
+                    # решение о выходе — под тем же замком, что и в _done: упавший после этого
+                    # инстанс увидит _health_thread = None и запустит новый поток
+                    self._health_thread = None
+                    return
+            for ep in down:
+                if self._probe(ep):
+                    with self._lock:
+                        ep.healthy = True
+                        ep.consecutive_errors = 0
+                        ep.down_since = None
+
+    # ---------- запросы ----------
+    def _get(self, path: str, q: Dict[str, str], base_url: Optional[str] = None) -> Tuple[int, str]:
+        url = f"{base_url or self.base_url}{path}?{urllib.parse.urlencode(q)}"
         req = urllib.request.Request(url, method="GET")
         with urllib.request.urlopen(req, timeout=self.timeout) as resp:
             code = resp.getcode()
@@ -25,21 +144,73 @@ class LibPostalClient:
         """
         Ожидаемый ответ libpostal-rest: [{"label":"road","value":"main"}, ...]
         Встречается и форма: {"components":[...]} — поддерживаем обе.
+        Повтор после ошибки уходит на другой инстанс пула (если он есть).
         """
         if not text:
             return []
         last_err: Optional[Exception] = None
+        tried: set = set()
         for _ in range(self.retries + 1):
+            ep = self._pick(tried if len(tried) < len(self.endpoints) else set())
+            tried.add(ep.url)
+            t0 = time.perf_counter()
             try:
-                code, body = self._get("/parse", {"text": text})
+                code, body = self._get("/parse", {"text": text}, base_url=ep.url)
                 if code != 200:
                     raise LibPostalError(f"HTTP {code}: {body[:200]}")
                 data = json.loads(body)
-                if isinstance(data, dict) and isinstance(data.get("components"), list):
-                    return list(data["components"])
-                if isinstance(data, list):
-                    return [x for x in data if isinstance(x, dict) and "label" in x and "value" in x]
-                return []
             except Exception as e:
+                self._done(ep, None)
                 last_err = e
+                continue
+            self._done(ep, time.perf_counter() - t0)
+            if isinstance(data, dict) and isinstance(data.get("components"), list):
+                return list(data["components"])
+            if isinstance(data, list):
+                return [x for x in data if isinstance(x, dict) and "label" in x and "value" in x]
+            return []
         raise LibPostalError(str(last_err) if last_err else "unknown error")
+
+    def map(self, fn: Callable[[str], object], texts: Sequence[str], max_workers: Optional[int] = None) -> list:
+        """fn(text) для всех текстов параллельно (workers_per_endpoint потоков на инстанс), порядок сохраняется."""
+        if not texts:
+            return []
+        workers = max_workers or self.workers_per_endpoint * len(self.endpoints)
+        if workers <= 1 or len(texts) == 1:
+            return [fn(t) for t in texts]
+        with ThreadPoolExecutor(max_workers=min(workers, len(texts)), thread_name_prefix="libpostal") as ex:
+            return list(ex.map(fn, texts))
+
+    def stats(self) -> List[Dict[str, object]]:
+        """Счётчики по инстансам: запросы, ошибки, в полёте, задержка (EWMA), rps с момента создания."""
+        elapsed = time.monotonic() - self._started
+        with self._lock:
+            return [e.snapshot(elapsed) for e in self.endpoints]
+
+# один клиент на набор URL и настройки в процессе: состояние здоровья и статистика переживают чанки
+_CLIENTS: Dict[Tuple, LibPostalClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+# настройки клиента (кроме URL и balance) со значениями по умолчанию — часть ключа кэша
+_CLIENT_OPTIONS = {name: p.default for name, p in inspect.signature(LibPostalClient).parameters.items()
+                   if name not in ("base_url", "balance")}
+
+def get_client(base_url: Union[str, Sequence[str]] = "http://localhost:8080",
+               balance: Optional[str] = None, **kwargs) -> LibPostalClient:
+    """
+    Общий клиент для набора URL и настроек (timeout, retries, ...: не указанные — по умолчанию,
+    другие значения — другой клиент); balance (если задан) переключает стратегию уже созданного.
+    """
+    unknown = set(kwargs) - set(_CLIENT_OPTIONS)
+    if unknown:
+        raise TypeError(f"get_client: неизвестные параметры {', '.join(sorted(unknown))}")
+    urls = tuple(split_urls(base_url))
+    key = (urls, tuple(sorted({**_CLIENT_OPTIONS, **kwargs}.items())))
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = LibPostalClient(list(urls), balance=balance or DEFAULT_BALANCE, **kwargs)
+        elif balance:
+            if balance not in BALANCE_STRATEGIES:
+                raise ValueError(f"balance: одно из {BALANCE_STRATEGIES}")
+            client.balance = balance
+        return client
@@ -1,6 +1,11 @@
 from __future__ import annotations
 from typing import Dict, List, Optional
 
+from ..parse.zipcode import normalize_zip
+from ..parse.country import normalize_country
+from ..parse.region import normalize_region
+from ..parse.locality import normalize_locality
+
 # какие метки считать "улицей"
 ROAD_KEYS = [
     "road","pedestrian","footway","path","residential","highway","street","street_name",
@@ -36,3 +41,47 @@ def pick_postcode(parsed: List[Dict[str,str]]) -> Optional[str]:
 
 def pick_country(parsed: List[Dict[str,str]]) -> Optional[str]:
     return _first_component(parsed, ["country","country_name","country_code"])
+
+def parse_safe(addr_norm: str, lp) -> List[Dict[str,str]]:
+    """Разбор строки клиентом libpostal; любая ошибка -> [] (строка остаётся с локальными значениями)."""
+    try:
+        comps = lp.parse(addr_norm)
+        return comps
+    except Exception:
+        return []
+
+def merge_components(comps, street: str, locality: str, region: str, zip_norm: str,
+                     country: str, country_iso: str | None):
+    """
+    Мягкое слияние ответа libpostal с нашими компонентами одной строки:
+    если libpostal дал значение — используем (через наши нормализаторы), иначе оставляем прежнее.
+    Возвращает (street, locality, region, zip_norm, country, country_iso).
+    """
+    # STREET: road + housenumber (если есть), иначе оставляем как было
+    street_lp = pick_street(comps) or ""
+    # LOCALITY: city/town/village/suburb/...
+    locality_lp = pick_locality(comps) or ""
+    # REGION: state/region/province
+    region_lp = pick_region(comps) or ""
+    # ZIP: postcode
+    zip_lp = pick_postcode(comps) or ""
+    # COUNTRY: country name/code
+    country_lp = pick_country(comps) or ""
+
+    # street: заменяем, если libpostal дал улицу (он уже включает дом)
+    street_new = street_lp or street
+    # locality/region: если libpostal дал — нормализуем через наши функции ещё раз (чтобы титл-кейс и штаты США)
+    locality_new = normalize_locality(locality_lp, country_iso, country) or locality
+    region_new = normalize_region(region_lp, country_iso, country) or region
+    # zip: если дал — прогоняем через нашу normalize_zip (чтобы слитная форма)
+    zip_new = normalize_zip(country_iso, zip_lp).zip_norm if zip_lp else zip_norm
+
+    # country: если дал — нормализуем через нашу normalize_country (канон-имя)
+    if country_lp:
+        cres = normalize_country(country_lp, None)
+        country_new = cres.name or country
+        iso_new = cres.iso2 if cres.iso2 else (country_iso if country_iso else None)
+    else:
+        country_new = country
+        iso_new = country_iso if country_iso else None
+    return street_new, locality_new, region_new, zip_new, country_new, iso_new
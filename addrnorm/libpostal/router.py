@@ -0,0 +1,65 @@
+from __future__ import annotations
+from typing import Dict, Mapping, Optional, Union
+
+import pandas as pd
+
+# Маршрутизация в libpostal по локальной уверенности: у строки оценивается каждый
+# компонент (0..1), в libpostal уходят только строки, где хотя бы один компонент ниже
+# своего порога. Полная строка (ZIP подходит под шаблон страны, страна взята из входа
+# или по алиасу, есть улица и населённый пункт) остаётся с локальным результатом.
+
+COMPONENTS = ("zip", "country", "street", "locality")
+
+# источник страны (CountryResult.source) -> уверенность
+COUNTRY_SOURCE_SCORE = {"input": 1.0, "alias": 1.0, "iso": 1.0, "inferred_zip": 0.5, "unknown": 0.0}
+
+DEFAULT_THRESHOLDS: Dict[str, float] = {"zip": 1.0, "country": 1.0, "street": 1.0, "locality": 1.0}
+
+def parse_thresholds(spec: Union[str, Mapping[str, float], None]) -> Optional[Dict[str, float]]:
+    """
+    'default' / '' -> DEFAULT_THRESHOLDS; 'zip=1,country=0.5,street=0' — поверх умолчаний
+    (0 — компонент не проверяется); dict — так же. None — маршрутизация выключена.
+    """
+    if spec is None:
+        return None
+    if isinstance(spec, str):
+        items = {}
+        for part in spec.replace(",", " ").split():
+            if part == "default":
+                continue
+            name, sep, value = part.partition("=")
+            if not sep:
+                raise ValueError(f"Порог libpostal: ожидается компонент=значение, получено {part!r}")
+            try:
+                items[name.strip()] = float(value)
+            except ValueError:
+                raise ValueError(f"Порог libpostal для {name!r}: не число ({value!r})") from None
+        spec = items
+    unknown = [k for k in spec if k not in COMPONENTS]
+    if unknown:
+        raise ValueError(f"Неизвестные компоненты порога: {', '.join(unknown)} (доступны: {', '.join(COMPONENTS)})")
+    return {**DEFAULT_THRESHOLDS, **{k: float(v) for k, v in spec.items()}}
+
+def component_scores(zip_valid: pd.Series, country_source: pd.Series, street: pd.Series,
+                     locality: pd.Series) -> pd.DataFrame:
+    """Уверенность по компонентам строки (0..1), колонки COMPONENTS."""
+    def filled(s: pd.Series) -> pd.Series:
+        return (s.fillna("").astype(str).str.strip() != "").astype(float).reset_index(drop=True)
+
+    return pd.DataFrame({
+        "zip": zip_valid.fillna(False).astype(float).reset_index(drop=True),
+        "country": country_source.map(COUNTRY_SOURCE_SCORE).fillna(0.0).astype(float).reset_index(drop=True),
+        "street": filled(street),
+        "locality": filled(locality),
+    })
+
+def confidence(scores: pd.DataFrame) -> pd.Series:
+    """Итоговая уверенность строки — среднее по компонентам."""
+    return scores.mean(axis=1).round(2)
+
+def needs_libpostal(scores: pd.DataFrame, thresholds: Mapping[str, float]) -> pd.Series:
+    """True — строку стоит отдать libpostal: хотя бы один компонент ниже своего порога."""
+    mask = pd.Series(False, index=scores.index)
+    for comp in COMPONENTS:
+        mask |= scores[comp] < thresholds.get(comp, 0.0)
+    return mask
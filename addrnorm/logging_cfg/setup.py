@@ -1,26 +1,197 @@
-import logging, sys, os
+import atexit, contextlib, contextvars, json, logging, queue, sys, os, threading, time, uuid
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def setup_logging(logs_dir: str = "logs", level: str = "INFO") -> logging.Logger:
+# Логи не пишутся из горячего кода напрямую: логгер "addrnorm" кладёт записи в очередь,
+# файл и stdout обслуживает фоновый QueueListener. Воркеры пула (worker_logging) пишут
+# в ту же очередь (multiprocessing), поэтому ротируемый файл один и пишет его один процесс.
+
+_LISTENER: QueueListener | None = None
+_QUEUE = None
+_RUN_ID: str | None = None
+_CONFIG: tuple | None = None  # параметры работающего слушателя — повторный setup_logging с ними же ничего не делает
+_CONTEXT: contextvars.ContextVar[dict] = contextvars.ContextVar("addrnorm_log_context", default={})
+
+# поля LogRecord, которые не попадают в JSON как «extra»
+_STD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """JSON-lines: ts, level, msg, run_id/chunk_id, процесс и всё, что передано через extra (metrics, ...)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        obj = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "process": record.processName,
+            "pid": record.process,
+        }
+        for k, v in vars(record).items():
+            if k not in _STD_ATTRS and v is not None:
+                obj[k] = v
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            obj["exc"] = record.exc_text
+        return json.dumps(obj, ensure_ascii=False, default=str)
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        s = super().format(record)
+        n = getattr(record, "suppressed", None)
+        return f"{s} [+{n} similar suppressed]" if n else s
+
+class _ContextFilter(logging.Filter):
+    """Проставляет run_id и поля log_context (chunk_id, stage, ...) в запись."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "run_id", None) is None:
+            record.run_id = _RUN_ID
+        for k, v in _CONTEXT.get().items():
+            if getattr(record, k, None) is None:
+                setattr(record, k, v)
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Сэмплирование повторяющихся записей (ключ — логгер, уровень и шаблон сообщения):
+    в окне window_s проходят первые burst, дальше — каждая sample_every-я; число
+    пропущенных приписывается к следующей прошедшей (record.suppressed).
+    Записи выше max_level (ERROR и т.п.) проходят всегда.
+    """
+
+    def __init__(self, burst: int = 20, sample_every: int = 1000, window_s: float = 60.0,
+                 max_level: int = logging.WARNING, max_keys: int = 10000):
+        super().__init__()
+        self.burst, self.sample_every, self.window_s = burst, sample_every, window_s
+        self.max_level, self.max_keys = max_level, max_keys
+        self._state: dict = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            st = self._state.get(key)
+            if st is None:
+                if len(self._state) >= self.max_keys:
+                    self._state.clear()
+                st = self._state[key] = [now, 0, 0]  # начало окна, записей в окне, пропущено
+            elif now - st[0] >= self.window_s:
+                st[0], st[1] = now, 0
+            st[1] += 1
+            if st[1] <= self.burst or (st[1] - self.burst) % self.sample_every == 0:
+                if st[2]:
+                    record.suppressed = st[2]
+                    st[2] = 0
+                return True
+            st[2] += 1
+            return False
+
+class _ProcessCounter(logging.Handler):
+    """Сводка на стороне слушателя: сколько записей какого уровня пришло от каждого процесса."""
+
+    def __init__(self):
+        super().__init__()
+        self.counts: dict = {}
+
+    def emit(self, record: logging.LogRecord):
+        key = f"{record.processName}:{record.process}"
+        per = self.counts.setdefault(key, {})
+        per[record.levelname] = per.get(record.levelname, 0) + 1
+
+def _queue_handler(q, level: int, rate_limit: bool) -> QueueHandler:
+    qh = QueueHandler(q)
+    qh.setLevel(level)
+    qh.addFilter(_ContextFilter())
+    if rate_limit:
+        qh.addFilter(RateLimitFilter())
+    return qh
+
+def stop_logging():
+    """Дописать очередь и остановить фоновый слушатель (вызывается и при выходе)."""
+    global _LISTENER, _CONFIG
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        for h in _LISTENER.handlers:
+            h.close()
+        _LISTENER = None
+    _CONFIG = None
+
+atexit.register(stop_logging)
+
+def setup_logging(logs_dir: str = "logs", level: str = "INFO", json_format: bool = False,
+                  run_id: str | None = None, multiprocess: bool = False, mp_context: str | None = None,
+                  rate_limit: bool = True) -> logging.Logger:
+    """
+    json_format — файл в JSON-lines (stdout остаётся текстовым).
+    multiprocess — очередь multiprocessing: её (logger.log_queue) передают в worker_logging
+    воркеров пула, все процессы пишут через один слушатель. mp_context ("fork"/"spawn") —
+    должен совпадать с контекстом пула. rate_limit — сэмплировать повторяющиеся записи
+    (RateLimitFilter на обработчике очереди: один на логгер, счётчики живут вместе со слушателем).
+    Повторный вызов с теми же параметрами (перезапуск страницы Streamlit) возвращает уже
+    настроенный логгер: тот же файл и тот же run_id.
+    """
+    global _LISTENER, _QUEUE, _RUN_ID, _CONFIG
+    logger = logging.getLogger("addrnorm")
+    config = (os.path.abspath(logs_dir), level.upper(), json_format, multiprocess, mp_context, rate_limit)
+    if _LISTENER is not None and _CONFIG == config and run_id in (None, _RUN_ID):
+        return logger
+    stop_logging()
     os.makedirs(logs_dir, exist_ok=True)
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    log_path = os.path.join(logs_dir, f"addrnorm_{ts}.log")
+    log_path = os.path.join(logs_dir, f"addrnorm_{ts}.{'jsonl' if json_format else 'log'}")
+    _RUN_ID = run_id or uuid.uuid4().hex[:12]
 
-    logger = logging.getLogger("addrnorm")
-    logger.setLevel(getattr(logging, level.upper(), logging.INFO))
+    lvl = getattr(logging, level.upper(), logging.INFO)
+    logger.setLevel(lvl)
     logger.handlers.clear()
 
-    fmt = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
+    text_fmt = _TextFormatter("%(asctime)s | %(levelname)s | %(message)s")
 
     fh = RotatingFileHandler(log_path, maxBytes=5_000_000, backupCount=3, encoding="utf-8")
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
+    fh.setFormatter(JsonFormatter() if json_format else text_fmt)
 
     sh = logging.StreamHandler(sys.stdout)
-    sh.setFormatter(fmt)
-    logger.addHandler(sh)
+    sh.setFormatter(text_fmt)
+
+    counter = _ProcessCounter()
+    if multiprocess:
+        import multiprocessing
+        _QUEUE = multiprocessing.get_context(mp_context).Queue(-1)
+    else:
+        _QUEUE = queue.SimpleQueue()
+    _LISTENER = QueueListener(_QUEUE, fh, sh, counter, respect_handler_level=True)
+    _LISTENER.start()
+    _CONFIG = config
+    logger.addHandler(_queue_handler(_QUEUE, lvl, rate_limit))
 
     logger.log_path = log_path  # <- добавили
-    logger.info("Logger initialized → %s", log_path)
+    logger.log_queue = _QUEUE
+    logger.run_id = _RUN_ID
+    logger.process_counts = counter.counts
+    logger.info("Logger initialized → %s (run %s)", log_path, _RUN_ID)
     return logger
+
+def worker_logging(log_queue, level: str = "INFO", run_id: str | None = None, rate_limit: bool = True):
+    """Инициализатор воркера пула: логгер "addrnorm" пишет в очередь главного процесса."""
+    global _RUN_ID, _LISTENER
+    _LISTENER = None  # слушатель (унаследованный при fork) принадлежит главному процессу
+    _RUN_ID = run_id
+    logger = logging.getLogger("addrnorm")
+    lvl = getattr(logging, level.upper(), logging.INFO)
+    logger.setLevel(lvl)
+    logger.handlers.clear()
+    logger.addHandler(_queue_handler(log_queue, lvl, rate_limit))
+    logger.propagate = False
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Поля (chunk_id=..., stage=...) для всех записей внутри блока — в JSON они идут отдельными ключами."""
+    token = _CONTEXT.set({**_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional
+
+from .clean.text_normalize import norm_text
+from .synth.assemble import assemble_addr_norm, combine_street
+from .parse.zipcode import normalize_zip
+from .parse.country import normalize_country
+from .parse.region import normalize_region
+from .parse.locality import normalize_locality
+from .parse.street import normalize_street, abbr_index
+from .rules.registry import profile_loaded
+from .libpostal.client import LibPostalClient, get_client
+from .libpostal.postprocess import parse_safe, merge_components
+
+def _cell(rec: Mapping[str, Any], col: str) -> str:
+    # как safe_get + dtype="string": отсутствующее поле -> "", прочее -> str
+    v = rec.get(col)
+    return "" if v is None else str(v)
+
+class Normalizer:
+    """
+    Построчный API поверх того же конвейера, что и process_dataframe (без pandas).
+    Профиль и индексы грузятся один раз в конструкторе; повторяющиеся значения полей
+    кэшируются (LRU на уровне каждого нормализатора).
+
+        nz = Normalizer(output_mode="extended")
+        nz.normalize_record({"country": "USA", "zip": "10001", "street": "5th Ave"})
+        for row in nz.normalize_iter(records): ...
+    """
+
+    def __init__(self, output_mode: str = "addr-only", use_libpostal: bool = False,
+                 libpostal_url: str = "http://localhost:8080", cache_size: Optional[int] = 65536):
+        self.output_mode = output_mode
+        self.use_libpostal = use_libpostal
+        self.libpostal_url = libpostal_url
+        self._lp: Optional[LibPostalClient] = None
+
+        # прогрев: профиль/снапшот и индекс сокращений улиц
+        profile_loaded()
+        abbr_index()
+
+        # cache_size=None — без ограничения, 0 — без кэша
+        self._zip_country = lru_cache(maxsize=cache_size)(self._zip_country_uncached)
+        self._region = lru_cache(maxsize=cache_size)(normalize_region)
+        self._locality = lru_cache(maxsize=cache_size)(normalize_locality)
+        self._street = lru_cache(maxsize=cache_size)(normalize_street)
+        self._norm_text = lru_cache(maxsize=cache_size)(norm_text)
+
+    @staticmethod
+    def _zip_country_uncached(country_raw: str, zip_raw: str):
+        country_c = norm_text(country_raw)
+        zipc = norm_text(zip_raw)
+        zr = normalize_zip(None if not country_c else country_c, zipc)
+        cr = normalize_country(country_c, zr.country_inferred)
+        return zr.zip_norm, cr.name, cr.iso2
+
+    @property
+    def libpostal(self) -> LibPostalClient:
+        if self._lp is None:
+            self._lp = get_client(self.libpostal_url, timeout=5.0, retries=1)
+        return self._lp
+
+    def components(self, rec: Mapping[str, Any]) -> Dict[str, str]:
+        """Нормализованные компоненты одной записи (до форматирования вывода)."""
+        zip_norm, country, country_iso = self._zip_country(_cell(rec, "country"), _cell(rec, "zip"))
+        district = self._norm_text(_cell(rec, "district"))
+        region = self._region(_cell(rec, "region"), country_iso, country)
+        locality = self._locality(_cell(rec, "locality"), country_iso, country)
+        street = self._street(_cell(rec, "street"))
+        house_number = ""  # дом пока не выделяем
+
+        addr_norm = assemble_addr_norm(country, region, district, locality, street, house_number, zip_norm, country_iso)
+
+        if self.use_libpostal:
+            comps = parse_safe(addr_norm, self.libpostal)
+            street, locality, region, zip_norm, country, country_iso = merge_components(
+                comps, street, locality, region, zip_norm, country, country_iso
+            )
+            addr_norm = assemble_addr_norm(country, region, district, locality, street, house_number, zip_norm, country_iso)
+
+        return {
+            "street": street,
+            "house_number": house_number,
+            "locality": locality,
+            "district": district,
+            "region": region,
+            "zip": zip_norm,
+            "country": country,
+            "country_iso2": country_iso or "",
+            "addr_norm": addr_norm,
+        }
+
+    def normalize_record(self, rec: Mapping[str, Any]) -> Dict[str, Any]:
+        """Одна запись -> dict в формате строки результата process_dataframe."""
+        c = self.components(rec)
+        if self.output_mode == "addr-only":
+            out = dict(rec)
+            out["country_norm"] = c["country"]
+            out["addr_norm"] = c["addr_norm"]
+            return out
+        return {
+            "street":        combine_street(c["street"], c["house_number"]),
+            "locality_norm": c["locality"],
+            "district_norm": c["district"],
+            "region_norm":   c["region"],
+            "zip_norm":      c["zip"],
+            "country_norm":  c["country"],
+            "addr_norm":     c["addr_norm"],
+        }
+
+    def normalize_iter(self, records: Iterable[Mapping[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Ленивый генератор: по одной записи на выходе, память не растёт с длиной входа."""
+        for rec in records:
+            yield self.normalize_record(rec)
+
+    def cache_info(self) -> Dict[str, Any]:
+        return {
+            "zip_country": self._zip_country.cache_info(),
+            "region": self._region.cache_info(),
+            "locality": self._locality.cache_info(),
+            "street": self._street.cache_info(),
+            "district": self._norm_text.cache_info(),
+        }
@@ -17,10 +17,17 @@ _PREFIXES = [
 ]
 _PREFIXES_RE = re.compile(rf"^({'|'.join(_PREFIXES)})\s+", flags=re.IGNORECASE)
 
-_PARENS_NOISE_RE = re.compile(
-    r"\((?:[^)]*район[^)]*|[^)]*округ[^)]*|[^)]*municipality[^)]*|[^)]*county[^)]*|[^)]*district[^)]*)\)",
-    re.IGNORECASE,
-)
+# «админ.» скобки: (… район …), (… county …) и т.п. Скобка без закрывающей съедается
+# до конца строки одним матчем и возвращается как есть — поиск остаётся линейным
+# (вариант с [^)]*район[^)]* квадратично бэктрекал на строках из многих «(»).
+_PARENS_RE = re.compile(r"\([^)]*\)?")
+_PARENS_NOISE_WORDS = ("район", "округ", "municipality", "county", "district")
+
+def _drop_admin_parens(m: re.Match) -> str:
+    t = m.group(0)
+    if t.endswith(")") and any(w in t.lower() for w in _PARENS_NOISE_WORDS):
+        return ""
+    return t
 
 _GARBAGE = {"", "n/a", "na", "null", "none", "-", "unknown", "неизвестно"}
 
@@ -80,7 +87,7 @@ def normalize_locality(locality_raw: Optional[str], country_iso2: Optional[str]
         return ""
 
     s = _EDGES_RE.sub("", s)
-    s = _collapse_ws(_PARENS_NOISE_RE.sub("", s))
+    s = _collapse_ws(_PARENS_RE.sub(_drop_admin_parens, s))
     s = _PREFIXES_RE.sub("", s)
     s = _first_meaningful_segment(s)
     s = _collapse_ws(_EDGES_RE.sub("", s))
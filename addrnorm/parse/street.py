@@ -54,15 +54,24 @@ def _build_alias_index() -> dict[str, dict[str, str]]:
                 idx[group][k] = canon_norm
     return idx
 
-_ABBR_IDX = _build_alias_index()
+# строится лениво при первом вызове (не на импорте модуля)
+_ABBR_IDX: dict[str, dict[str, str]] | None = None
+
+def abbr_index() -> dict[str, dict[str, str]]:
+    """Индекс сокращений {"latin"|"cyrillic": {alias: canon}}; первый вызов строит его (прогрев)."""
+    global _ABBR_IDX
+    if _ABBR_IDX is None:
+        _ABBR_IDX = _build_alias_index()
+    return _ABBR_IDX
 
 def _normalize_abbr_tokens(s: str) -> str:
-    if not _ABBR_IDX["latin"] and not _ABBR_IDX["cyrillic"]:
+    abbr = abbr_index()
+    if not abbr["latin"] and not abbr["cyrillic"]:
         return s
     group = _script_of(s)
-    idx = _ABBR_IDX.get(group, {})
+    idx = abbr.get(group, {})
     if not idx:
-        idx = {**_ABBR_IDX.get("latin", {}), **_ABBR_IDX.get("cyrillic", {})}
+        idx = {**abbr.get("latin", {}), **abbr.get("cyrillic", {})}
 
     out_words = []
     for w in s.split(" "):
@@ -0,0 +1,221 @@
+from __future__ import annotations
+import argparse, hashlib, logging, os, pickle, threading, time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from ..io.output import write_bytes_atomic
+from ..rules.registry import get_profile_fingerprint
+
+# Индекс согласованности ZIP ↔ населённый пункт/регион: (iso2, ZIP) и (iso2, префикс ZIP)
+# -> известные населённые пункты (по убыванию частоты) и регионы. Строится по справочнику
+# (CSV в формате входа или GeoNames postal codes) или по доверенному датасету — через тот же
+# конвейер нормализации, поэтому сравнение идёт по нормализованным значениям.
+# На диске — pickle со словарями строк и кортежами id: грузится за доли секунды.
+
+INDEX_VERSION = 2
+DEFAULT_INDEX_PATH = os.path.join("configs", "zip_index.pkl")
+DEFAULT_PREFIX_LENGTHS = (3,)
+
+# статусы проверки строки (поле zip_consistency)
+OK, UNKNOWN, BAD_LOCALITY, BAD_REGION, BAD_BOTH = "ok", "unknown", "locality", "region", "locality+region"
+
+logger = logging.getLogger("addrnorm")
+
+# запись: (id населённых пунктов по убыванию частоты, их частоты, id регионов,
+# число строк с населённым пунктом у ключа — до отсева по min_share)
+Entry = Tuple[Tuple[int, ...], Tuple[int, ...], Tuple[int, ...], int]
+
+def _key(s) -> str:
+    return str(s).strip().casefold() if s is not None and not pd.isna(s) else ""
+
+class ConsistencyIndex:
+    def __init__(self, localities: List[str], regions: List[str], exact: Dict[Tuple[str, str], Entry],
+                 prefix: Dict[Tuple[str, str], Entry], prefix_lengths: Sequence[int] = DEFAULT_PREFIX_LENGTHS,
+                 meta: Optional[dict] = None):
+        self.localities, self.regions = localities, regions
+        self.exact, self.prefix = exact, prefix
+        self.prefix_lengths = tuple(sorted(set(prefix_lengths), reverse=True))
+        self.meta = meta or {}
+        self.digest = ""  # sha1 файла индекса (после load) — для чекпоинтов и хэшей строк
+        self._loc_ids = {_key(s): i for i, s in enumerate(localities)}
+        self._reg_ids = {_key(s): i for i, s in enumerate(regions)}
+
+    def lookup(self, iso2: Optional[str], zip_norm: str) -> Tuple[Optional[Entry], bool]:
+        """(запись, exact): сначала ZIP целиком, затем самый длинный известный префикс."""
+        if not iso2 or not zip_norm:
+            return None, False
+        e = self.exact.get((iso2, zip_norm))
+        if e is not None:
+            return e, True
+        for n in self.prefix_lengths:
+            if len(zip_norm) > n:
+                e = self.prefix.get((iso2, zip_norm[:n]))
+                if e is not None:
+                    return e, False
+        return None, False
+
+    def check(self, iso2: Sequence[Optional[str]], zip_norm: Iterable, locality: Iterable,
+              region: Iterable) -> pd.Series:
+        """Статус по строкам: ok / unknown (ZIP нет в индексе) / locality / region / locality+region; "" — нечего проверять."""
+        out = []
+        for iso, z, loc, reg in zip(iso2, zip_norm, locality, region):
+            z = "" if z is None or pd.isna(z) else str(z)
+            entry, _ = self.lookup(iso, z)
+            if entry is None:
+                out.append(UNKNOWN if iso and z else "")
+                continue
+            lk, rk = _key(loc), _key(reg)
+            # пустой список населённых пунктов — нет данных (как и у регионов), а не несовпадение
+            bad_loc = bool(lk) and bool(entry[0]) and self._loc_ids.get(lk, -1) not in entry[0]
+            bad_reg = bool(rk) and bool(entry[2]) and self._reg_ids.get(rk, -1) not in entry[2]
+            out.append(BAD_BOTH if bad_loc and bad_reg else BAD_LOCALITY if bad_loc else BAD_REGION if bad_reg else OK)
+        return pd.Series(out, dtype="string")
+
+    def fill_locality(self, iso2: Sequence[Optional[str]], zip_norm: Iterable, locality: Iterable,
+                      min_share: float = 0.9) -> Tuple[List[str], int]:
+        """
+        Пустой населённый пункт -> самый частый для этого ZIP (только точное совпадение ZIP
+        и доля не ниже min_share — от всех строк ZIP, а не от оставшихся после отсева при
+        построении). Возвращает (значения, сколько заполнено).
+        """
+        out, filled = [], 0
+        for iso, z, loc in zip(iso2, zip_norm, locality):
+            loc = "" if loc is None or pd.isna(loc) else loc
+            if not loc and iso and z and not pd.isna(z):
+                entry, exact = self.lookup(iso, str(z))
+                if entry is not None and exact and entry[0] and entry[1][0] >= min_share * entry[3]:
+                    loc = self.localities[entry[0][0]]
+                    filled += 1
+            out.append(loc)
+        return out, filled
+
+    # ---------- диск ----------
+    def save(self, path: str = DEFAULT_INDEX_PATH) -> str:
+        payload = {
+            "version": INDEX_VERSION, "localities": self.localities, "regions": self.regions,
+            "exact": self.exact, "prefix": self.prefix, "prefix_lengths": self.prefix_lengths, "meta": self.meta,
+        }
+        write_bytes_atomic(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> "ConsistencyIndex":
+        with open(path, "rb") as f:
+            data = f.read()
+        obj = pickle.loads(data)
+        if not isinstance(obj, dict) or obj.get("version") != INDEX_VERSION:
+            raise ValueError(f"{path}: неподдерживаемая версия индекса — пересоберите его")
+        idx = cls(obj["localities"], obj["regions"], obj["exact"], obj["prefix"], obj["prefix_lengths"], obj["meta"])
+        idx.digest = hashlib.sha1(data).hexdigest()[:16]
+        fp = get_profile_fingerprint()
+        if idx.meta.get("profile_fingerprint") and fp and idx.meta["profile_fingerprint"] != fp:
+            logger.warning("ZIP index %s was built with another profile — rebuild it if checks look off", path)
+        return idx
+
+# индексы, загруженные в процессе: путь -> (mtime_ns, индекс)
+_INDEXES: Dict[str, Tuple[int, ConsistencyIndex]] = {}
+_INDEXES_LOCK = threading.Lock()
+
+def get_index(path: str = DEFAULT_INDEX_PATH) -> ConsistencyIndex:
+    """Индекс с диска, один раз на процесс (перечитывается, если файл изменился)."""
+    key = os.path.abspath(path)
+    mtime = os.stat(key).st_mtime_ns
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = _INDEXES[key] = (mtime, ConsistencyIndex.load(key))
+        return cached[1]
+
+# ---------- построение ----------
+
+def _entries(keys: pd.DataFrame, loc_ids: pd.Series, reg_ids: pd.Series, min_share: float) -> Dict[Tuple[str, str], Entry]:
+    loc = pd.DataFrame({"iso": keys["iso"], "zip": keys["zip"], "id": loc_ids})
+    loc = loc[loc["id"] >= 0].value_counts().reset_index(name="n")
+    loc["total"] = loc.groupby(["iso", "zip"])["n"].transform("sum")
+    totals = loc.drop_duplicates(["iso", "zip"])
+    loc = loc[loc["n"] >= min_share * loc["total"]].sort_values(["iso", "zip", "n", "id"], ascending=[True, True, False, True])
+    reg = pd.DataFrame({"iso": keys["iso"], "zip": keys["zip"], "id": reg_ids})
+    reg = reg[reg["id"] >= 0].drop_duplicates().sort_values(["iso", "zip", "id"])
+
+    # один проход по отсортированным строкам (groupby по миллиону ZIP заметно медленнее)
+    out: Dict[Tuple[str, str], list] = {}
+    for iso, z, t in zip(totals["iso"].tolist(), totals["zip"].tolist(), totals["total"].tolist()):
+        out[(iso, z)] = [[], [], [], int(t)]
+    for iso, z, i, n in zip(loc["iso"].tolist(), loc["zip"].tolist(), loc["id"].tolist(), loc["n"].tolist()):
+        e = out[(iso, z)]
+        e[0].append(int(i))
+        e[1].append(int(n))
+    for iso, z, i in zip(reg["iso"].tolist(), reg["zip"].tolist(), reg["id"].tolist()):
+        out.setdefault((iso, z), [[], [], [], 0])[2].append(int(i))
+    return {k: (tuple(a), tuple(b), tuple(c), t) for k, (a, b, c, t) in out.items()}
+
+def build_index(df: pd.DataFrame, prefix_lengths: Sequence[int] = DEFAULT_PREFIX_LENGTHS,
+                min_share: float = 0.0, source: str = "") -> ConsistencyIndex:
+    """
+    Индекс по таблице с колонками country, zip, locality, region (как во входе).
+    Значения проходят тот же конвейер, что и проверяемые данные. min_share — отбросить
+    населённые пункты, которые встречаются у ZIP реже этой доли (шум в обучающем датасете);
+    только для точных ZIP, не для префиксов.
+    """
+    from ..io.writer import process_dataframe  # writer сам импортирует этот модуль
+
+    norm, _ = process_dataframe(df, fields=["country_iso2", "zip_norm", "locality_norm", "region_norm"])
+    norm = norm.fillna("")
+    norm = norm[(norm["country_iso2"] != "") & (norm["zip_norm"] != "")]
+
+    # словари: первое написание каждого значения (без учёта регистра)
+    def vocab(col: pd.Series) -> Tuple[List[str], pd.Series]:
+        keys = col.map(_key)
+        first = pd.DataFrame({"k": keys, "v": col})[keys != ""].drop_duplicates("k")
+        ids = {k: i for i, k in enumerate(first["k"])}
+        return first["v"].tolist(), keys.map(lambda k: ids.get(k, -1))
+
+    localities, loc_ids = vocab(norm["locality_norm"])
+    regions, reg_ids = vocab(norm["region_norm"])
+    keys = pd.DataFrame({"iso": norm["country_iso2"], "zip": norm["zip_norm"]})
+
+    exact = _entries(keys, loc_ids, reg_ids, min_share)
+    prefix: Dict[Tuple[str, str], Entry] = {}
+    for n in sorted(set(prefix_lengths)):
+        pk = keys.assign(zip=keys["zip"].str.slice(0, n))
+        # префикс объединяет много ZIP, у каждого пункта доля мала по построению — min_share не применяем
+        prefix.update(_entries(pk[keys["zip"].str.len() > n], loc_ids, reg_ids, 0.0))
+
+    meta = {
+        "source": source, "rows": int(len(norm)), "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "profile_fingerprint": get_profile_fingerprint(), "zips": len(exact), "prefixes": len(prefix),
+    }
+    return ConsistencyIndex(localities, regions, exact, prefix, prefix_lengths, meta)
+
+def read_geonames(path: str) -> pd.DataFrame:
+    """GeoNames postal codes (allCountries.txt и т.п.): country, zip, place name, admin1 — без заголовка, TAB."""
+    raw = pd.read_csv(path, sep="\t", header=None, usecols=[0, 1, 2, 3], dtype="string",
+                      keep_default_na=False, quoting=3)
+    raw.columns = ["country", "zip", "locality", "region"]
+    return raw
+
+def main(argv: Optional[Sequence[str]] = None):
+    from ..io.reader import read_csv_any
+
+    ap = argparse.ArgumentParser(description="AddrNormalizer: построить индекс ZIP ↔ населённый пункт/регион")
+    ap.add_argument("source", help="справочник или доверенный датасет (CSV с колонками country, zip, locality, region)")
+    ap.add_argument("-o", "--output", default=DEFAULT_INDEX_PATH)
+    ap.add_argument("--geonames", action="store_true", help="источник в формате GeoNames postal codes (TSV)")
+    ap.add_argument("--prefix-lengths", default="3", help="длины префиксов ZIP через запятую (0 — без префиксов)")
+    ap.add_argument("--min-share", type=float, default=0.0,
+                    help="отбросить населённые пункты с долей у ZIP ниже этой (шум в обучающих данных)")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    t0 = time.perf_counter()
+    df = read_geonames(args.source) if args.geonames else read_csv_any(args.source)
+    lengths = [int(x) for x in args.prefix_lengths.replace(",", " ").split() if int(x) > 0]
+    idx = build_index(df, prefix_lengths=lengths, min_share=args.min_share, source=os.path.abspath(args.source))
+    idx.save(args.output)
+    logger.info("ZIP index %s: %s rows → %s ZIPs, %s prefixes, %s localities, %s regions in %.1fs",
+                args.output, idx.meta["rows"], idx.meta["zips"], idx.meta["prefixes"],
+                len(idx.localities), len(idx.regions), time.perf_counter() - t0)
+
+if __name__ == "__main__":
+    main()
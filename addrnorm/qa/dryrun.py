@@ -0,0 +1,290 @@
+from __future__ import annotations
+import os, time, tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..io.reader import iter_csv_chunks, safe_get
+from ..io.writer import process_dataframe
+from .reports import ORDER
+
+# Dry-run: нормализуем стратифицированную выборку и экстраполируем на весь файл
+# время по этапам, объём вызовов libpostal, доли изменённых/очищенных значений и память.
+
+FIELDS = ["zip", "country", "region", "district", "locality", "street"]
+TOP_COUNTRIES = 30  # остальные страны — в одну страту "other"
+MIN_CHUNK_ROWS = 1000           # меньший чанк не окупает накладные расходы на чанк
+MIN_ROWS_PER_WORKER = 20_000    # меньше — запуск процесса и загрузка профиля не окупаются
+
+@dataclass
+class DryRunReport:
+    total_rows: int
+    sample_rows: int
+    strata: int
+    stage_seconds: Dict[str, float] = field(default_factory=dict)     # на выборке
+    stage_rows_per_s: Dict[str, float] = field(default_factory=dict)
+    est_runtime_s: float = 0.0                                        # 1 процесс, весь файл
+    est_runtime_by_workers: Dict[int, float] = field(default_factory=dict)
+    libpostal: bool = False
+    est_libpostal_calls: int = 0
+    libpostal_avoided_share: Optional[float] = None                   # доля вызовов, снятых порогами
+    libpostal_ms_per_call: float = 0.0
+    est_libpostal_s: float = 0.0
+    change_rate: Dict[str, float] = field(default_factory=dict)
+    clear_rate: Dict[str, float] = field(default_factory=dict)
+    input_bytes_per_row: float = 0.0
+    peak_bytes_per_row: float = 0.0
+    est_peak_bytes: int = 0                                           # без разбиения на чанки
+    recommended_chunk_size: int = 0
+    recommended_workers: int = 1
+
+    def to_lines(self) -> List[str]:
+        mb = 1024 * 1024
+        lines = [
+            f"Строк в файле: {self.total_rows}, в выборке: {self.sample_rows} (страт: {self.strata})",
+            f"Оценка времени (1 процесс): {_fmt_s(self.est_runtime_s)}",
+        ]
+        for w, t in sorted(self.est_runtime_by_workers.items()):
+            if w > 1:
+                lines.append(f"  при {w} процессах: ~{_fmt_s(t)}")
+        lines.append("Пропускная способность по этапам (строк/с):")
+        for name, rps in self.stage_rows_per_s.items():
+            lines.append(f"  {name:<10} {rps:,.0f}".replace(",", " "))
+        if self.libpostal:
+            lines.append(
+                f"libpostal: ~{self.est_libpostal_calls} вызовов после дедупликации, "
+                f"{self.libpostal_ms_per_call:.1f} мс/вызов, ~{_fmt_s(self.est_libpostal_s)}"
+            )
+            if self.libpostal_avoided_share is not None:
+                lines.append(f"  пороги уверенности снимают {self.libpostal_avoided_share:.0%} вызовов")
+        lines.append("Ожидаемые изменения по колонкам (изменено / очищено):")
+        for col in ORDER:
+            if col in self.change_rate:
+                lines.append(f"  {col:<10} {self.change_rate[col]:6.1%} / {self.clear_rate.get(col, 0.0):6.1%}")
+        lines.append(
+            f"Память: вход ~{self.input_bytes_per_row:.0f} Б/строку, пик обработки ~{self.peak_bytes_per_row:.0f} Б/строку, "
+            f"пик без чанков ~{self.est_peak_bytes / mb:.0f} МБ"
+        )
+        lines.append(f"Рекомендации: chunk_size={self.recommended_chunk_size}, workers={self.recommended_workers}")
+        return lines
+
+def _fmt_s(sec: float) -> str:
+    if sec < 60:
+        return f"{sec:.1f} с"
+    if sec < 3600:
+        return f"{sec / 60:.1f} мин"
+    return f"{sec / 3600:.2f} ч"
+
+def _country_mask(df: pd.DataFrame):
+    """(страна как во входе, в нижнем регистре; маска заполненности полей "|1|0...")."""
+    country = safe_get(df, "country").fillna("").str.strip().str.lower()
+    mask = np.full(len(df), "", dtype=object)
+    for col in FIELDS:
+        filled = safe_get(df, col).fillna("").str.strip() != ""
+        mask = mask + np.where(filled.to_numpy(), "|1", "|0")
+    return country, pd.Series(mask, index=df.index)
+
+def strata_keys(df: pd.DataFrame, top: Optional[set] = None) -> pd.Series:
+    """Страта строки: страна (как во входе, top-N) + маска заполненности полей."""
+    country, mask = _country_mask(df)
+    if top is None:
+        top = set(country.value_counts().index[:TOP_COUNTRIES])
+    country = country.where(country.isin(top), "other")
+    return pd.Series(country.astype(object) + mask, index=df.index)
+
+def _allocate(df: pd.DataFrame, keys: pd.Series, sizes: Dict[str, int], sample_size: int, total: int, seed: int):
+    """
+    Пропорциональное размещение, минимум 1 на страту. sizes — размер страты во всём файле
+    (df может быть лишь его равномерной подвыборкой); вес строки выборки — size / k.
+    """
+    rng = np.random.default_rng(seed)
+    groups = keys.groupby(keys, sort=False).indices
+    picked, weights = [], []
+    for key, idx in groups.items():
+        size = sizes.get(key, len(idx))
+        k = size if sample_size >= total else max(1, int(round(sample_size * size / total)))
+        k = min(k, len(idx))
+        chosen = rng.choice(idx, size=k, replace=False) if k < len(idx) else idx
+        picked.append(chosen)
+        weights.append(np.full(k, size / k))
+    order = np.concatenate(picked) if picked else np.array([], dtype=int)
+    w = np.concatenate(weights) if weights else np.array([])
+    return df.iloc[order].reset_index(drop=True), w
+
+def stratified_sample(df: pd.DataFrame, sample_size: int, seed: int = 0):
+    """(выборка, веса строк выборки, число страт). Пропорциональное размещение, минимум 1 на страту."""
+    keys = strata_keys(df)
+    sizes = keys.value_counts().to_dict()
+    sample, w = _allocate(df, keys, sizes, sample_size, len(df), seed)
+    return sample, w, len(sizes)
+
+def _unique_keys(df: pd.DataFrame) -> int:
+    cols = [safe_get(df, c).fillna("") for c in FIELDS]
+    return int(pd.MultiIndex.from_arrays(cols).nunique()) if len(df) else 0
+
+def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Хэш сырых адресных полей строки (uint64) — для подсчёта уникальных ключей без хранения строк."""
+    cols = pd.DataFrame({c: safe_get(df, c).fillna("").to_numpy() for c in FIELDS})
+    return pd.util.hash_pandas_object(cols, index=False).to_numpy()
+
+def recommend_workers(local_s: float, libpostal_s: float, total: int, bytes_per_row: float,
+                      memory_target_mb: float, cpus: int) -> int:
+    """
+    Процессов по замерам: локальная часть делится на процессы, libpostal (пул инстансов) — нет,
+    поэтому берём наименьшее число процессов, которое не дальше 10% от лучшего времени.
+    Ограничения: число CPU, память (каждому процессу — чанк не меньше MIN_CHUNK_ROWS строк
+    в пределах memory_target_mb) и объём файла (не меньше MIN_ROWS_PER_WORKER строк на процесс).
+    """
+    limit = max(1, cpus)
+    limit = min(limit, max(1, -(-total // MIN_ROWS_PER_WORKER)))
+    if bytes_per_row > 0:
+        limit = min(limit, max(1, int(memory_target_mb * 1024 * 1024 // (bytes_per_row * MIN_CHUNK_ROWS))))
+    best = local_s / limit + libpostal_s
+    for k in range(1, limit + 1):
+        if local_s / k + libpostal_s <= best * 1.1:
+            return k
+    return limit
+
+def _estimate(sample: pd.DataFrame, w: np.ndarray, n_strata: int, total: int, unique_total: int,
+              input_bytes_per_row: float, output_mode: str, use_libpostal: bool, libpostal_url: str,
+              libpostal_thresholds, memory_target_mb: float, workers: Optional[int]) -> DryRunReport:
+    m = len(sample)
+    rep = DryRunReport(total_rows=total, sample_rows=m, strata=n_strata, libpostal=use_libpostal)
+    if not m:
+        return rep
+
+    # 1) время по этапам (без tracemalloc — он сам замедляет)
+    stats: dict = {}
+    out, changes = process_dataframe(sample, output_mode=output_mode, use_libpostal=use_libpostal,
+                                     libpostal_url=libpostal_url, libpostal_thresholds=libpostal_thresholds,
+                                     stats=stats)
+    stages = dict(stats.get("stages", {}))
+    lp_s = stages.get("libpostal", 0.0)
+    rep.stage_seconds = stages
+    rep.stage_rows_per_s = {k: (m / v if v > 0 else float("inf")) for k, v in stages.items()}
+    local_per_row = (sum(stages.values()) - lp_s) / m
+
+    # 2) libpostal: уникальные адреса масштабируем через долю уникальных сырых ключей
+    if use_libpostal:
+        calls = stats.get("libpostal_calls", 0)
+        if libpostal_thresholds is not None:
+            avoided = stats.get("libpostal_calls_avoided", 0)
+            rep.libpostal_avoided_share = avoided / (calls + avoided) if calls + avoided else 0.0
+        rep.libpostal_ms_per_call = (lp_s / calls * 1000.0) if calls else 0.0
+        uniq_sample = _unique_keys(sample)
+        ratio = calls / uniq_sample if uniq_sample else 0.0
+        rep.est_libpostal_calls = int(round(unique_total * ratio))
+        rep.est_libpostal_s = rep.est_libpostal_calls * rep.libpostal_ms_per_call / 1000.0
+
+    rep.est_runtime_s = local_per_row * total + rep.est_libpostal_s
+    cpus = workers or os.cpu_count() or 1
+    for k in sorted({1, 2, 4, 8, cpus}):
+        if k <= cpus:
+            # libpostal упирается в пул инстансов, а не в процессы — его время не делится
+            rep.est_runtime_by_workers[k] = local_per_row * total / k + rep.est_libpostal_s
+
+    # 3) доли изменений/очисток по колонкам (взвешенно по стратам)
+    wsum = float(w.sum())
+    for col, (before, after) in changes.items():
+        b = before.fillna("").astype(str).to_numpy()
+        a = after.fillna("").astype(str).to_numpy()
+        rep.change_rate[col] = float((w * (b != a)).sum() / wsum)
+        rep.clear_rate[col] = float((w * ((b != "") & (a == ""))).sum() / wsum)
+
+    # 4) память: вход на строку и пик обработки (tracemalloc, без libpostal — он не влияет на память)
+    rep.input_bytes_per_row = input_bytes_per_row
+    tracemalloc.start()
+    try:
+        process_dataframe(sample, output_mode=output_mode)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rep.peak_bytes_per_row = peak / m
+    rep.est_peak_bytes = int((rep.input_bytes_per_row + rep.peak_bytes_per_row) * total)
+
+    # 5) рекомендации: процессы — по замерам, чанк — по памяти на один процесс
+    per_row = rep.input_bytes_per_row + rep.peak_bytes_per_row
+    rep.recommended_workers = recommend_workers(local_per_row * total, rep.est_libpostal_s, total, per_row,
+                                                memory_target_mb, cpus)
+    budget = memory_target_mb * 1024 * 1024 / rep.recommended_workers
+    chunk = int(budget / per_row) if per_row > 0 else total
+    rep.recommended_chunk_size = max(MIN_CHUNK_ROWS, min(1_000_000, (chunk // 1000) * 1000 or MIN_CHUNK_ROWS))
+    return rep
+
+def estimate_dataframe(df: pd.DataFrame, output_mode: str = "addr-only", use_libpostal: bool = False,
+                       libpostal_url: str = "http://localhost:8080", sample_size: int = 5000,
+                       seed: int = 0, memory_target_mb: float = 1024.0,
+                       workers: Optional[int] = None, libpostal_thresholds=None) -> DryRunReport:
+    sample, w, n_strata = stratified_sample(df, sample_size, seed=seed)
+    return _estimate(sample, w, n_strata, len(df), _unique_keys(df),
+                     float(df.memory_usage(deep=True).sum()) / max(len(df), 1),
+                     output_mode, use_libpostal, libpostal_url, libpostal_thresholds, memory_target_mb, workers)
+
+def scan_file(path: str, address_only: bool = False, reservoir_rows: int = 100_000, seed: int = 0,
+              chunk_rows: int = 100_000) -> dict:
+    """
+    Один проход по файлу чанками: равномерная подвыборка (до reservoir_rows строк: строки
+    с наименьшими случайными ключами), размеры страт, число уникальных адресных ключей
+    и время чтения. В памяти — подвыборка и один чанк, а не весь файл.
+    """
+    rng = np.random.default_rng(seed)
+    keep, prio = None, np.array([])
+    pairs: Dict[tuple, int] = {}
+    hashes = []
+    total, read_s = 0, 0.0
+    chunks = iter_csv_chunks(path, chunk_rows=chunk_rows, address_only=address_only)
+    while True:
+        t0 = time.perf_counter()
+        item = next(chunks, None)
+        read_s += time.perf_counter() - t0
+        if item is None:
+            break
+        chunk = item[0].reset_index(drop=True)
+        total += len(chunk)
+        country, mask = _country_mask(chunk)
+        for key, n in pd.DataFrame({"c": country, "m": mask}).value_counts(sort=False).items():
+            pairs[key] = pairs.get(key, 0) + int(n)
+        hashes.append(np.unique(_row_hashes(chunk)))
+        keep = chunk if keep is None else pd.concat([keep, chunk], ignore_index=True)
+        prio = np.concatenate([prio, rng.random(len(chunk))])
+        if len(keep) > reservoir_rows:
+            idx = np.sort(np.argpartition(prio, reservoir_rows)[:reservoir_rows])
+            keep, prio = keep.iloc[idx].reset_index(drop=True), prio[idx]
+    unique = len(np.unique(np.concatenate(hashes))) if hashes else 0
+    return {"rows": keep, "total": total, "pairs": pairs, "unique_keys": unique, "read_s": read_s}
+
+def estimate_file(path: str, output_mode: str = "addr-only", *, use_libpostal: bool = False,
+                  libpostal_url: str = "http://localhost:8080", sample_size: int = 5000,
+                  seed: int = 0, memory_target_mb: float = 1024.0, workers: Optional[int] = None,
+                  libpostal_thresholds=None, reservoir_rows: Optional[int] = None) -> DryRunReport:
+    """
+    Dry-run по файлу: читаем так же, как обычный прогон (extended — только адресные колонки),
+    но потоково — страты и выборка строятся по равномерной подвыборке (scan_file).
+    """
+    scan = scan_file(path, address_only=output_mode == "extended", seed=seed,
+                     reservoir_rows=reservoir_rows or max(100_000, 20 * sample_size))
+    rows, total, read_s = scan["rows"], scan["total"], scan["read_s"]
+    if rows is None or not total:
+        return DryRunReport(total_rows=0, sample_rows=0, strata=0, libpostal=use_libpostal)
+
+    # топ стран и размеры страт — по всему файлу
+    by_country: Dict[str, int] = {}
+    for (c, _), n in scan["pairs"].items():
+        by_country[c] = by_country.get(c, 0) + n
+    top = set(sorted(by_country, key=lambda c: -by_country[c])[:TOP_COUNTRIES])
+    sizes: Dict[str, int] = {}
+    for (c, msk), n in scan["pairs"].items():
+        key = (c if c in top else "other") + msk
+        sizes[key] = sizes.get(key, 0) + n
+    sample, w = _allocate(rows, strata_keys(rows, top), sizes, sample_size, total, seed)
+
+    rep = _estimate(sample, w, len(sizes), total, scan["unique_keys"],
+                    float(rows.memory_usage(deep=True).sum()) / max(len(rows), 1),
+                    output_mode, use_libpostal, libpostal_url, libpostal_thresholds, memory_target_mb, workers)
+    # чтение измерено на всём файле — добавляем как есть
+    rep.stage_rows_per_s = {"read": total / read_s if read_s > 0 else float("inf"), **rep.stage_rows_per_s}
+    rep.est_runtime_s += read_s
+    rep.est_runtime_by_workers = {k: v + read_s for k, v in rep.est_runtime_by_workers.items()}
+    return rep
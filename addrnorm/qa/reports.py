@@ -6,53 +6,60 @@ from typing import Tuple, List
 ORDER = ["street", "locality", "district", "region", "country", "zip"]
 MAX_VALUE_LEN = 200  # обрезаем каждое значение в логе до 200 символов
 
+# все границы строк str.splitlines: изменение — ровно одна строка и в отчёте, и в файлах изменений батча
+_LINE_BREAKS = str.maketrans({c: " " for c in "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"})
+
 def _trim(s: str) -> str:
     if not s:
         return ""
-    s = s.replace("\r", " ").replace("\n", " ")  # без переносов
+    s = s.translate(_LINE_BREAKS)  # без переносов
     if len(s) <= MAX_VALUE_LEN:
         return s
     return s[:MAX_VALUE_LEN] + "…"
 
-def _iter_changes(before: pd.Series, after: pd.Series, colname: str) -> List[str]:
+def _texts(s: pd.Series) -> List[str]:
+    na = s.isna().to_numpy()
+    return ["" if m else str(v) for v, m in zip(s.tolist(), na)]
+
+def _iter_changes(before: pd.Series, after: pd.Series, colname: str, row_offset: int = 0) -> List[str]:
     out: List[str] = []
-    n = len(before)
-    for i in range(n):
-        b_raw = "" if pd.isna(before.iloc[i]) else str(before.iloc[i])
-        a_raw = "" if pd.isna(after.iloc[i])  else str(after.iloc[i])
+    # значения выгружаем списками один раз — поэлементный .iloc на больших чанках дороже самой нормализации
+    for i, (b_raw, a_raw) in enumerate(zip(_texts(before), _texts(after))):
         if b_raw == a_raw:
             continue
         b = _trim(b_raw)
         a = _trim(a_raw)
         if b and not a:
-            out.append(f"[{colname}] строка {i+1}: \"{b}\" → \"\" (cleared)")
+            out.append(f"[{colname}] строка {row_offset+i+1}: \"{b}\" → \"\" (cleared)")
         else:
-            out.append(f"[{colname}] строка {i+1}: \"{b}\" → \"{a}\"")
+            out.append(f"[{colname}] строка {row_offset+i+1}: \"{b}\" → \"{a}\"")
     return out
 
-def _even_sample(items: List[str], limit: int) -> List[str]:
-    """Равномерная выборка по массиву без numpy; защищена от дублей."""
-    if limit is None or limit <= 0 or len(items) <= limit:
-        return items
-    if len(items) == 0:
-        return items
+def _even_indices(n: int, limit: int) -> List[int]:
+    """Индексы равномерной выборки из n элементов (в порядке вывода); защищена от дублей."""
+    if limit is None or limit <= 0 or n <= limit:
+        return list(range(n))
     if limit == 1:
-        return [items[0]]
-    step = (len(items) - 1) / (limit - 1)
+        return [0]
+    step = (n - 1) / (limit - 1)
     idxs = [round(i * step) for i in range(limit)]
     seen = set()
     result = []
     for i in idxs:
         if i not in seen:
             seen.add(i)
-            result.append(items[i])
+            result.append(i)
     j = 0
-    while len(result) < limit and j < len(items):
+    while len(result) < limit and j < n:
         if j not in seen:
-            result.append(items[j])
+            result.append(j)
         j += 1
     return result
 
+def _even_sample(items: List[str], limit: int) -> List[str]:
+    """Равномерная выборка по массиву без numpy; защищена от дублей."""
+    return [items[i] for i in _even_indices(len(items), limit)]
+
 def build_columnwise_report(changes: dict[str, Tuple[pd.Series, pd.Series]], per_col_limit: int = 20) -> list[str]:
     """
     Длинный список секций по колонкам в порядке ORDER.
@@ -73,6 +80,40 @@ def build_columnwise_report(changes: dict[str, Tuple[pd.Series, pd.Series]], per
         lines.extend(_even_sample(diffs, per_col_limit))
     return lines
 
+def change_lines(changes: dict[str, Tuple[pd.Series, pd.Series]], row_offset: int = 0) -> dict[str, List[str]]:
+    """
+    Все строки «до → после» по колонкам; row_offset — номер первой строки чанка во всём файле.
+    Переносы внутри значений заменены пробелами: одна строка — одно изменение.
+    """
+    return {col: _iter_changes(before, after, col, row_offset) for col, (before, after) in changes.items()}
+
+def build_report_from_files(paths: dict[str, str], per_col_limit: int = 20) -> list[str]:
+    """
+    То же, что build_columnwise_report, но по накопленным на диске строкам изменений
+    (по файлу на колонку, строка на изменение) — без загрузки всех изменений в память.
+    """
+    lines: list[str] = []
+    for col in ORDER:
+        lines.append(f"========== {col} ==========")
+        path = paths.get(col)
+        if not path or not os.path.isfile(path):
+            lines.append("нет изменений.")
+            continue
+        with open(path, encoding="utf-8", newline="\n") as f:
+            total = sum(1 for _ in f)
+        if not total:
+            lines.append("нет изменений.")
+            continue
+        order = _even_indices(total, per_col_limit)
+        wanted = set(order)
+        picked: dict[int, str] = {}
+        with open(path, encoding="utf-8", newline="\n") as f:
+            for i, line in enumerate(f):
+                if i in wanted:
+                    picked[i] = line.rstrip("\n")
+        lines.extend(picked[i] for i in order)
+    return lines
+
 def save_examples_txt(lines: list[str], logs_dir: str = "logs") -> str:
     os.makedirs(logs_dir, exist_ok=True)
     path = os.path.join(logs_dir, f"examples_{int(time.time())}.txt")
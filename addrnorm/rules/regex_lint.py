@@ -0,0 +1,304 @@
+from __future__ import annotations
+import re, time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+try:  # Python 3.11+
+    import re._parser as _sre_parse
+    import re._constants as _sre_c
+except ImportError:  # pragma: no cover - Python 3.9/3.10
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_c
+
+# Линтер регулярных выражений профиля: статический поиск конструкций,
+# склонных к катастрофическому бэктрекингу, и замер времени одного матча
+# на «враждебных» и реалистичных входах.
+
+MAXREPEAT = _sre_c.MAXREPEAT
+_REPEATS = {_sre_c.MAX_REPEAT, _sre_c.MIN_REPEAT}
+_ANY = None  # «любой символ» в множествах первых символов
+
+_DIGITS = set(map(ord, "0123456789"))
+_SPACES = set(map(ord, " \t\n\r\f\v   "))
+
+@dataclass
+class LintIssue:
+    severity: str   # "danger" | "warning"
+    code: str
+    message: str
+
+@dataclass
+class BenchResult:
+    worst_ms: float
+    worst_input: str
+    realistic_ms: float
+    exceeded: bool
+
+@dataclass
+class PatternReport:
+    name: str
+    pattern: str
+    error: Optional[str] = None
+    issues: List[LintIssue] = field(default_factory=list)
+    bench: Optional[BenchResult] = None
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.error) or bool(self.bench and self.bench.exceeded)
+
+# ---------- статический анализ ----------
+def _fold(chars: set, ignorecase: bool) -> set:
+    if not ignorecase:
+        return chars
+    out = set(chars)
+    for c in chars:
+        ch = chr(c)
+        out.add(ord(ch.lower()[:1] or ch))
+        out.add(ord(ch.upper()[:1] or ch))
+    return out
+
+def _set_items(items, ignorecase: bool):
+    """Множество символов класса [...] (None — слишком широкое/отрицание)."""
+    out: set = set()
+    for op, av in items:
+        if op == _sre_c.NEGATE:
+            return _ANY
+        if op == _sre_c.LITERAL:
+            out.add(av)
+        elif op == _sre_c.RANGE:
+            lo, hi = av
+            if hi - lo > 512:
+                return _ANY
+            out.update(range(lo, hi + 1))
+        elif op == _sre_c.CATEGORY:
+            if av == _sre_c.CATEGORY_DIGIT:
+                out |= _DIGITS
+            elif av == _sre_c.CATEGORY_SPACE:
+                out |= _SPACES
+            else:
+                return _ANY
+        else:
+            return _ANY
+    return _fold(out, ignorecase)
+
+def _first_seq(seq, ignorecase: bool) -> Tuple[Optional[set], bool]:
+    """(множество возможных первых символов, может ли последовательность совпасть с пустой строкой)."""
+    out: set = set()
+    for op, av in seq:
+        f, nullable = _first_item(op, av, ignorecase)
+        if f is _ANY:
+            return _ANY, False
+        out |= f
+        if not nullable:
+            return out, False
+    return out, True
+
+def _first_item(op, av, ignorecase: bool) -> Tuple[Optional[set], bool]:
+    if op == _sre_c.LITERAL:
+        return _fold({av}, ignorecase), False
+    if op in (_sre_c.NOT_LITERAL, _sre_c.ANY):
+        return _ANY, False
+    if op == _sre_c.IN:
+        return _set_items(av, ignorecase), False
+    if op == _sre_c.AT:
+        return set(), True
+    if op == _sre_c.SUBPATTERN:
+        return _first_seq(av[-1], ignorecase)
+    if op == _sre_c.BRANCH:
+        out: set = set()
+        nullable = False
+        for br in av[1]:
+            f, n = _first_seq(br, ignorecase)
+            if f is _ANY:
+                return _ANY, False
+            out |= f
+            nullable = nullable or n
+        return out, nullable
+    if op in _REPEATS or op == getattr(_sre_c, "POSSESSIVE_REPEAT", None):
+        lo, _hi, body = av
+        f, n = _first_seq(body, ignorecase)
+        return f, (lo == 0 or n)
+    if op in (_sre_c.ASSERT, _sre_c.ASSERT_NOT):
+        return set(), True
+    return _ANY, False
+
+def _overlap(a: Optional[set], b: Optional[set]) -> bool:
+    if a is _ANY:
+        return b is _ANY or bool(b)
+    if b is _ANY:
+        return bool(a)
+    return bool(a & b)
+
+def _has_unbounded_repeat(seq) -> bool:
+    for op, av in seq:
+        if op in _REPEATS:
+            if av[1] == MAXREPEAT or _has_unbounded_repeat(av[2]):
+                return True
+        elif op == _sre_c.SUBPATTERN:
+            if _has_unbounded_repeat(av[-1]):
+                return True
+        elif op == _sre_c.BRANCH:
+            if any(_has_unbounded_repeat(b) for b in av[1]):
+                return True
+    return False
+
+def _unwrap(seq):
+    # (?:...) / (...) из одного элемента — смотрим внутрь группы
+    items = list(seq)
+    while len(items) == 1 and items[0][0] == _sre_c.SUBPATTERN:
+        items = list(items[0][1][-1])
+    return items
+
+def _overlapping_branches(body, ignorecase: bool) -> bool:
+    for op, av in _unwrap(body):
+        if op != _sre_c.BRANCH:
+            continue
+        firsts = [_first_seq(b, ignorecase)[0] for b in av[1]]
+        for i in range(len(firsts)):
+            for j in range(i + 1, len(firsts)):
+                if _overlap(firsts[i], firsts[j]):
+                    return True
+    return False
+
+def _walk(seq, ignorecase: bool, issues: List[LintIssue]):
+    prev_rep = None  # первые символы предыдущего неограниченного повтора в этой последовательности
+    for op, av in seq:
+        if op in _REPEATS:
+            lo, hi, body = av
+            if hi == MAXREPEAT:
+                if _has_unbounded_repeat(body):
+                    issues.append(LintIssue("danger", "nested-quantifier",
+                                            "вложенный неограниченный квантификатор вида (a+)+ — экспоненциальный бэктрекинг"))
+                if _overlapping_branches(body, ignorecase):
+                    issues.append(LintIssue("danger", "overlapping-alternation",
+                                            "пересекающиеся альтернативы под квантификатором вида (a|ab)*"))
+                f, _ = _first_seq(body, ignorecase)
+                if prev_rep is not None and _overlap(prev_rep, f):
+                    issues.append(LintIssue("warning", "adjacent-quantifiers",
+                                            "соседние неограниченные повторы с пересекающимися классами (\\s*\\s*, .*.*) — полиномиальный бэктрекинг"))
+                prev_rep = f
+            else:
+                prev_rep = None
+            _walk(body, ignorecase, issues)
+            continue
+        if op == _sre_c.SUBPATTERN:
+            _walk(av[-1], ignorecase, issues)
+        elif op == _sre_c.BRANCH:
+            for br in av[1]:
+                _walk(br, ignorecase, issues)
+        elif op in (_sre_c.ASSERT, _sre_c.ASSERT_NOT):
+            _walk(av[1], ignorecase, issues)
+        elif op in (_sre_c.GROUPREF, getattr(_sre_c, "GROUPREF_EXISTS", None)):
+            issues.append(LintIssue("warning", "backreference", "обратная ссылка — сопоставление не линейно"))
+        if op != _sre_c.AT:
+            prev_rep = None
+
+def lint_pattern(pattern: str, flags: int = 0) -> List[LintIssue]:
+    """Статические замечания по шаблону (без компиляции в движок)."""
+    parsed = _sre_parse.parse(pattern, flags)
+    ignorecase = bool((flags | parsed.state.flags) & re.IGNORECASE)
+    issues: List[LintIssue] = []
+    _walk(list(parsed), ignorecase, issues)
+    # дубликаты (одна и та же конструкция в нескольких местах) схлопываем
+    seen, uniq = set(), []
+    for it in issues:
+        if it.code not in seen:
+            seen.add(it.code)
+            uniq.append(it)
+    return uniq
+
+# ---------- генерация входов ----------
+REALISTIC_INPUTS = [
+    "12345", "123456789", "12345-6789", "101000", "SW1A 1AA", "K1A 0B1", "1012 AB", "01310-100",
+    "123-4567", "12-345", "1234-567", "D02 X285", "n/a", "",
+    "г. Москва", "city of New York", "Санкт-Петербург (Ленинский район)", "São Paulo, SP",
+    "ул. Ленина, д. 5, кв. 12", "123 Main St. Apt 4B", "№ 5 пр-т Мира", "Unter den Linden 77",
+    "  \"Baker Street\"  221b, office 3 ", "Rue de Rivoli / 75001 Paris",
+    "1600 Pennsylvania Avenue NW, Washington, DC 20500, United States of America",
+]
+
+def _pump_chars(pattern: str, flags: int) -> List[str]:
+    """Символы, «накачивающие» повторы шаблона: по одному-двум из тела каждого повтора."""
+    out: List[str] = []
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except re.error:
+        return out
+
+    def visit(seq):
+        for op, av in seq:
+            if op in _REPEATS:
+                f, _ = _first_seq(av[2], bool(flags & re.IGNORECASE))
+                if f is _ANY:
+                    out.append("a")
+                elif f:
+                    out.extend(chr(c) for c in sorted(f)[:2])
+                visit(av[2])
+            elif op == _sre_c.SUBPATTERN:
+                visit(av[-1])
+            elif op == _sre_c.BRANCH:
+                for br in av[1]:
+                    visit(br)
+    visit(list(parsed))
+    return list(dict.fromkeys(out))
+
+def adversarial_inputs(pattern: str, flags: int = 0, max_len: int = 2000) -> List[str]:
+    """
+    Враждебные строки растущей длины: накачка символами из повторов шаблона
+    (по одному и попарно) + «ломающий» хвост, чтобы матч в конце провалился.
+    """
+    pumps = _pump_chars(pattern, flags) + ["a", "1", " ", "("]
+    units = list(dict.fromkeys(pumps + [a + b for a in pumps[:4] for b in pumps[:4] if a != b]))
+    tails = ["!", "\n", "\u0000"]
+    lengths = [n for n in (4, 8, 12, 16, 20, 24, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192) if n <= max_len]
+    out = []
+    for n in lengths:
+        for u in units:
+            body = (u * (n // len(u) + 1))[:n]
+            for t in tails:
+                out.append(body + t)
+    return out
+
+# ---------- замер ----------
+def _time_one(fn: Callable[[str], object], s: str, repeat: int = 1) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(s)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+def bench_pattern(fn: Callable[[str], object], adversarial: Sequence[str],
+                  realistic: Iterable[str] = REALISTIC_INPUTS, budget_ms: float = 5.0) -> BenchResult:
+    """
+    Худшее время одного матча. Враждебные входы идут по возрастанию длины —
+    при первом превышении бюджета замер прекращается (экспоненциальный шаблон
+    не подвесит сам валидатор).
+    """
+    realistic_ms = max((_time_one(fn, s, repeat=3) for s in realistic), default=0.0)
+    worst_ms, worst_input = realistic_ms, ""
+    for s in adversarial:
+        ms = _time_one(fn, s)
+        if ms > budget_ms:
+            # перепроверяем, чтобы не ловить случайные паузы GC/планировщика
+            ms = _time_one(fn, s, repeat=3)
+        if ms > worst_ms:
+            worst_ms, worst_input = ms, s
+        if ms > budget_ms:
+            break
+    return BenchResult(worst_ms=worst_ms, worst_input=worst_input,
+                       realistic_ms=realistic_ms, exceeded=worst_ms > budget_ms)
+
+def check_pattern(name: str, pattern: str, flags: int = 0, mode: str = "search",
+                  budget_ms: float = 5.0, max_len: int = 2000) -> PatternReport:
+    """Компиляция + линт + замер. mode: 'match' (как _match_against) или 'search' (sub/split/search)."""
+    rep = PatternReport(name=name, pattern=pattern)
+    try:
+        rx = re.compile(pattern, flags)
+    except re.error as e:
+        rep.error = f"не компилируется: {e}"
+        return rep
+    rep.issues = lint_pattern(pattern, flags)
+    fn = rx.match if mode == "match" else rx.search
+    rep.bench = bench_pattern(fn, adversarial_inputs(pattern, flags, max_len=max_len), budget_ms=budget_ms)
+    return rep
@@ -1,12 +1,16 @@
 from __future__ import annotations
-import os, yaml
+import os
 from typing import Optional, Dict, Any
+from . import snapshot
 
 _PROFILE_CACHE: Dict[str, Any] | None = None
 _PROFILE_PATH: Optional[str] = None
+_COMPILED: Dict[str, Any] | None = None
+_FINGERPRINT: Optional[str] = None
 
 ENV_VAR = "ADDRNORM_GEO_PROFILE"
 FILENAME = "geo_profile.yaml"
+CONFIG_FILENAME = "config.yaml"
 
 def _is_file(path: Optional[str]) -> bool:
     return bool(path) and os.path.isfile(path)
@@ -54,26 +58,109 @@ def _find_profile_path() -> Optional[str]:
     return None
 
 def _safe_yaml(path: str) -> dict:
+    import yaml  # только при пересборке снапшота — на горячем старте PyYAML не нужен
     with open(path, "r", encoding="utf-8") as f:
         obj = yaml.safe_load(f)
     return obj if isinstance(obj, dict) else {}
 
+def load_yaml(path: str) -> dict:
+    """
+    Строгое чтение YAML-конфига (для валидации): ошибка разбора — исключение yaml.YAMLError,
+    корень не словарь — ValueError, пустой файл — {}. Загрузка профиля такие ошибки не роняет.
+    """
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        obj = yaml.safe_load(f)
+    if obj is None:
+        return {}
+    if not isinstance(obj, dict):
+        raise ValueError(f"{path}: ожидается словарь верхнего уровня, получено {type(obj).__name__}")
+    return obj
+
+def _street_abbr_path(profile_path: Optional[str]) -> str:
+    # пробуем найти рядом с профилем geo (ищем в той же корневой папке configs)
+    if profile_path:
+        base_dir = os.path.dirname(os.path.dirname(profile_path))  # .../configs
+    else:
+        # fallback: от текущего рабочего каталога
+        base_dir = os.path.join(os.getcwd(), "configs")
+    return os.path.join(base_dir, "street_abbr", "default.yaml")
+
+def _load_street_abbr(path: str) -> dict:
+    if not os.path.isfile(path):
+        return {}
+    return _safe_yaml(path)
+
+def _config_path(profile_path: Optional[str]) -> str:
+    # общий config.yaml лежит рядом с geo_profile.yaml
+    base_dir = os.path.dirname(profile_path) if profile_path else os.path.join(os.getcwd(), "configs")
+    return os.path.join(base_dir, CONFIG_FILENAME)
+
+def _load_config(path: str) -> dict:
+    if not os.path.isfile(path):
+        return {}
+    try:
+        return _safe_yaml(path)
+    except Exception:
+        return {}
+
+def _compile(prof: dict, street_abbr: dict, cfg: dict) -> Dict[str, Any]:
+    """Предвычисленные структуры для геттеров; кладутся в снапшот целиком."""
+    return {
+        "profile": prof,
+        "street_abbr": street_abbr,
+        "templates": _build_templates(cfg),
+        "country_index": _build_country_index(prof),
+        "country_aliases": _build_country_aliases(prof),
+        "zip_patterns": _build_zip_patterns(prof),
+        "region_aliases": _build_region_aliases(prof),
+    }
+
 def _load_profile() -> dict:
-    global _PROFILE_CACHE, _PROFILE_PATH
+    global _PROFILE_CACHE, _PROFILE_PATH, _COMPILED, _FINGERPRINT
     if _PROFILE_CACHE is not None:
         return _PROFILE_CACHE
 
     _PROFILE_PATH = _find_profile_path()
     if not _PROFILE_PATH:
         _PROFILE_CACHE = {}
+        _COMPILED = _compile({}, _load_street_abbr(_street_abbr_path(None)), _load_config(_config_path(None)))
+        _FINGERPRINT = None
         return _PROFILE_CACHE
 
+    sources = [_PROFILE_PATH, _street_abbr_path(_PROFILE_PATH), _config_path(_PROFILE_PATH)]
+    cached = snapshot.load(_PROFILE_PATH, sources)
+    if cached is not None:
+        _COMPILED = cached["payload"]
+        _PROFILE_CACHE = _COMPILED["profile"]
+        _FINGERPRINT = snapshot.fingerprint(cached["stamps"])
+        return _PROFILE_CACHE
+
+    stamps = snapshot.stamp_sources(sources)
     try:
-        _PROFILE_CACHE = _safe_yaml(_PROFILE_PATH)
+        prof = _safe_yaml(_PROFILE_PATH)
     except Exception:
-        _PROFILE_CACHE = {}
+        prof = {}
+    _COMPILED = _compile(prof, _load_street_abbr(sources[1]), _load_config(sources[2]))
+    _PROFILE_CACHE = prof
+    _FINGERPRINT = snapshot.fingerprint(stamps)
+    if prof:
+        snapshot.save(_PROFILE_PATH, stamps, _COMPILED)
     return _PROFILE_CACHE
 
+def _compiled(key: str):
+    _load_profile()
+    return _COMPILED[key]
+
+def reload_profile() -> dict:
+    """Сбросить кэш процесса и перечитать профиль (снапшот проверяется заново)."""
+    global _PROFILE_CACHE, _PROFILE_PATH, _COMPILED, _FINGERPRINT
+    _PROFILE_CACHE = None
+    _PROFILE_PATH = None
+    _COMPILED = None
+    _FINGERPRINT = None
+    return _load_profile()
+
 # ---- public helpers for UI ----
 def get_profile_path() -> Optional[str]:
     """Вернёт фактический путь к geo_profile.yaml, если найден; иначе None."""
@@ -86,9 +173,13 @@ def profile_loaded() -> bool:
     prof = _load_profile()
     return bool(prof)
 
-# ---- getters ----
-def get_country_index() -> dict[str, str]:
-    prof = _load_profile()
+def get_profile_fingerprint() -> Optional[str]:
+    """sha256-отпечаток содержимого профиля и справочника сокращений (None, если профиля нет)."""
+    _load_profile()
+    return _FINGERPRINT
+
+# ---- builders (сырой профиль -> структуры для геттеров) ----
+def _build_country_index(prof: dict) -> dict[str, str]:
     idx = ((prof.get("countries") or {}).get("index") or {})
     out: dict[str, str] = {}
     if isinstance(idx, dict):
@@ -99,8 +190,7 @@ def get_country_index() -> dict[str, str]:
                 out[ks] = vs
     return out
 
-def get_country_aliases() -> dict[str, str]:
-    prof = _load_profile()
+def _build_country_aliases(prof: dict) -> dict[str, str]:
     als = ((prof.get("countries") or {}).get("aliases") or {})
     out: dict[str, str] = {}
     if isinstance(als, dict):
@@ -111,8 +201,7 @@ def get_country_aliases() -> dict[str, str]:
                 out[ks] = vs
     return out
 
-def get_zip_patterns() -> dict[str, dict]:
-    prof = _load_profile()
+def _build_zip_patterns(prof: dict) -> dict[str, dict]:
     zp = prof.get("zip_patterns") or {}
     out: dict[str, dict] = {}
     if isinstance(zp, dict):
@@ -125,42 +214,85 @@ def get_zip_patterns() -> dict[str, dict]:
             out[iso] = {"patterns": list(patterns), "style": style}
     return out
 
-def get_region_aliases(country_iso2: str | None) -> dict[str, str]:
-    if not country_iso2:
-        return {}
-    prof = _load_profile()
+def _build_region_aliases(prof: dict) -> dict[str, dict[str, str]]:
     regs = prof.get("regions") or {}
-    out: dict[str, str] = {}
+    out: dict[str, dict[str, str]] = {}
     if isinstance(regs, dict):
-        reg = regs.get(str(country_iso2).strip().upper()) or {}
-        aliases = reg.get("aliases") or {}
-        if isinstance(aliases, dict):
-            for k, v in aliases.items():
-                ks = str(k).strip().lower()
-                ks = "".join(ch for ch in ks if ch.isalnum())  # убираем пробелы/точки/дефисы/_
-                vs = "" if v is None else str(v).strip()
-                if ks and vs:
-                    out[ks] = vs
+        for iso2, reg in regs.items():
+            if not isinstance(reg, dict):
+                continue
+            aliases = reg.get("aliases") or {}
+            per: dict[str, str] = {}
+            if isinstance(aliases, dict):
+                for k, v in aliases.items():
+                    ks = str(k).strip().lower()
+                    ks = "".join(ch for ch in ks if ch.isalnum())  # убираем пробелы/точки/дефисы/_
+                    vs = "" if v is None else str(v).strip()
+                    if ks and vs:
+                        per[ks] = vs
+            out[str(iso2).strip().upper()] = per
     return out
 
-def get_street_abbr() -> dict[str, dict[str, list[str]]]:
+def _build_order(v) -> tuple | None:
+    # [street, house] внутри списка — группа, склеиваемая пробелом в одну часть
+    if not isinstance(v, list):
+        return None
+    groups = []
+    for item in v:
+        names = item if isinstance(item, list) else [item]
+        g = tuple(str(n).strip().lower() for n in names if n is not None and str(n).strip())
+        if g:
+            groups.append(g)
+    return tuple(groups) or None
+
+def _build_templates(cfg: dict) -> dict:
     """
-    Возвращает {"latin": {canon: [aliases...]}, "cyrillic": {...}} из configs/street_abbr/default.yaml.
-    Если файл не найден/пуст — вернёт {}.
+    templates.default_order / templates.separator / templates.countries.{ISO2}
+    -> {"default": (order, sep) | None, "countries": {ISO2: (order, sep)}}.
+    Страна задаётся списком (порядок) или {order: [...], separator: "..."}.
     """
-    # пробуем найти рядом с профилем geo (ищем в той же корневой папке configs)
-    base_dir = None
-    p = get_profile_path()
-    if p:
-        base_dir = os.path.dirname(os.path.dirname(p))  # .../configs
-    else:
-        # fallback: от текущего рабочего каталога
-        base_dir = os.path.join(os.getcwd(), "configs")
+    t = cfg.get("templates") or {}
+    if not isinstance(t, dict):
+        return {"default": None, "countries": {}}
+    sep = t.get("separator")
+    sep = ", " if sep is None else str(sep)
+    default = _build_order(t.get("default_order"))
+    out = {"default": (default, sep) if default else None, "countries": {}}
+    countries = t.get("countries") or {}
+    if isinstance(countries, dict):
+        for iso2, entry in countries.items():
+            c_sep = sep
+            if isinstance(entry, dict):
+                c_sep = sep if entry.get("separator") is None else str(entry.get("separator"))
+                entry = entry.get("order")
+            order = _build_order(entry)
+            if order:
+                out["countries"][str(iso2).strip().upper()] = (order, c_sep)
+    return out
 
-    path = os.path.join(base_dir, "street_abbr", "default.yaml")
-    if not os.path.isfile(path):
+# ---- getters ----
+# Возвращают общие (кэшированные) структуры — не мутировать.
+def get_country_index() -> dict[str, str]:
+    return _compiled("country_index")
+
+def get_country_aliases() -> dict[str, str]:
+    return _compiled("country_aliases")
+
+def get_zip_patterns() -> dict[str, dict]:
+    return _compiled("zip_patterns")
+
+def get_region_aliases(country_iso2: str | None) -> dict[str, str]:
+    if not country_iso2:
         return {}
+    return _compiled("region_aliases").get(str(country_iso2).strip().upper()) or {}
 
-    with open(path, "r", encoding="utf-8") as f:
-        obj = yaml.safe_load(f)
-    return obj if isinstance(obj, dict) else {}
\ No newline at end of file
+def get_templates() -> dict:
+    """Скомпилированные шаблоны сборки addr_norm из configs/config.yaml (см. _build_templates)."""
+    return _compiled("templates")
+
+def get_street_abbr() -> dict[str, dict[str, list[str]]]:
+    """
+    Возвращает {"latin": {canon: [aliases...]}, "cyrillic": {...}} из configs/street_abbr/default.yaml.
+    Если файл не найден/пуст — вернёт {}.
+    """
+    return _compiled("street_abbr")
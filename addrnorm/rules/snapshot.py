@@ -0,0 +1,112 @@
+from __future__ import annotations
+import os, hashlib, pickle, tempfile
+from typing import Optional, Dict, Any, List, Tuple
+
+# Бинарный снапшот скомпилированного профиля (geo_profile.yaml + street_abbr).
+# Инвалидация: сначала по (mtime_ns, size) каждого исходника, при расхождении —
+# по sha256 содержимого (touch без правок не вызывает пересборку).
+
+SNAPSHOT_VERSION = 1
+CACHE_ENV_VAR = "ADDRNORM_CACHE_DIR"
+CACHE_DIRNAME = ".cache"
+
+# (path, mtime_ns, size, sha256); для отсутствующего файла: (path, None, None, None)
+SourceStamp = Tuple[str, Optional[int], Optional[int], Optional[str]]
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _stat(path: str) -> Tuple[Optional[int], Optional[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_mtime_ns, st.st_size
+
+def stamp_sources(paths: List[str]) -> List[SourceStamp]:
+    out: List[SourceStamp] = []
+    for p in paths:
+        mtime, size = _stat(p)
+        out.append((p, mtime, size, _sha256(p) if mtime is not None else None))
+    return out
+
+def fingerprint(stamps: List[SourceStamp]) -> str:
+    """Отпечаток профиля: зависит только от путей и содержимого исходников."""
+    h = hashlib.sha256()
+    for path, _, _, digest in stamps:
+        h.update(os.path.basename(path).encode("utf-8"))
+        h.update(b"\0")
+        h.update((digest or "-").encode("ascii"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def snapshot_path(profile_path: str) -> str:
+    base = os.getenv(CACHE_ENV_VAR) or os.path.join(os.path.dirname(os.path.abspath(profile_path)), CACHE_DIRNAME)
+    key = hashlib.sha1(os.path.abspath(profile_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(base, f"profile_{key}.pkl")
+
+def _fresh(stamps: List[SourceStamp], paths: List[str]) -> Optional[List[SourceStamp]]:
+    """
+    None — снапшот устарел. Иначе — актуальные штампы
+    (могут отличаться mtime, если содержимое совпало по хэшу).
+    """
+    if [s[0] for s in stamps] != paths:
+        return None
+    out: List[SourceStamp] = []
+    for path, mtime, size, digest in stamps:
+        cur_mtime, cur_size = _stat(path)
+        if cur_mtime is None or mtime is None:
+            if cur_mtime is not None or mtime is not None:
+                return None
+            out.append((path, None, None, None))
+            continue
+        if (cur_mtime, cur_size) == (mtime, size):
+            out.append((path, mtime, size, digest))
+            continue
+        if cur_size != size or _sha256(path) != digest:
+            return None
+        out.append((path, cur_mtime, cur_size, digest))
+    return out
+
+def load(profile_path: str, paths: List[str]) -> Optional[Dict[str, Any]]:
+    """Вернёт {"stamps", "payload"} из снапшота, если он актуален; иначе None."""
+    snap = snapshot_path(profile_path)
+    try:
+        with open(snap, "rb") as f:
+            obj = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(obj, dict) or obj.get("version") != SNAPSHOT_VERSION:
+        return None
+    stamps = _fresh(obj.get("stamps") or [], paths)
+    if stamps is None:
+        return None
+    if stamps != obj["stamps"]:
+        # содержимое то же, сменился только mtime — обновим штампы, чтобы не хэшировать снова
+        save(profile_path, stamps, obj["payload"])
+    return {"stamps": stamps, "payload": obj["payload"]}
+
+def save(profile_path: str, stamps: List[SourceStamp], payload: Dict[str, Any]) -> Optional[str]:
+    """Атомарная запись снапшота (tmp + os.replace). Ошибки записи не фатальны."""
+    snap = snapshot_path(profile_path)
+    obj = {"version": SNAPSHOT_VERSION, "stamps": stamps, "payload": payload}
+    try:
+        os.makedirs(os.path.dirname(snap), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".profile_", suffix=".tmp", dir=os.path.dirname(snap))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, snap)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    except Exception:
+        return None
+    return snap
@@ -0,0 +1,198 @@
+from __future__ import annotations
+import queue, threading, time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from ..io.writer import process_dataframe
+
+# поля, от которых зависит результат нормализации (ключ дедупликации)
+KEY_COLS = ["country", "region", "district", "locality", "street", "zip"]
+
+class QueueFull(Exception):
+    pass
+
+def _key(rec: Mapping[str, Any]) -> Tuple[str, ...]:
+    return tuple("" if rec.get(c) is None else str(rec.get(c)) for c in KEY_COLS)
+
+def process_records(records: List[Mapping[str, Any]], output_mode: str = "addr-only",
+                    use_libpostal: bool = False, libpostal_url: str = "http://localhost:8080") -> List[Dict[str, Any]]:
+    """
+    Пакетная нормализация списка записей через process_dataframe.
+    Одинаковые адреса (по KEY_COLS) считаются один раз — важно для libpostal.
+    Формат каждой записи результата — как строка DataFrame из process_dataframe.
+    """
+    if not records:
+        return []
+    uniq: Dict[Tuple[str, ...], int] = {}
+    rows: List[Tuple[str, ...]] = []
+    pos: List[int] = []
+    for rec in records:
+        k = _key(rec)
+        i = uniq.get(k)
+        if i is None:
+            i = uniq[k] = len(rows)
+            rows.append(k)
+        pos.append(i)
+
+    df = pd.DataFrame(rows, columns=KEY_COLS, dtype="string")
+    out, _ = process_dataframe(df, output_mode=output_mode,
+                               use_libpostal=use_libpostal, libpostal_url=libpostal_url)
+
+    if output_mode == "addr-only":
+        country_norm = out["country_norm"].tolist()
+        addr_norm = out["addr_norm"].tolist()
+        result = []
+        for rec, i in zip(records, pos):
+            r = dict(rec)
+            r["country_norm"] = country_norm[i]
+            r["addr_norm"] = addr_norm[i]
+            result.append(r)
+        return result
+
+    uniq_out = out.to_dict("records")
+    return [dict(uniq_out[i]) for i in pos]
+
+class Metrics:
+    """Потокобезопасные счётчики сервиса: пропускная способность и перцентили задержки."""
+
+    def __init__(self, window_s: float = 60.0, max_samples: int = 10000):
+        self.window_s = window_s
+        self._lock = threading.Lock()
+        self._lat = deque(maxlen=max_samples)   # секунды, по завершённым запросам
+        self._done = deque()                    # моменты завершения в окне window_s
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.unique_rows = 0
+
+    def observe_request(self, latency_s: float, ok: bool = True):
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+            self._lat.append(latency_s)
+            self._done.append(now)
+            while self._done and self._done[0] < now - self.window_s:
+                self._done.popleft()
+
+    def observe_batch(self, size: int, unique: int):
+        with self._lock:
+            self.batches += 1
+            self.batched_rows += size
+            self.unique_rows += unique
+
+    def inc(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def _pct(sorted_vals: List[float], q: float) -> float:
+        if not sorted_vals:
+            return 0.0
+        k = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+        return sorted_vals[k]
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            lat = sorted(self._lat)
+            while self._done and self._done[0] < now - self.window_s:
+                self._done.popleft()
+            in_window = len(self._done)
+            uptime = now - self.started
+            return {
+                "uptime_s": round(uptime, 3),
+                "requests": self.requests,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_rows / self.batches, 2) if self.batches else 0.0,
+                "dedup_ratio": round(1 - self.unique_rows / self.batched_rows, 4) if self.batched_rows else 0.0,
+                "throughput_rps": round(in_window / min(self.window_s, uptime or 1e-9), 2),
+                "latency_ms": {
+                    "p50": round(self._pct(lat, 0.50) * 1000, 3),
+                    "p90": round(self._pct(lat, 0.90) * 1000, 3),
+                    "p99": round(self._pct(lat, 0.99) * 1000, 3),
+                    "max": round((lat[-1] if lat else 0.0) * 1000, 3),
+                },
+            }
+
+class MicroBatcher:
+    """
+    Собирает одиночные записи из конкурентных запросов в пакеты.
+    Пакет закрывается по размеру (max_batch_size) или по времени (max_wait_ms
+    с момента прихода первой записи) и обрабатывается одним вызовом process_fn.
+    """
+
+    def __init__(self, process_fn: Callable[[List[Mapping[str, Any]]], List[Dict[str, Any]]],
+                 max_batch_size: int = 64, max_wait_ms: float = 5.0, max_queue: int = 10000,
+                 metrics: Optional[Metrics] = None):
+        self.process_fn = process_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.metrics = metrics or Metrics()
+        self._q: "queue.Queue[Tuple[Mapping[str, Any], Future]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="addrnorm-batcher", daemon=True)
+        self._thread.start()
+
+    def qsize(self) -> int:
+        return self._q.qsize()
+
+    def submit(self, rec: Mapping[str, Any]) -> Future:
+        fut: Future = Future()
+        try:
+            self._q.put_nowait((rec, fut))
+        except queue.Full:
+            self.metrics.inc("rejected")
+            raise QueueFull("batch queue is full")
+        return fut
+
+    def _collect(self) -> List[Tuple[Mapping[str, Any], Future]]:
+        try:
+            first = self._q.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=left))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            # запросы, чьё ожидание уже отменено (таймаут клиента), не обрабатываем
+            batch = [(r, f) for r, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            recs = [r for r, _ in batch]
+            try:
+                results = self.process_fn(recs)
+                self.metrics.observe_batch(len(recs), len({_key(r) for r in recs}))
+                for (_, f), res in zip(batch, results):
+                    f.set_result(res)
+            except Exception as e:
+                for _, f in batch:
+                    f.set_exception(e)
+
+    def close(self, timeout: float = 2.0):
+        self._stop.set()
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+import argparse, json, logging, time
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, Optional
+
+from ..rules.registry import profile_loaded, get_profile_path
+from ..logging_cfg.setup import setup_logging
+from .batcher import MicroBatcher, Metrics, QueueFull, process_records
+
+logger = logging.getLogger("addrnorm")
+
+# Локальный HTTP-сервис нормализации:
+#   POST /normalize   {"country": ..., "zip": ..., "street": ...}  -> одна запись
+#                     [{...}, {...}]                                -> список записей
+#   GET  /metrics     пропускная способность, p50/p90/p99 задержки, глубина очереди
+#   GET  /health
+# Одиночные запросы из разных соединений склеиваются MicroBatcher'ом в пакеты.
+
+class NormalizeService:
+    def __init__(self, output_mode: str = "addr-only", use_libpostal: bool = False,
+                 libpostal_url: str = "http://localhost:8080", max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, request_timeout_ms: float = 2000.0, max_queue: int = 10000):
+        self.config = {
+            "output_mode": output_mode,
+            "use_libpostal": use_libpostal,
+            "libpostal_url": libpostal_url,
+            "max_batch_size": max_batch_size,
+            "max_wait_ms": max_wait_ms,
+            "request_timeout_ms": request_timeout_ms,
+            "max_queue": max_queue,
+        }
+        self.request_timeout_s = request_timeout_ms / 1000.0
+        self.metrics = Metrics()
+        profile_loaded()  # прогрев профиля до первого запроса
+        fn = partial(process_records, output_mode=output_mode,
+                     use_libpostal=use_libpostal, libpostal_url=libpostal_url)
+        self.batcher = MicroBatcher(fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                    max_queue=max_queue, metrics=self.metrics)
+
+    def normalize(self, payload: Any):
+        """(http_status, body). Ожидание каждого запроса ограничено request_timeout_ms."""
+        t0 = time.perf_counter()
+        many = isinstance(payload, list)
+        recs = payload if many else [payload]
+        if not recs or not all(isinstance(r, dict) for r in recs):
+            return 400, {"error": "expected a JSON object or a list of objects"}
+        futs = []
+        try:
+            for r in recs:
+                futs.append(self.batcher.submit(r))
+        except QueueFull:
+            for f in futs:  # уже поставленные записи запроса не обрабатываем
+                f.cancel()
+            return 503, {"error": "queue is full"}
+
+        deadline = t0 + self.request_timeout_s
+        try:
+            results = [f.result(timeout=max(0.0, deadline - time.perf_counter())) for f in futs]
+        except FutureTimeout:
+            for f in futs:
+                f.cancel()
+            self.metrics.inc("timeouts")
+            self.metrics.observe_request(time.perf_counter() - t0, ok=False)
+            return 504, {"error": "timed out"}
+        except Exception as e:
+            self.metrics.observe_request(time.perf_counter() - t0, ok=False)
+            return 500, {"error": str(e)}
+        self.metrics.observe_request(time.perf_counter() - t0)
+        return 200, (results if many else results[0])
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        snap = self.metrics.snapshot()
+        snap["queue_depth"] = self.batcher.qsize()
+        snap["config"] = self.config
+        return snap
+
+    def close(self):
+        self.batcher.close()
+
+class _Handler(BaseHTTPRequestHandler):
+    service: NormalizeService  # проставляется в make_server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logger.debug("http: " + fmt, *args)
+
+    def _send(self, code: int, obj: Any):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            return self._send(200, self.service.metrics_snapshot())
+        if path == "/health":
+            return self._send(200, {"status": "ok", "profile": get_profile_path(), "profile_loaded": profile_loaded()})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.split("?", 1)[0] != "/normalize":
+            return self._send(404, {"error": "not found"})
+        try:
+            n = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(n).decode("utf-8") or "null")
+        except Exception:
+            return self._send(400, {"error": "invalid JSON"})
+        code, body = self.service.normalize(payload)
+        self._send(code, body)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # backlog под конкурентную нагрузку (по умолчанию 5)
+
+def make_server(service: NormalizeService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    handler = type("NormalizeHandler", (_Handler,), {"service": service})
+    return _Server((host, port), handler)
+
+def main(argv: Optional[list[str]] = None):
+    ap = argparse.ArgumentParser(description="AddrNormalizer: локальный HTTP-сервис нормализации")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--output-mode", choices=["addr-only", "extended"], default="addr-only")
+    ap.add_argument("--use-libpostal", action="store_true")
+    ap.add_argument("--libpostal-url", default="http://localhost:8080",
+                    help="URL libpostal-rest; несколько инстансов — через запятую")
+    ap.add_argument("--max-batch-size", type=int, default=64)
+    ap.add_argument("--max-wait-ms", type=float, default=5.0)
+    ap.add_argument("--timeout-ms", type=float, default=2000.0)
+    ap.add_argument("--max-queue", type=int, default=10000)
+    args = ap.parse_args(argv)
+
+    setup_logging(logs_dir="logs", level="INFO")
+    service = NormalizeService(
+        output_mode=args.output_mode, use_libpostal=args.use_libpostal, libpostal_url=args.libpostal_url,
+        max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+        request_timeout_ms=args.timeout_ms, max_queue=args.max_queue,
+    )
+    httpd = make_server(service, args.host, args.port)
+    logger.info("Serving on http://%s:%s (batch<=%s, wait<=%sms)", args.host, args.port,
+                args.max_batch_size, args.max_wait_ms)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
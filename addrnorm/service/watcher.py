@@ -0,0 +1,418 @@
+from __future__ import annotations
+import argparse, json, logging, multiprocessing, os, queue, shutil, signal, threading, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..io.batch import CheckpointMismatch, checkpoint_dir_for, load_state, run_batch
+from ..io.output import write_bytes_atomic
+from ..io.writer import parse_fields
+from ..libpostal.router import parse_thresholds
+from ..logging_cfg.setup import setup_logging, worker_logging
+from ..rules.registry import profile_loaded
+
+logger = logging.getLogger("addrnorm")
+
+# Демон папки входа: новые файлы в data/input забираются атомарным переименованием
+# в data/input/processing (второй демон на той же папке получит FileNotFoundError
+# и файл пропустит), встают в ограниченную очередь и обрабатываются постоянным пулом
+# процессов — профиль загружается в воркере один раз, а не на каждый файл.
+# Результат и отчёт — в data/output, исходник — в input/done (или input/failed).
+# Файлы, оставшиеся в processing после остановки, при старте продолжаются с чекпоинта.
+# Глубина очереди и пропускная способность — в логе и в <output>/watcher_status.json.
+
+INPUT_SUFFIXES = (".csv", ".csv.gz", ".csv.zst", ".csv.zstd")
+PROCESSING, DONE, FAILED = "processing", "done", "failed"
+STATUS_FILE = "watcher_status.json"
+
+def _accepted(name: str) -> bool:
+    n = name.lower()
+    return not name.startswith(".") and n.endswith(INPUT_SUFFIXES)
+
+def _stem(name: str) -> str:
+    n = name
+    for suf in sorted(INPUT_SUFFIXES, key=len, reverse=True):
+        if n.lower().endswith(suf):
+            return n[: -len(suf)]
+    return n
+
+def _free_path(path: str) -> str:
+    """path, а если занят — path с суффиксом _1, _2, ... перед расширением."""
+    if not os.path.exists(path):
+        return path
+    d, name = os.path.split(path)
+    stem, ext = _stem(name), name[len(_stem(name)):]
+    i = 1
+    while os.path.exists(os.path.join(d, f"{stem}_{i}{ext}")):
+        i += 1
+    return os.path.join(d, f"{stem}_{i}{ext}")
+
+# ---------- воркер (отдельный процесс пула) ----------
+
+def _init_worker(log_queue, run_id: Optional[str]):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C останавливает демон, а файлы в работе дописываются
+    if log_queue is not None:
+        worker_logging(log_queue, run_id=run_id)
+    profile_loaded()  # профиль грузится один раз на процесс и живёт между файлами
+
+def _process_file(path: str, output_path: Optional[str], resume: bool, options: Dict[str, Any]) -> dict:
+    res = run_batch(path, output_path=output_path, resume=resume, **options)
+    out_dir, out_name = os.path.split(res.output_path)
+    report_path = os.path.join(out_dir, _stem(out_name) + ".examples.txt")
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(res.report_lines))
+    st = res.stats
+    return {
+        "rows": res.rows, "elapsed_s": round(res.elapsed_s, 3), "chunks": res.chunks,
+        "resumed_from_row": res.resumed_from_row, "output_path": res.output_path, "report_path": report_path,
+        "libpostal_calls": st.get("libpostal_calls", 0), "libpostal_calls_avoided": st.get("libpostal_calls_avoided", 0),
+        "zip_inconsistent": st.get("zip_inconsistent", 0), "locality_filled": st.get("locality_filled", 0),
+    }
+
+# ---------- главный процесс ----------
+
+class _Throughput:
+    """Счётчики демона; rows/s и files/min — по завершённым файлам за последние window_s."""
+
+    def __init__(self, window_s: float = 300.0):
+        self.window_s = window_s
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._recent: deque = deque()  # (момент завершения, строк)
+        self.claimed = self.done = self.failed = self.rows = 0
+
+    def observe(self, rows: int, ok: bool):
+        now = time.time()
+        with self._lock:
+            if ok:
+                self.done += 1
+                self.rows += rows
+                self._recent.append((now, rows))
+            else:
+                self.failed += 1
+            while self._recent and self._recent[0][0] < now - self.window_s:
+                self._recent.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            while self._recent and self._recent[0][0] < now - self.window_s:
+                self._recent.popleft()
+            span = min(self.window_s, now - self.started) or 1e-9
+            return {
+                "uptime_s": round(now - self.started, 1),
+                "files_claimed": self.claimed, "files_done": self.done, "files_failed": self.failed,
+                "rows_done": self.rows,
+                "rows_per_s": round(sum(r for _, r in self._recent) / span, 1),
+                "files_per_min": round(len(self._recent) * 60.0 / span, 2),
+            }
+
+class FolderWatcher:
+    """
+    Опрос input_dir раз в poll_interval_s. Файл берётся, когда его размер и mtime не менялись
+    между двумя опросами (загрузка закончилась). Очередь — max_queue файлов: пока она полна,
+    новые файлы не забираются и остаются доступны другим демонам.
+    options — параметры run_batch (output_mode, use_libpostal, fields, chunk_rows, ...).
+    """
+
+    def __init__(self, input_dir: str = os.path.join("data", "input"),
+                 output_dir: str = os.path.join("data", "output"), workers: int = 2, max_queue: int = 100,
+                 poll_interval_s: float = 2.0, status_interval_s: float = 30.0, compress: Optional[str] = None,
+                 keep_processed: bool = True, mp_context: Optional[str] = None, log_queue=None,
+                 run_id: Optional[str] = None, **options):
+        self.input_dir, self.output_dir = input_dir, output_dir
+        self.dirs = {k: os.path.join(input_dir, k) for k in (PROCESSING, DONE, FAILED)}
+        for d in (output_dir, *self.dirs.values()):
+            os.makedirs(d, exist_ok=True)
+        self.workers = max(1, workers)
+        self.poll_interval_s, self.status_interval_s = poll_interval_s, status_interval_s
+        self.compress, self.keep_processed = compress, keep_processed
+        self.options = options
+        self.jobs: queue.Queue = queue.Queue(maxsize=max(1, max_queue))
+        self.metrics = _Throughput()
+        self.in_flight = 0
+        self.pending = 0  # забрано и ещё не закончено (в очереди + в работе)
+        self._lock = threading.Lock()
+        self._seen: Dict[str, tuple] = {}
+        self._recovery: deque = deque()  # оставшиеся в processing с прошлого запуска — ждут места в очереди
+        self._stop = threading.Event()
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context(mp_context),
+            initializer=_init_worker, initargs=(log_queue, run_id),
+        )
+        self._threads: List[threading.Thread] = []
+
+    # ---------- захват файлов ----------
+    def _claim(self, name: str) -> Optional[str]:
+        dst = os.path.join(self.dirs[PROCESSING], name)
+        if os.path.exists(dst):
+            return None  # такой файл уже в работе — дождёмся, пока освободится имя
+        src = os.path.join(self.input_dir, name)
+        try:
+            # link не перезаписывает существующий файл: из двух демонов его выиграет ровно один
+            os.link(src, dst)
+        except (FileExistsError, FileNotFoundError):
+            return None  # забрал другой демон
+        except OSError:
+            try:
+                os.rename(src, dst)  # ФС без жёстких ссылок: rename тоже атомарен
+            except FileNotFoundError:
+                return None
+            return dst
+        try:
+            os.unlink(src)
+        except FileNotFoundError:
+            pass
+        return dst
+
+    def scan(self) -> int:
+        """Один проход по input_dir: забрать устоявшиеся файлы, пока в очереди есть место."""
+        # сначала файлы прошлого запуска: они уже наши, но в очередь встают по мере места
+        while self._recovery and not self.jobs.full():
+            self._enqueue(self._recovery.popleft(), True)
+        claimed = 0
+        try:
+            entries = list(os.scandir(self.input_dir))
+        except FileNotFoundError:
+            return 0
+        current = {}
+        for e in sorted(entries, key=lambda e: e.name):
+            if not e.is_file() or not _accepted(e.name):
+                continue
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            current[e.name] = (st.st_size, st.st_mtime_ns)
+            if self._seen.get(e.name) != current[e.name] or self.jobs.full():
+                continue
+            path = self._claim(e.name)
+            if path is None:
+                continue
+            current.pop(e.name)
+            self._enqueue(path, False)
+            self.metrics.claimed += 1
+            claimed += 1
+            logger.info("Claimed %s (queue %s)", e.name, self.jobs.qsize())
+        self._seen = current
+        return claimed
+
+    def _enqueue(self, path: str, resume: bool):
+        # кладёт только главный поток и только при свободном месте — put не блокируется
+        with self._lock:
+            self.pending += 1
+        self.jobs.put_nowait((path, resume))
+
+    def _recover(self):
+        # файлы, забранные прошлым запуском: продолжаем с чекпоинта (resume); что не влезло
+        # в очередь, остаётся в processing и встаёт в неё из scan()
+        for name in sorted(os.listdir(self.dirs[PROCESSING])):
+            if _accepted(name):
+                logger.info("Recovering %s from a previous run", name)
+                self._recovery.append(os.path.join(self.dirs[PROCESSING], name))
+        while self._recovery and not self.jobs.full():
+            self._enqueue(self._recovery.popleft(), True)
+
+    # ---------- обработка ----------
+    def _reserve_output(self, path: str, resume: bool) -> tuple:
+        """
+        (output_path для run_batch, занятый путь результата). Имя занимается созданием пустого
+        <out>.part с O_EXCL: параллельные файлы с одной основой имени (a.csv и a.csv.gz, повторно
+        выложенный a.csv) — и в этом демоне, и в соседнем — получают разные имена.
+        """
+        if resume:
+            state = load_state(checkpoint_dir_for(path, self.options.get("output_mode", "addr-only")))
+            if state:
+                return None, state["output_path"]  # путь результата — из чекпоинта, .part уже наш
+        ext = {"gzip": ".csv.gz", "zstd": ".csv.zst"}.get(self.compress, ".csv")
+        stem = _stem(os.path.basename(path)) + "_norm"
+        i = 0
+        while True:
+            name = f"{stem}{ext}" if i == 0 else f"{stem}_{i}{ext}"
+            out = os.path.join(self.output_dir, name)
+            i += 1
+            if os.path.exists(out) or os.path.exists(os.path.join(self.output_dir, _stem(name) + ".examples.txt")):
+                continue
+            try:
+                os.close(os.open(out + ".part", os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+            except FileExistsError:
+                continue
+            return out, os.path.abspath(out)
+
+    def _drop_partial(self, path: str, output: Optional[str]):
+        """Чекпоинт файла и недописанный результат: файл начнётся заново, имя результата свободно."""
+        shutil.rmtree(checkpoint_dir_for(path, self.options.get("output_mode", "addr-only")), ignore_errors=True)
+        if output:
+            try:
+                os.remove(output + ".part")
+            except FileNotFoundError:
+                pass
+
+    def _finish(self, path: str, ok: bool, error: str = "", output: Optional[str] = None):
+        name = os.path.basename(path)
+        if not ok:
+            self._drop_partial(path, output)
+        if ok and not self.keep_processed:
+            os.remove(path)
+            return
+        dst = _free_path(os.path.join(self.dirs[DONE if ok else FAILED], name))
+        os.replace(path, dst)
+        if not ok:
+            with open(dst + ".error.txt", "w", encoding="utf-8") as f:
+                f.write(error)
+
+    def _dispatch(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            path, resume = item
+            name = os.path.basename(path)
+            with self._lock:
+                self.in_flight += 1
+            reserved = None
+            try:
+                out, reserved = self._reserve_output(path, resume)
+                try:
+                    res = self.pool.submit(_process_file, path, out, resume, self.options).result()
+                except CheckpointMismatch as e:
+                    if not resume:
+                        raise
+                    # демон перезапущен с другими опциями или профилем — чекпоинт прошлого запуска не годится
+                    logger.warning("Checkpoint of %s does not match (%s) — processing it from scratch", name, e)
+                    self._drop_partial(path, reserved)
+                    out, reserved = self._reserve_output(path, False)
+                    res = self.pool.submit(_process_file, path, out, False, self.options).result()
+            except Exception as e:  # noqa: BLE001 — файл уходит в failed, демон живёт дальше
+                logger.error("Failed %s: %s", name, e)
+                self.metrics.observe(0, ok=False)
+                self._finish(path, ok=False, error=f"{type(e).__name__}: {e}\n", output=reserved)
+            else:
+                self.metrics.observe(res["rows"], ok=True)
+                self._finish(path, ok=True)
+                logger.info("Done %s: %s rows in %.2fs → %s", name, res["rows"], res["elapsed_s"],
+                            res["output_path"], extra={"metrics": res})
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.pending -= 1
+
+    # ---------- состояние ----------
+    def status(self) -> Dict[str, Any]:
+        snap = self.metrics.snapshot()
+        with self._lock:
+            snap.update(queue_depth=self.jobs.qsize(), queue_max=self.jobs.maxsize,
+                        in_flight=self.in_flight, workers=self.workers)
+        return snap
+
+    def _write_status(self):
+        snap = self.status()
+        write_bytes_atomic(json.dumps(snap, ensure_ascii=False, indent=1).encode("utf-8"),
+                           os.path.join(self.output_dir, STATUS_FILE))
+        return snap
+
+    # ---------- жизненный цикл ----------
+    def start(self) -> "FolderWatcher":
+        self._threads = [threading.Thread(target=self._dispatch, name=f"watch-dispatch-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for t in self._threads:
+            t.start()
+        self._recover()
+        return self
+
+    def run(self, once: bool = False):
+        """Цикл опроса до stop(); once=True — обработать то, что лежит сейчас, и выйти."""
+        next_status, last_done = 0.0, None
+        while not self._stop.is_set():
+            self.scan()
+            now = time.monotonic()
+            if now >= next_status:
+                snap = self._write_status()
+                done = (snap["files_done"], snap["files_failed"])
+                if snap["queue_depth"] or snap["in_flight"] or done != last_done:  # простой не логируем
+                    last_done = done
+                    logger.info("Queue %(queue_depth)s/%(queue_max)s, in flight %(in_flight)s, done %(files_done)s, "
+                                "failed %(files_failed)s, %(rows_per_s)s rows/s, %(files_per_min)s files/min",
+                                snap, extra={"metrics": snap})
+                next_status = now + self.status_interval_s
+            if once and not self._seen and not self.pending and not self._recovery:
+                break
+            self._stop.wait(self.poll_interval_s)
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        """Дождаться файлов в работе; забранные, но не начатые остаются в processing до следующего запуска."""
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self._threads:
+            self.jobs.put(None)
+        for t in self._threads:
+            t.join()
+        self.pool.shutdown()
+        self._write_status()
+
+def main(argv: Optional[Sequence[str]] = None):
+    ap = argparse.ArgumentParser(description="AddrNormalizer: демон обработки файлов из папки входа")
+    ap.add_argument("--input-dir", default=os.path.join("data", "input"))
+    ap.add_argument("--output-dir", default=os.path.join("data", "output"))
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                    help="процессов в пуле (профиль загружается в каждом один раз)")
+    ap.add_argument("--max-queue", type=int, default=100, help="файлов в очереди; сверх — остаются в input")
+    ap.add_argument("--poll-interval", type=float, default=2.0, help="период опроса папки, с")
+    ap.add_argument("--status-interval", type=float, default=30.0, help="период записи статуса и лога очереди, с")
+    ap.add_argument("--once", action="store_true", help="обработать текущие файлы и выйти")
+    ap.add_argument("--delete-processed", action="store_true", help="удалять обработанные файлы вместо input/done")
+    ap.add_argument("--output-mode", choices=["addr-only", "extended"], default="addr-only")
+    ap.add_argument("--fields", help="только эти колонки результата через запятую")
+    ap.add_argument("--compress", choices=["gzip", "zstd"])
+    ap.add_argument("--use-libpostal", action="store_true")
+    ap.add_argument("--libpostal-url", default="http://localhost:8080",
+                    help="URL libpostal-rest; несколько инстансов — через запятую")
+    ap.add_argument("--libpostal-gate", nargs="?", const="default", metavar="THRESHOLDS",
+                    help="в libpostal только строки с низкой локальной уверенностью")
+    ap.add_argument("--zip-index", metavar="PATH", help="индекс ZIP ↔ населённый пункт: колонка zip_consistency")
+    ap.add_argument("--fill-locality", action="store_true", help="с --zip-index: заполнять пустой населённый пункт по ZIP")
+    ap.add_argument("--chunk-rows", type=int, default=100_000)
+    ap.add_argument("--memory-budget", type=float, metavar="MB", help="бюджет памяти на один воркер, МБ")
+    ap.add_argument("--mp-context", choices=["fork", "spawn", "forkserver"])
+    ap.add_argument("--logs-dir", default="logs")
+    ap.add_argument("--log-json", action="store_true")
+    args = ap.parse_args(argv)
+    try:
+        fields = parse_fields(args.fields)
+        thresholds = parse_thresholds(args.libpostal_gate)
+    except ValueError as e:
+        ap.error(str(e))
+
+    log = setup_logging(logs_dir=args.logs_dir, level="INFO", json_format=args.log_json,
+                        multiprocess=True, mp_context=args.mp_context)
+    profile_loaded()
+    watcher = FolderWatcher(
+        input_dir=args.input_dir, output_dir=args.output_dir, workers=args.workers, max_queue=args.max_queue,
+        poll_interval_s=args.poll_interval, status_interval_s=args.status_interval, compress=args.compress,
+        keep_processed=not args.delete_processed, mp_context=args.mp_context,
+        log_queue=log.log_queue, run_id=log.run_id,
+        output_mode=args.output_mode, fields=fields, use_libpostal=args.use_libpostal,
+        libpostal_url=args.libpostal_url, libpostal_thresholds=thresholds,
+        chunk_rows=args.chunk_rows, memory_budget_mb=args.memory_budget,
+        zip_index=args.zip_index, fill_locality=args.fill_locality,
+    ).start()
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    logger.info("Watching %s with %s worker(s), queue <= %s → %s", args.input_dir, watcher.workers,
+                watcher.jobs.maxsize, args.output_dir)
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        watcher.close()
+        logger.info("Watcher stopped: %s", json.dumps(watcher.status(), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
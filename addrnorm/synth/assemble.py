@@ -1,18 +1,98 @@
+from __future__ import annotations
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
 from ..clean.text_normalize import norm_text, is_garbage
+from ..rules.registry import get_templates
+
+# порядок по умолчанию, если в configs/config.yaml нет templates.default_order
+DEFAULT_TEMPLATE = ((("street", "house"), ("locality",), ("region",), ("district",), ("zip",), ("country",)), ", ")
 
 def join_nonempty(parts, sep=", "):
     clean = [p for p in (norm_text(x) for x in parts) if p and not is_garbage(p)]
     return sep.join(clean)
 
-def assemble_addr_norm(country, region, district, locality, street_norm, house_number, zip_norm):
-    # street + house (в любой последовательности, пока: "street house")
-    street_block = join_nonempty([f"{street_norm} {house_number}".strip()])
-    # базовый универсальный шаблон
-    return join_nonempty([
-        street_block,
-        locality,
-        region,
-        district,
-        zip_norm,
-        country,
-    ])
+def combine_street(street, house) -> str:
+    """Улица и дом в одну часть ("Main St" + "5" -> "Main St 5")."""
+    s = str(street).strip()
+    h = str(house).strip()
+    return f"{s} {h}".strip() if s and h else (s or h)
+
+def _clean_part(s) -> str:
+    s = norm_text(s)
+    return "" if not s or is_garbage(s) else s
+
+def _template_for(country_iso2: Optional[str]):
+    t = get_templates()
+    if country_iso2:
+        tpl = t["countries"].get(str(country_iso2).upper())
+        if tpl:
+            return tpl
+    return t["default"] or DEFAULT_TEMPLATE
+
+def assemble_addr_norm(country, region, district, locality, street_norm, house_number, zip_norm,
+                       country_iso2: Optional[str] = None):
+    """Одна строка addr_norm по шаблону страны (для построчного API)."""
+    values = {
+        "street": street_norm, "house": house_number, "locality": locality, "region": region,
+        "district": district, "zip": zip_norm, "country": country,
+    }
+    order, sep = _template_for(country_iso2)
+    parts = []
+    for group in order:
+        # группа (street house) склеивается пробелом и чистится как одно целое
+        raw = " ".join(str(values.get(n) or "") for n in group).strip()
+        p = _clean_part(raw)
+        if p:
+            parts.append(p)
+    return sep.join(parts)
+
+# ---------- колоночная сборка ----------
+def _clean_column(arr: np.ndarray) -> np.ndarray:
+    # norm_text/is_garbage только по уникальным значениям, затем раскладка по кодам
+    codes, uniques = pd.factorize(arr, use_na_sentinel=False)
+    cleaned = np.array([_clean_part(u) for u in uniques] + [""], dtype=object)
+    return cleaned[codes]
+
+def _as_array(s, n: int) -> np.ndarray:
+    if s is None:
+        return np.full(n, "", dtype=object)
+    return pd.Series(s, dtype="string").fillna("").to_numpy(dtype=object)
+
+def _apply_template(cols: Mapping[str, np.ndarray], order, sep: str, n: int) -> np.ndarray:
+    out = np.full(n, "", dtype=object)
+    for group in order:
+        members = [cols.get(name) for name in group]
+        members = [m if m is not None else np.full(n, "", dtype=object) for m in members]
+        raw = members[0]
+        for m in members[1:]:
+            raw = raw + " " + m
+        # внешние пробелы группы (пустой дом) снимает сам norm_text
+        part = _clean_column(raw)
+        glue = np.where((out != "") & (part != ""), sep, "").astype(object)
+        out = out + glue + part
+    return out
+
+def assemble_columns(components: Mapping[str, Sequence], country_iso2: Optional[Sequence] = None) -> pd.Series:
+    """
+    addr_norm для всего столбца сразу. components: {"street": ..., "house": ..., "locality": ...,
+    "region": ..., "district": ..., "zip": ..., "country": ...} (Series/списки одинаковой длины).
+    Шаблон выбирается по country_iso2 строки (templates.countries), иначе default_order.
+    """
+    n = len(next(iter(components.values()))) if components else 0
+    cols = {k: _as_array(v, n) for k, v in components.items()}
+    t = get_templates()
+    default_order, default_sep = t["default"] or DEFAULT_TEMPLATE
+    out = _apply_template(cols, default_order, default_sep, n)
+
+    if t["countries"] and country_iso2 is not None and n:
+        iso = np.array([(str(x).upper() if x else "") for x in country_iso2], dtype=object)
+        for code, (order, sep) in t["countries"].items():
+            mask = iso == code
+            if not mask.any():
+                continue
+            sub = {k: v[mask] for k, v in cols.items()}
+            out[mask] = _apply_template(sub, order, sep, int(mask.sum()))
+    return pd.Series(out, dtype="string")
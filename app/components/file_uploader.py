@@ -1,13 +1,13 @@
 import streamlit as st
-import pandas as pd
-from io import StringIO
+from addrnorm.io.reader import read_csv_any
 
-def upload_csv():
-    f = st.file_uploader("Загрузите CSV", type=["csv"])
+def upload_csv(address_only: bool = False):
+    f = st.file_uploader("Загрузите CSV", type=["csv", "gz", "zst"],
+                         help="Поддерживаются .csv, .csv.gz и .csv.zst; кодировка определяется автоматически.")
     if not f:
         return None
-    content = f.getvalue().decode("utf-8", errors="replace")
-    df = pd.read_csv(StringIO(content), dtype="string", keep_default_na=False, na_values=[])
+    # парсим прямо из байтового буфера загрузки (без decode/StringIO-копий)
+    df = read_csv_any(f, address_only=address_only, name=f.name)
     st.caption(f"Строк: {len(df)}, Колонок: {len(df.columns)}")
     # ↓ раскрыт сразу
     with st.expander("Первые строки", expanded=True):
@@ -1,5 +1,7 @@
 import streamlit as st
 
+from addrnorm.libpostal.router import parse_thresholds
+
 def render_options():
     st.sidebar.header("Параметры")
 
@@ -16,14 +18,56 @@ def render_options():
         value=False,
         help="После базовой очистки прогонять адрес через libpostal REST (медленнее)."
     )
-    libpostal_url = st.sidebar.text_input(
+    libpostal_urls = st.sidebar.text_area(
         "Libpostal REST URL",
         value="http://localhost:8080",
-        help="Базовый URL контейнера libpostal-rest (например, http://localhost:8080)."
+        help="Базовые URL контейнеров libpostal-rest, по одному в строке (например, http://localhost:8080). "
+             "Несколько инстансов — запросы распределяются между ними."
+    )
+    libpostal_balance = st.sidebar.selectbox(
+        "Балансировка libpostal",
+        options=["least_inflight", "latency"],
+        index=0,
+        help="least_inflight: инстанс с наименьшим числом запросов в полёте. latency: с наименьшей задержкой."
+    )
+    libpostal_gate = st.sidebar.text_input(
+        "Пороги уверенности для libpostal",
+        value="",
+        help="Пусто — в libpostal идут все строки. default или, например, zip=1,country=0.5,street=1,locality=1 — "
+             "только строки, где локальная уверенность по компоненту ниже порога (0 — не проверять)."
+    )
+    libpostal_url = ",".join(u.strip() for u in libpostal_urls.splitlines() if u.strip()) or "http://localhost:8080"
+    # пороги проверяем здесь: опечатка — сообщение в панели, а не трейсбек на странице
+    libpostal_thresholds, options_error = None, None
+    if use_libpostal:
+        try:
+            libpostal_thresholds = parse_thresholds(libpostal_gate.strip() or None)
+        except ValueError as e:
+            options_error = str(e)
+            st.sidebar.error(options_error)
+
+    # сжатие результата (скачивание и копия в data/output)
+    compression = st.sidebar.selectbox(
+        "Сжатие результата",
+        options=["нет", "gzip", "zstd"],
+        index=0,
+        help="gzip/zstd уменьшают размер скачиваемого файла; zstd требует пакет zstandard."
+    )
+
+    # dry-run
+    sample_size = st.sidebar.number_input(
+        "Размер выборки для оценки (dry-run)",
+        min_value=100, max_value=100000, value=5000, step=500,
+        help="Оценка времени, изменений и памяти по стратифицированной выборке без полной обработки."
     )
 
     return {
         "output_mode": output_mode,
         "use_libpostal": use_libpostal,
         "libpostal_url": libpostal_url,
+        "libpostal_balance": libpostal_balance,
+        "libpostal_thresholds": libpostal_thresholds,
+        "options_error": options_error,
+        "sample_size": int(sample_size),
+        "compression": None if compression == "нет" else compression,
     }
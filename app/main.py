@@ -9,11 +9,14 @@ import time
 import streamlit as st
 
 from addrnorm.logging_cfg.setup import setup_logging
-from addrnorm.io.writer import process_dataframe, write_csv
+from addrnorm.io.writer import process_dataframe
+from addrnorm.io.output import csv_bytes, write_bytes_atomic
 from app.components.options_panel import render_options
 from app.components.file_uploader import upload_csv
 from addrnorm.qa.reports import build_columnwise_report, save_examples_txt
+from addrnorm.qa.dryrun import estimate_dataframe
 from addrnorm.rules.registry import get_profile_path, profile_loaded
+from addrnorm.libpostal.client import get_client
 
 st.set_page_config(page_title="AddrNormalizer", layout="wide")
 
@@ -35,22 +38,47 @@ else:
 # Параметры (режимы и libpostal)
 opts = render_options()
 
+# общий клиент пула libpostal: стратегия балансировки из панели
+lp_client = get_client(opts["libpostal_url"], balance=opts["libpostal_balance"]) if opts.get("use_libpostal") else None
+
 # Загрузка CSV (превью открыто в компоненте)
-df = upload_csv()
+# extended не возвращает исходные колонки — читаем только адресные
+df = upload_csv(address_only=opts["output_mode"] == "extended")
+
+# Кнопки оценки и запуска обработки
+col_run, col_dry = st.columns([1, 1])
+blocked = df is None or bool(opts.get("options_error"))
+run = col_run.button("🚀 Запустить обработку", type="primary", disabled=blocked)
+dry = col_dry.button("🔎 Оценка (dry-run)", disabled=blocked)
 
-# Кнопка запуска обработки
-run = st.button("🚀 Запустить обработку", type="primary", disabled=df is None)
+if dry and not blocked:
+    st.markdown("---")
+    st.subheader("Оценка по выборке")
+    with st.spinner("Прогон выборки..."):
+        rep = estimate_dataframe(
+            df,
+            output_mode=opts["output_mode"],
+            use_libpostal=opts.get("use_libpostal", False),
+            libpostal_url=opts.get("libpostal_url", "http://localhost:8080"),
+            libpostal_thresholds=opts.get("libpostal_thresholds"),
+            sample_size=opts.get("sample_size", 5000),
+        )
+    logger.info("Dry-run: %s rows, sample %s, est %.1fs", rep.total_rows, rep.sample_rows, rep.est_runtime_s)
+    st.text_area("Прогноз", value="\n".join(rep.to_lines()), height=360)
 
-if run and df is not None:
+if run and not blocked:
     st.markdown("---")
     st.subheader("Обработка")
     with st.spinner("Нормализация..."):
         t0 = time.time()
+        run_stats: dict = {}
         out, changes = process_dataframe(
             df,
             output_mode=opts["output_mode"],
             use_libpostal=opts.get("use_libpostal", False),
             libpostal_url=opts.get("libpostal_url", "http://localhost:8080"),
+            libpostal_thresholds=opts.get("libpostal_thresholds"),
+            stats=run_stats,
         )
         dt = time.time() - t0
         logger.info(
@@ -60,13 +88,22 @@ if run and df is not None:
 
     st.success(f"Готово: {len(out)} строк за {dt:.2f} сек")
     st.dataframe(out.head(20))
+    if lp_client is not None:
+        if opts.get("libpostal_thresholds"):
+            st.caption(f"libpostal: {run_stats.get('libpostal_routed_rows', 0)} из {len(df)} строк, "
+                       f"{run_stats.get('libpostal_calls', 0)} вызовов, "
+                       f"{run_stats.get('libpostal_calls_avoided', 0)} не понадобились")
+        st.caption("libpostal по инстансам")
+        st.dataframe(lp_client.stats())
 
-    # Сохранение результата и кнопка скачивания
-    os.makedirs("data/output", exist_ok=True)
-    out_path = f"data/output/addrnorm_{int(time.time())}.csv"
-    write_csv(out, out_path)
-    with open(out_path, "rb") as f:
-        st.download_button("Скачать результат CSV", f, file_name=os.path.basename(out_path), mime="text/csv")
+    # Результат собирается в памяти: тот же буфер уходит в скачивание и копией в data/output
+    comp = opts.get("compression")
+    ext = {"gzip": ".csv.gz", "zstd": ".csv.zst"}.get(comp, ".csv")
+    out_path = f"data/output/addrnorm_{int(time.time())}{ext}"
+    buf = csv_bytes(out, compression=comp)
+    write_bytes_atomic(buf.getvalue(), out_path)
+    mime = "text/csv" if comp is None else "application/octet-stream"
+    st.download_button("Скачать результат CSV", buf, file_name=os.path.basename(out_path), mime=mime)
 
     # Помодульные логи изменений (≤20 примеров на колонку, равномерно по датасету)
     st.subheader("Логи изменений по колонкам")
@@ -79,5 +116,5 @@ if run and df is not None:
     st.caption(f"Лог-примеры: {examples_path}")
     st.caption(f"Полный лог: {logger.log_path}")
 
-elif df is None:
+if df is None:
     st.info("Загрузите файл для старта.")
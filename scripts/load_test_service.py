@@ -0,0 +1,60 @@
+# Нагрузочный тест локального сервиса (python -m addrnorm.service.server):
+#   python scripts/load_test_service.py --csv examples/global_min.csv --concurrency 32 --requests 5000
+import argparse, csv, json, random, threading, time, urllib.request
+
+def _post(url: str, rec: dict, timeout: float) -> int:
+    req = urllib.request.Request(url, data=json.dumps(rec).encode("utf-8"), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.getcode()
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8765")
+    ap.add_argument("--csv", required=True, help="CSV с колонками country/zip/region/locality/street")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--timeout", type=float, default=10.0)
+    args = ap.parse_args()
+
+    with open(args.csv, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise SystemExit("пустой CSV")
+
+    lat, codes, lock = [], {}, threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        rnd = random.Random()
+        for _ in counter:
+            t0 = time.perf_counter()
+            code = _post(args.url + "/normalize", rnd.choice(rows), args.timeout)
+            dt = time.perf_counter() - t0
+            with lock:
+                lat.append(dt)
+                codes[code] = codes.get(code, 0) + 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    lat.sort()
+    pct = lambda q: lat[min(len(lat) - 1, int(q * (len(lat) - 1)))] * 1000
+    print(f"requests={len(lat)} wall={wall:.2f}s rps={len(lat) / wall:.1f} codes={codes}")
+    print(f"client latency ms: p50={pct(0.5):.2f} p90={pct(0.9):.2f} p99={pct(0.99):.2f}")
+    with urllib.request.urlopen(args.url + "/metrics", timeout=args.timeout) as resp:
+        print("server metrics:", json.dumps(json.loads(resp.read()), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
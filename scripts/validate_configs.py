@@ -0,0 +1,109 @@
+# Проверка конфигов: парсинг YAML, компиляция всех регулярных выражений профиля
+# и модулей разбора, линт на бэктрекинг и замер времени одного матча.
+#   python scripts/validate_configs.py [--budget-ms 5] [--max-len 2000] [--strict]
+# Код выхода 1 — если шаблон не компилируется или превышает бюджет времени
+# (со --strict — ещё и при статических замечаниях уровня danger).
+import argparse, os, re, sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from addrnorm.rules import registry
+from addrnorm.rules.regex_lint import check_pattern
+
+# модули, чьи скомпилированные шаблоны гоняются по каждой строке
+PARSE_MODULES = [
+    "addrnorm.clean.text_normalize",
+    "addrnorm.parse.zipcode",
+    "addrnorm.parse.locality",
+    "addrnorm.parse.street",
+]
+
+def _profile_patterns():
+    # так же, как их применяет parse.zipcode._match_against: re.match + IGNORECASE
+    for iso2, entry in sorted(registry.get_zip_patterns().items()):
+        for i, p in enumerate(entry.get("patterns") or []):
+            yield f"geo_profile.zip_patterns.{iso2}[{i}]", str(p), re.IGNORECASE, "match"
+
+def _zip_patterns_yaml(obj):
+    countries = obj.get("countries") or {}
+    for iso2, entry in sorted(countries.items(), key=lambda kv: str(kv[0])):
+        for i, p in enumerate((entry or {}).get("patterns") or []):
+            yield f"zip_patterns.yaml.{iso2}[{i}]", str(p), re.IGNORECASE, "match"
+
+def _non_string_keys(obj, path=""):
+    # YAML 1.1: NO/YES/ON/OFF без кавычек становятся bool (Норвегия -> False)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            p = f"{path}.{k}" if path else str(k)
+            if not isinstance(k, str):
+                yield p, k
+            yield from _non_string_keys(v, p)
+
+def _module_patterns():
+    import importlib
+    for modname in PARSE_MODULES:
+        mod = importlib.import_module(modname)
+        for attr, val in sorted(vars(mod).items()):
+            pats = val if isinstance(val, (list, tuple)) else [val]
+            for i, p in enumerate(pats):
+                if isinstance(p, re.Pattern):
+                    suffix = f"[{i}]" if isinstance(val, (list, tuple)) else ""
+                    # флаг UNICODE для str-шаблонов подразумевается — не передаём его повторно
+                    yield f"{modname.rsplit('.', 1)[-1]}.{attr}{suffix}", p.pattern, p.flags & ~re.UNICODE, "search"
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Валидация конфигов и регулярных выражений AddrNormalizer")
+    ap.add_argument("--budget-ms", type=float, default=5.0, help="бюджет времени одного матча, мс")
+    ap.add_argument("--max-len", type=int, default=2000, help="максимальная длина враждебного входа")
+    ap.add_argument("--strict", action="store_true", help="падать и на статических замечаниях уровня danger")
+    args = ap.parse_args(argv)
+
+    errors = 0
+    prof_path = registry.get_profile_path()
+    if not prof_path:
+        print("ERROR  geo_profile.yaml не найден")
+        return 1
+    print(f"profile: {prof_path}")
+
+    # YAML читается строго: ошибка разбора — FAIL, а не «пустой конфиг»
+    configs_dir = os.path.dirname(prof_path)
+    loaded = {}
+    for fname in (os.path.basename(prof_path), "zip_patterns.yaml", registry.CONFIG_FILENAME):
+        path = os.path.join(configs_dir, fname)
+        if fname != os.path.basename(prof_path) and not os.path.isfile(path):
+            continue
+        try:
+            loaded[fname] = registry.load_yaml(path)
+        except Exception as e:
+            print(f"FAIL {fname}: {e}")
+            errors += 1
+    if os.path.basename(prof_path) not in loaded:
+        return 1
+    for fname, obj in loaded.items():
+        for p, k in _non_string_keys(obj):
+            print(f"FAIL {fname}: ключ {p} прочитан как {type(k).__name__} {k!r} — возьмите его в кавычки")
+            errors += 1
+
+    patterns = (list(_profile_patterns()) + list(_zip_patterns_yaml(loaded.get("zip_patterns.yaml") or {}))
+                + list(_module_patterns()))
+    for name, pattern, flags, mode in patterns:
+        rep = check_pattern(name, pattern, flags, mode=mode, budget_ms=args.budget_ms, max_len=args.max_len)
+        danger = [i for i in rep.issues if i.severity == "danger"]
+        bad = rep.failed or (args.strict and danger)
+        status = "FAIL" if bad else ("WARN" if rep.issues else "ok")
+        timing = ""
+        if rep.bench:
+            timing = f"worst {rep.bench.worst_ms:.3f} ms (len={len(rep.bench.worst_input)}), realistic {rep.bench.realistic_ms:.3f} ms"
+        print(f"{status:<5}{name}: {timing}{rep.error or ''}")
+        for it in rep.issues:
+            print(f"       [{it.severity}] {it.code}: {it.message}")
+        if bad:
+            errors += 1
+
+    print(f"\nшаблонов: {len(patterns)}, ошибок: {errors}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
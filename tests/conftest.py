@@ -0,0 +1,82 @@
+from __future__ import annotations
+import os
+
+import pytest
+
+from addrnorm.rules import registry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILE_YAML = """\
+countries:
+  index:
+    US: "United States"
+    DE: "Germany"
+  aliases:
+    usa: US
+zip_patterns:
+  US:
+    patterns: ['^\\d{5}$']
+"""
+
+CONFIG_YAML = """\
+templates:
+  default_order: [[street, house], locality, region, zip, country]
+"""
+
+@pytest.fixture
+def tmp_profile(tmp_path, monkeypatch):
+    """Профиль во временной папке: tmp/configs/{geo_profile,config}.yaml, снапшот — в tmp/cache."""
+    cfg_dir = tmp_path / "configs"
+    cfg_dir.mkdir()
+    (cfg_dir / registry.FILENAME).write_text(PROFILE_YAML, encoding="utf-8")
+    (cfg_dir / registry.CONFIG_FILENAME).write_text(CONFIG_YAML, encoding="utf-8")
+    monkeypatch.setenv(registry.ENV_VAR, str(cfg_dir / registry.FILENAME))
+    monkeypatch.setenv("ADDRNORM_CACHE_DIR", str(tmp_path / "cache"))
+    registry.reload_profile()
+    yield cfg_dir
+    monkeypatch.undo()
+    registry.reload_profile()
+
+@pytest.fixture
+def repo_cwd(monkeypatch):
+    """Рабочая папка — корень репозитория (configs/ и examples/ по относительным путям)."""
+    monkeypatch.chdir(ROOT)
+    return ROOT
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+@pytest.fixture
+def sample_df():
+    import pandas as pd
+    return pd.read_csv(os.path.join(DATA_DIR, "sample.csv"), dtype="string", keep_default_na=False, na_values=[])
+
+class StubLibPostal:
+    """Вместо HTTP-клиента libpostal: детерминированный разбор addr_norm по запятым."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def parse(self, address: str):
+        self.calls += 1
+        parts = [p.strip() for p in address.split(",") if p.strip()]
+        if not parts:
+            return []
+        comps = [{"label": "road", "value": parts[0].upper()}]
+        if len(parts) > 1:
+            comps.append({"label": "city", "value": parts[1].lower()})
+        comps += [{"label": "postcode", "value": p} for p in parts[2:] if any(ch.isdigit() for ch in p)][:1]
+        return comps
+
+    def map(self, fn, items):
+        return [fn(x) for x in items]
+
+@pytest.fixture
+def stub_libpostal(monkeypatch):
+    """Подменяет get_client в writer и normalizer на StubLibPostal (один на тест)."""
+    from addrnorm import normalizer
+    from addrnorm.io import writer
+    stub = StubLibPostal()
+    monkeypatch.setattr(writer, "get_client", lambda *a, **kw: stub)
+    monkeypatch.setattr(normalizer, "get_client", lambda *a, **kw: stub)
+    return stub
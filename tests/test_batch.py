@@ -0,0 +1,193 @@
+from __future__ import annotations
+import csv, gzip, io, os
+
+import pandas as pd
+import pytest
+
+from addrnorm.io import batch
+from addrnorm.io.batch import CheckpointMismatch, load_state, run_batch
+from addrnorm.io.reader import _read_record, iter_csv_chunks, read_csv_any
+from addrnorm.io.writer import process_dataframe
+from addrnorm.qa.reports import build_columnwise_report, save_examples_txt
+
+class Crash(Exception):
+    pass
+
+def _crash_after(monkeypatch, chunks: int):
+    """Падение после записи данных чанка chunks+1, но до фиксации его состояния."""
+    real = batch._write_state
+    calls = {"n": 0}
+
+    def write_state(ckpt_dir, state):
+        calls["n"] += 1
+        if calls["n"] > chunks:
+            raise Crash(f"crash in chunk {calls['n']}")
+        real(ckpt_dir, state)
+    monkeypatch.setattr(batch, "_write_state", write_state)
+
+def _examples(tmp_path, name, lines):
+    path = save_examples_txt(lines, logs_dir=str(tmp_path / name))
+    with open(path, "rb") as f:
+        return f.read()
+
+@pytest.fixture
+def input_csv(tmp_path, sample_df):
+    path = tmp_path / "in.csv"
+    sample_df.to_csv(path, index=False)
+    return str(path)
+
+@pytest.mark.parametrize("suffix", [".csv", ".csv.gz"])
+@pytest.mark.parametrize("mode", ["addr-only", "extended"])
+@pytest.mark.parametrize("crash_after", [1, 3, 5])
+def test_resume_matches_uninterrupted_run(tmp_path, monkeypatch, input_csv, suffix, mode, crash_after):
+    ckpt = str(tmp_path / "ckpt")
+    ref = run_batch(input_csv, output_path=str(tmp_path / f"ref{suffix}"), output_mode=mode,
+                    chunk_rows=10, checkpoint_dir=ckpt)
+
+    out = str(tmp_path / f"out{suffix}")
+    with monkeypatch.context() as m:
+        _crash_after(m, crash_after)
+        with pytest.raises(Crash):
+            run_batch(input_csv, output_path=out, output_mode=mode, chunk_rows=10, checkpoint_dir=ckpt)
+    state = load_state(ckpt)
+    assert state["chunks_done"] == crash_after
+    # в .part — незафиксированный хвост упавшего чанка; resume его отбросит
+    assert os.path.getsize(out + ".part") > state["output_bytes"]
+
+    res = run_batch(input_csv, output_mode=mode, chunk_rows=10, checkpoint_dir=ckpt, resume=True)
+    assert res.output_path == os.path.abspath(out)
+    assert res.resumed_from_row == 10 * crash_after
+    assert (res.rows, res.chunks) == (ref.rows, ref.chunks)
+    with open(ref.output_path, "rb") as a, open(res.output_path, "rb") as b:
+        assert a.read() == b.read()
+    assert res.report_lines == ref.report_lines
+    assert _examples(tmp_path, "ref", ref.report_lines) == _examples(tmp_path, "res", res.report_lines)
+    assert not os.path.exists(ckpt)
+
+def test_resume_output_equals_single_frame(tmp_path, input_csv, sample_df):
+    from addrnorm.io.writer import process_dataframe
+    res = run_batch(input_csv, output_path=str(tmp_path / "o.csv.gz"), output_mode="extended",
+                    chunk_rows=7, checkpoint_dir=str(tmp_path / "ckpt"))
+    with gzip.open(res.output_path, "rb") as f:
+        got = f.read()
+    expected, _ = process_dataframe(sample_df, output_mode="extended")
+    assert got == expected.to_csv(index=False).encode("utf-8")
+
+def _resume_with(tmp_path, monkeypatch, input_csv, **changed):
+    ckpt = str(tmp_path / "ckpt")
+    base = dict(output_path=str(tmp_path / "out.csv"), output_mode="extended", chunk_rows=10, checkpoint_dir=ckpt)
+    with monkeypatch.context() as m:
+        _crash_after(m, 2)
+        with pytest.raises(Crash):
+            run_batch(input_csv, **base)
+    return ckpt, {**base, **changed, "resume": True}
+
+@pytest.mark.parametrize("changed", [
+    {"fields": ["zip_norm", "country_norm"]},
+    {"output_mode": "addr-only"},
+    {"use_libpostal": True},
+    {"output_path": "other.csv"},
+])
+def test_resume_rejects_changed_params(tmp_path, monkeypatch, input_csv, changed):
+    if "output_path" in changed:
+        changed = {"output_path": str(tmp_path / changed["output_path"])}
+    ckpt, kw = _resume_with(tmp_path, monkeypatch, input_csv, **changed)
+    with pytest.raises(CheckpointMismatch):
+        run_batch(input_csv, **kw)
+    assert load_state(ckpt)["chunks_done"] == 2  # чекпоинт не тронут
+
+def test_resume_rejects_changed_input(tmp_path, monkeypatch, input_csv):
+    ckpt, kw = _resume_with(tmp_path, monkeypatch, input_csv)
+    with open(input_csv, "a", encoding="utf-8") as f:
+        f.write("99999,,12345,USA,,,,Main Street\n")
+    with pytest.raises(CheckpointMismatch, match="input"):
+        run_batch(input_csv, **kw)
+
+def test_resume_rejects_changed_profile(tmp_path, monkeypatch, input_csv):
+    ckpt, kw = _resume_with(tmp_path, monkeypatch, input_csv)
+    monkeypatch.setattr(batch, "get_profile_fingerprint", lambda: "another-profile")
+    with pytest.raises(CheckpointMismatch, match="profile_fingerprint"):
+        run_batch(input_csv, **kw)
+
+def test_resume_without_checkpoint_starts_over(tmp_path, input_csv):
+    res = run_batch(input_csv, output_path=str(tmp_path / "o.csv"), chunk_rows=10,
+                    checkpoint_dir=str(tmp_path / "ckpt"), resume=True)
+    assert res.resumed_from_row == 0 and res.rows == 55
+
+# ---------- многострочные записи на границах чанков ----------
+
+MULTILINE = (
+    'id,street,locality\n'
+    '1,"Main St\n5",Springfield\n'
+    '2,"quoted ""name"", with comma",X\n'
+    '3,"a\n\nb\n",""\n'
+    '4,plain,"line1\r\nline2"\n'
+    '5,"""",\n'
+    '6,"end ""\n""",Y\n'
+)
+
+def test_read_record_keeps_quoted_newlines():
+    stream = io.BytesIO(MULTILINE.encode("utf-8"))
+    records = []
+    while True:
+        rec = _read_record(stream)
+        if not rec:
+            break
+        records.append(rec)
+    assert len(records) == 7  # заголовок + 6 записей
+    assert records[1] == b'1,"Main St\n5",Springfield\n'
+    assert records[3] == b'3,"a\n\nb\n",""\n'
+    assert b"".join(records) == MULTILINE.encode("utf-8")
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 4, 100])
+@pytest.mark.parametrize("gz", [False, True])
+@pytest.mark.parametrize("engine", ["c", None])
+def test_chunks_split_multiline_records(tmp_path, chunk_rows, gz, engine):
+    data = MULTILINE.encode("utf-8")
+    path = tmp_path / ("m.csv.gz" if gz else "m.csv")
+    path.write_bytes(gzip.compress(data) if gz else data)
+    whole = read_csv_any(str(path), engine="c")
+    parts = list(iter_csv_chunks(str(path), chunk_rows=chunk_rows, engine=engine))
+    got = pd.concat([df for df, _ in parts], ignore_index=True)
+    pd.testing.assert_frame_equal(got, whole)
+    assert whole.loc[whole["id"] == "1", "street"].item() == "Main St\n5"
+
+    # продолжение с каждой границы чанка даёт тот же хвост
+    for i, (_, offset) in enumerate(parts[:-1]):
+        rest = pd.concat([df for df, _ in iter_csv_chunks(str(path), chunk_rows=chunk_rows, start_offset=offset,
+                                                          engine=engine)], ignore_index=True)
+        pd.testing.assert_frame_equal(rest, whole.iloc[(i + 1) * chunk_rows:].reset_index(drop=True))
+
+def test_resume_with_multiline_records(tmp_path, monkeypatch):
+    path = tmp_path / "m.csv"
+    path.write_text(MULTILINE, encoding="utf-8")
+    ckpt = str(tmp_path / "ckpt")
+    ref = run_batch(str(path), output_path=str(tmp_path / "ref.csv"), chunk_rows=2, checkpoint_dir=ckpt)
+    with monkeypatch.context() as m:
+        _crash_after(m, 1)
+        with pytest.raises(Crash):
+            run_batch(str(path), output_path=str(tmp_path / "out.csv"), chunk_rows=2, checkpoint_dir=ckpt)
+    res = run_batch(str(path), chunk_rows=2, checkpoint_dir=ckpt, resume=True)
+    assert open(res.output_path, "rb").read() == open(ref.output_path, "rb").read()
+    assert res.report_lines == ref.report_lines
+
+LINE_BREAKS = ["\n", "\r\n", "\r", "\u2028", "\x85", "\f"]
+
+def test_report_keeps_one_entry_per_multiline_change(tmp_path):
+    df = pd.DataFrame({
+        "id": [str(i) for i in range(30)],
+        "street": [f"main  st{LINE_BREAKS[i % len(LINE_BREAKS)]}{i}" for i in range(30)],
+        "locality": ["town"] * 30,
+    }, dtype="string")
+    path = tmp_path / "m.csv"
+    df.to_csv(path, index=False, quoting=csv.QUOTE_ALL)  # без кавычек pandas оставил бы голый \r
+    df = read_csv_any(str(path), engine="c")
+    res = run_batch(str(path), output_path=str(tmp_path / "out.csv"), chunk_rows=4, per_col_limit=7,
+                    checkpoint_dir=str(tmp_path / "ckpt"))
+    # отчёт из файлов изменений по чанкам == отчёт по всему кадру: ни одна запись не разбита на две
+    assert res.report_lines == build_columnwise_report(process_dataframe(df)[1], per_col_limit=7)
+    street = res.report_lines[1:res.report_lines.index("========== locality ==========")]
+    # и examples-файл читается обратно построчно любым способом
+    assert "\n".join(res.report_lines).splitlines() == res.report_lines
+    assert len(street) == 7 and all(line.startswith("[street] строка ") for line in street)
+    assert [line.split(":")[0] for line in street] == [f"[street] строка {n}" for n in (1, 6, 11, 15, 20, 25, 30)]
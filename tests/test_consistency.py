@@ -0,0 +1,149 @@
+from __future__ import annotations
+import os, pickle
+
+import pandas as pd
+import pytest
+
+from addrnorm.io.writer import process_dataframe
+from addrnorm.qa.consistency import (BAD_LOCALITY, BAD_REGION, INDEX_VERSION, OK, UNKNOWN, ConsistencyIndex,
+                                     build_index, get_index)
+
+def _index(rows, **kw) -> ConsistencyIndex:
+    df = pd.DataFrame(rows, columns=["country", "zip", "locality", "region"], dtype="string")
+    return build_index(df, **kw)
+
+def _check(idx, *rows):
+    iso, z, loc, reg = zip(*rows)
+    return idx.check(list(iso), list(z), list(loc), list(reg)).tolist()
+
+@pytest.fixture
+def towns():
+    # 20 населённых пунктов под одним префиксом 100: у префикса доля каждого — 5%
+    return [("US", f"100{i:02d}", f"Town{i}", "NY") for i in range(1, 21)]
+
+def test_zip_without_locality_is_no_evidence():
+    idx = _index([("US", "20001", "", "DC")])
+    assert _check(idx, ("US", "20001", "Washington", "")) == [OK]
+    # регион у ZIP при этом известен и проверяется
+    assert _check(idx, ("US", "20001", "Washington", "Texas")) == [BAD_REGION]
+
+def test_min_share_does_not_empty_prefixes(towns):
+    idx = _index(towns, min_share=0.1)
+    assert _check(idx, ("US", "10099", "Town5", ""), ("US", "10099", "Elsewhere", "")) == [OK, BAD_LOCALITY]
+
+def test_min_share_drops_rare_localities_of_exact_zip():
+    rows = [("US", "30301", "Atlanta", "")] * 19 + [("US", "30301", "Typo", "")]
+    idx = _index(rows, min_share=0.1)
+    assert _check(idx, ("US", "30301", "Atlanta", ""), ("US", "30301", "Typo", "")) == [OK, BAD_LOCALITY]
+    assert _check(_index(rows), ("US", "30301", "Typo", "")) == [OK]
+
+def test_check_statuses(towns):
+    idx = _index(towns)
+    assert _check(idx, ("US", "10005", "town5", ""), ("US", "10005", "Town6", ""), ("US", "99999", "X", ""),
+                  ("", "10005", "Town5", ""), ("US", None, "Town5", "")) == [OK, BAD_LOCALITY, UNKNOWN, "", ""]
+
+def test_fill_locality(towns):
+    rows = towns + [("US", "30301", "Atlanta", "")] * 9 + [("US", "30301", "Decatur", "")]
+    idx = _index(rows)
+    values, filled = idx.fill_locality(["US"] * 5, ["10005", "10099", "30301", "10007", "99999"],
+                                       ["", "", "", "Kept", ""])
+    # 10099 — только префикс, 30301 — доля Atlanta 90%, 99999 — ZIP не известен
+    assert [v.casefold() for v in values] == ["town5", "", "atlanta", "kept", ""]
+    assert filled == 2
+    values, filled = idx.fill_locality(["US"], ["30301"], [""], min_share=0.95)
+    assert (values, filled) == ([""], 0)
+
+def test_fill_share_counts_filtered_localities():
+    # 40/35/25%: при построении с min_share=0.3 остаются 40 и 35, но доля лидера — от всех 100 строк
+    rows = ([("US", "30301", "Atlanta", "")] * 40 + [("US", "30301", "Decatur", "")] * 35
+            + [("US", "30301", "Marietta", "")] * 25)
+    idx = _index(rows, min_share=0.3)
+    assert idx.exact[("US", "30301")][1] == (40, 35) and idx.exact[("US", "30301")][3] == 100
+    assert idx.fill_locality(["US"], ["30301"], [""], min_share=0.5) == ([""], 0)
+    values, filled = idx.fill_locality(["US"], ["30301"], [""], min_share=0.4)
+    assert filled == 1 and values[0].casefold() == "atlanta"
+
+# ---------- диск, writer, batch ----------
+
+ROWS = [("US", "10001", "New York", "NY")] * 3 + [("US", "94105", "San Francisco", "CA")] * 2
+
+@pytest.fixture
+def index_path(tmp_path):
+    path = str(tmp_path / "zip_index.pkl")
+    _index(ROWS, source="test").save(path)
+    return path
+
+def test_save_load_roundtrip(index_path):
+    built = _index(ROWS, source="test")
+    loaded = ConsistencyIndex.load(index_path)
+    assert (loaded.localities, loaded.regions) == (built.localities, built.regions)
+    assert (loaded.exact, loaded.prefix, loaded.prefix_lengths) == (built.exact, built.prefix, built.prefix_lengths)
+    assert loaded.meta["source"] == "test" and len(loaded.digest) == 16
+    assert _check(loaded, ("US", "10001", "new york", "")) == [OK]
+
+def test_get_index_reloads_on_change(index_path):
+    first = get_index(index_path)
+    assert get_index(index_path) is first
+    _index(ROWS + [("US", "60601", "Chicago", "IL")]).save(index_path)
+    st = os.stat(index_path)
+    os.utime(index_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    second = get_index(index_path)
+    assert second is not first and second.digest != first.digest
+    assert ("US", "60601") in second.exact
+
+def test_wrong_version_rejected(index_path):
+    with open(index_path, "rb") as f:
+        obj = pickle.load(f)
+    obj["version"] = INDEX_VERSION - 1
+    with open(index_path, "wb") as f:
+        pickle.dump(obj, f)
+    with pytest.raises(ValueError, match="версия"):
+        ConsistencyIndex.load(index_path)
+    with pytest.raises(ValueError):
+        get_index(index_path)
+
+def _input():
+    return pd.DataFrame({
+        "address": ["", "", "", ""],
+        "zip": ["10001", "10001", "94105", "99999"],
+        "country": ["US"] * 4,
+        "region": ["", "", "", ""],
+        "district": ["", "", "", ""],
+        "locality": ["", "Boston", "San Francisco", "Nowhere"],
+        "street": ["5th Ave 1", "Main St 2", "Market St 3", "Elm St 4"],
+    }, dtype="string")
+
+def test_process_dataframe_with_index(index_path):
+    stats: dict = {}
+    out, _ = process_dataframe(_input(), output_mode="extended", zip_index=index_path, fill_locality=True,
+                               stats=stats)
+    assert out["zip_consistency"].tolist() == [OK, BAD_LOCALITY, OK, UNKNOWN]
+    assert out["locality_norm"].tolist()[0].casefold() == "new york"
+    assert (stats["locality_filled"], stats["zip_inconsistent"], stats["zip_unknown"], stats["zip_checked"]) == (1, 1, 1, 4)
+    plain, _ = process_dataframe(_input(), output_mode="extended", zip_index=index_path, stats={})
+    assert plain["locality_norm"].tolist()[0] == "" and "zip_consistency" in plain.columns
+
+def test_run_batch_stores_index_digest(tmp_path, index_path, monkeypatch):
+    from addrnorm.io import batch
+    path = tmp_path / "in.csv"
+    pd.concat([_input()] * 3, ignore_index=True).to_csv(path, index=False)
+    ckpt = str(tmp_path / "ckpt")
+    real = batch._write_state
+
+    def crash(ckpt_dir, state):
+        real(ckpt_dir, state)
+        raise RuntimeError("stop after the first chunk")
+    monkeypatch.setattr(batch, "_write_state", crash)
+    with pytest.raises(RuntimeError):
+        batch.run_batch(str(path), output_path=str(tmp_path / "out.csv"), chunk_rows=4, checkpoint_dir=ckpt,
+                        zip_index=index_path, fill_locality=True)
+    monkeypatch.undo()
+    state = batch.load_state(ckpt)
+    assert state["zip_index"] == get_index(index_path).digest and state["fill_locality"] is True
+    # другой индекс — чекпоинт не подходит
+    _index(ROWS[:3]).save(index_path)
+    st = os.stat(index_path)
+    os.utime(index_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(batch.CheckpointMismatch):
+        batch.run_batch(str(path), chunk_rows=4, checkpoint_dir=ckpt, resume=True, zip_index=index_path,
+                        fill_locality=True)
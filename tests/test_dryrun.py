@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pytest
+
+from addrnorm import cli
+from addrnorm.qa.dryrun import _unique_keys, estimate_dataframe, estimate_file, recommend_workers, scan_file
+
+def test_recommend_workers_follows_measurements():
+    # локальная часть делится на процессы — берём все CPU
+    assert recommend_workers(100.0, 0.0, 1_000_000, 1000.0, 1024.0, 8) == 8
+    # libpostal не делится: дальше 5 процессов выигрыш меньше 10%
+    assert recommend_workers(100.0, 100.0, 1_000_000, 1000.0, 1024.0, 8) == 5
+    # маленький файл — один процесс
+    assert recommend_workers(100.0, 0.0, 5_000, 1000.0, 1024.0, 8) == 1
+    # память: 4 МБ на чанк из 1000 строк по 1 КБ -> не больше 4 процессов
+    assert recommend_workers(100.0, 0.0, 1_000_000, 1024.0, 4.0, 8) == 4
+
+def test_estimate_file_streams_like_dataframe(tmp_path, sample_df):
+    path = tmp_path / "in.csv"
+    sample_df.to_csv(path, index=False)
+    from_df = estimate_dataframe(sample_df, sample_size=1000, workers=4)
+    streamed = estimate_file(str(path), sample_size=1000, workers=4)
+    assert streamed.total_rows == from_df.total_rows == len(sample_df)
+    assert streamed.strata == from_df.strata
+    assert streamed.change_rate == from_df.change_rate
+    assert streamed.recommended_workers == 1  # 55 строк — процессы не окупаются
+
+def test_scan_file_keeps_bounded_subsample(tmp_path, sample_df):
+    path = tmp_path / "in.csv"
+    sample_df.to_csv(path, index=False)
+    scan = scan_file(str(path), reservoir_rows=20, chunk_rows=7)
+    assert scan["total"] == len(sample_df)
+    assert len(scan["rows"]) == 20
+    assert sum(scan["pairs"].values()) == len(sample_df)
+    assert scan["unique_keys"] == _unique_keys(sample_df)
+
+def test_estimate_file_subsample_weights(tmp_path, sample_df):
+    import pandas as pd
+    big = pd.concat([sample_df] * 20, ignore_index=True)
+    path = tmp_path / "big.csv"
+    big.to_csv(path, index=False)
+    full = estimate_dataframe(big, sample_size=200)
+    rep = estimate_file(str(path), sample_size=200, reservoir_rows=300)
+    assert rep.total_rows == len(big) and rep.sample_rows <= 300
+    assert rep.strata == full.strata
+    for col, rate in full.change_rate.items():
+        assert abs(rep.change_rate[col] - rate) < 0.15
+
+def test_cli_rejects_dry_run_on_sqlite(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(cli, "run_dry", lambda *a: pytest.fail("dry-run on a SQLite database"))
+    with pytest.raises(SystemExit) as e:
+        cli.main([str(tmp_path / "db.sqlite"), "--dry-run", "--sqlite-table", "t", "--logs-dir", str(tmp_path)])
+    assert e.value.code == 2 and "--sqlite-table" in capsys.readouterr().err
@@ -0,0 +1,85 @@
+from __future__ import annotations
+import threading, time
+
+import pytest
+
+from addrnorm.libpostal import client as lpclient
+from addrnorm.libpostal.client import LibPostalClient, get_client
+
+def _wait(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond():
+            return True
+        time.sleep(0.005)
+    return False
+
+def test_get_client_keys_on_options(monkeypatch):
+    monkeypatch.setattr(lpclient, "_CLIENTS", {})
+    a = get_client("http://lp1, http://lp2", timeout=5.0, retries=1)
+    assert get_client(["http://lp1", "http://lp2/"]) is a  # те же значения, что и по умолчанию
+    b = get_client("http://lp1,http://lp2", timeout=1.0)
+    assert b is not a and b.timeout == 1.0 and a.timeout == 5.0
+    assert get_client("http://lp1,http://lp2", retries=3).retries == 3
+    assert get_client("http://lp1,http://lp2", balance="latency") is a and a.balance == "latency"
+    with pytest.raises(TypeError):
+        get_client("http://lp1", timout=1.0)
+
+def _fail(client, ep_index=0):
+    ep = client.endpoints[ep_index]
+    for _ in range(client.fail_threshold):
+        client._pick({e.url for e in client.endpoints if e is not ep})
+        client._done(ep, None)
+    return ep
+
+def test_health_thread_restarts_after_recovery():
+    c = LibPostalClient(["http://a", "http://b"], health_interval_s=0.01, fail_threshold=2)
+    up = {"http://a": False}
+    c._probe = lambda ep: up.get(ep.url, True)
+
+    ep = _fail(c)
+    assert not ep.healthy and c._health_thread is not None
+    up["http://a"] = True
+    assert _wait(lambda: ep.healthy and c._health_thread is None)
+
+    # инстанс падает снова после выхода потока — проверка должна запуститься заново
+    up["http://a"] = False
+    _fail(c)
+    assert not ep.healthy and c._health_thread is not None and c._health_thread.is_alive()
+    up["http://a"] = True
+    assert _wait(lambda: ep.healthy)
+
+class _ExitHookLock:
+    """
+    Замок клиента, который вызывает hook сразу после того, как поток health-check отпустил
+    замок, найдя все инстансы здоровыми, — ровно в окне между решением о выходе и выходом.
+    """
+
+    def __init__(self, client, hook):
+        self._lock = threading.Lock()
+        self.client, self.hook = client, hook
+        self._all_up = False
+
+    def _healthy(self):
+        return all(e.healthy for e in self.client.endpoints)
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._all_up = self._healthy()
+        return self
+
+    def __exit__(self, *exc):
+        fire = threading.current_thread().name == "libpostal-health" and self._all_up and self._healthy()
+        self._lock.release()
+        if fire and self.hook:
+            hook, self.hook = self.hook, None
+            hook()
+
+def test_failure_during_health_exit_is_not_lost():
+    c = LibPostalClient(["http://a", "http://b"], health_interval_s=0.01, fail_threshold=1)
+    c._probe = lambda ep: True
+    ep = c.endpoints[0]
+    c._lock = _ExitHookLock(c, lambda: _fail(c))
+    _fail(c)
+    assert _wait(lambda: c._lock.hook is None)  # сбой пришёлся на окно выхода
+    assert _wait(lambda: ep.healthy), "endpoint stayed down: health thread was not restarted"
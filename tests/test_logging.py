@@ -0,0 +1,83 @@
+from __future__ import annotations
+import json, logging
+
+import pytest
+
+from addrnorm.logging_cfg import setup as logsetup
+from addrnorm.logging_cfg.setup import RateLimitFilter, log_context, setup_logging, stop_logging
+
+@pytest.fixture(autouse=True)
+def _reset_logging():
+    yield
+    stop_logging()
+    logging.getLogger("addrnorm").handlers.clear()
+
+def test_setup_logging_is_idempotent(tmp_path):
+    first = setup_logging(logs_dir=str(tmp_path), level="INFO")
+    listener, run_id, path = logsetup._LISTENER, first.run_id, first.log_path
+    for _ in range(3):  # перезапуски страницы Streamlit
+        again = setup_logging(logs_dir=str(tmp_path), level="INFO")
+    assert again is first
+    assert logsetup._LISTENER is listener and again.run_id == run_id and again.log_path == path
+    assert len(again.handlers) == 1
+    stop_logging()
+    text = open(path, encoding="utf-8").read()
+    assert text.count("Logger initialized") == 1
+
+def test_changed_config_restarts_listener(tmp_path):
+    first = setup_logging(logs_dir=str(tmp_path), level="INFO")
+    run_id = first.run_id
+    listener = logsetup._LISTENER
+    second = setup_logging(logs_dir=str(tmp_path), level="DEBUG")
+    assert logsetup._LISTENER is not listener and second.run_id != run_id
+    third = setup_logging(logs_dir=str(tmp_path), level="DEBUG", run_id="fixed")
+    assert third.run_id == "fixed"
+
+def test_json_lines_carry_run_and_context(tmp_path):
+    log = setup_logging(logs_dir=str(tmp_path), json_format=True, run_id="r1")
+    with log_context(chunk_id=3):
+        log.info("chunk done", extra={"metrics": {"rows": 10}})
+    stop_logging()
+    rows = [json.loads(line) for line in open(log.log_path, encoding="utf-8")]
+    rec = next(r for r in rows if r["msg"] == "chunk done")
+    assert rec["run_id"] == "r1" and rec["chunk_id"] == 3 and rec["metrics"] == {"rows": 10}
+
+def _record(msg="bad zip in row %s", level=logging.WARNING):
+    return logging.LogRecord("addrnorm", level, __file__, 1, msg, (1,), None)
+
+def test_rate_limit_samples_repeats(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(logsetup.time, "monotonic", lambda: clock[0])
+    f = RateLimitFilter(burst=3, sample_every=5, window_s=60)
+    recs = [_record() for _ in range(20)]
+    passed = [i + 1 for i, r in enumerate(recs) if f.filter(r)]
+    assert passed == [1, 2, 3, 8, 13, 18]
+    assert [getattr(recs[i - 1], "suppressed", None) for i in passed] == [None, None, None, 4, 4, 4]
+    # другие шаблоны и ошибки считаются отдельно / не сэмплируются
+    assert f.filter(_record("other %s")) and all(f.filter(_record(level=logging.ERROR)) for _ in range(10))
+    clock[0] += 61  # новое окно: снова burst, с хвостом пропущенных
+    r = _record()
+    assert f.filter(r) and r.suppressed == 2
+
+def test_rate_limit_survives_repeated_setup(tmp_path):
+    for _ in range(3):
+        log = setup_logging(logs_dir=str(tmp_path), json_format=True)
+    (qh,) = log.handlers
+    assert sum(isinstance(x, RateLimitFilter) for x in qh.filters) == 1
+    for i in range(1020):
+        log.warning("bad zip in row %s", i)
+    log.error("fatal")
+    stop_logging()
+    rows = [json.loads(line) for line in open(log.log_path, encoding="utf-8")]
+    warnings = [r for r in rows if r["level"] == "WARNING"]
+    assert len(warnings) == 21 and warnings[-1]["suppressed"] == 999
+    assert rows[-1]["msg"] == "fatal"
+
+def test_rate_limit_can_be_disabled(tmp_path):
+    log = setup_logging(logs_dir=str(tmp_path), rate_limit=False)
+    assert not any(isinstance(x, RateLimitFilter) for x in log.handlers[0].filters)
+    for i in range(50):
+        log.warning("bad zip in row %s", i)
+    stop_logging()
+    text = open(log.log_path, encoding="utf-8").read()
+    assert text.count("bad zip in row") == 50
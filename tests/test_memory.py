@@ -0,0 +1,85 @@
+from __future__ import annotations
+import time
+
+import pandas as pd
+import pytest
+
+from addrnorm.io.batch import run_batch
+from addrnorm.io.memory import ChunkSizer, RssSampler, frame_bytes, rss_bytes
+from addrnorm.io.writer import process_dataframe
+
+MB = 1024 * 1024
+
+def test_sizer_shrinks_over_budget():
+    s = ChunkSizer(100 * MB, initial_rows=20_000)
+    # 20k строк подняли пик на 100 МБ при базе 50 МБ: 5 КБ на строку, места 85-50=35 МБ
+    rows = s.update(20_000, 50 * MB, 150 * MB)
+    assert s.per_row == pytest.approx(100 * MB / 20_000)
+    assert rows == int((85 * MB - 50 * MB) / s.per_row) < 20_000
+
+def test_sizer_grows_at_most_twice():
+    s = ChunkSizer(1024 * MB, initial_rows=1_000, max_rows=10_000)
+    got = [s.update(s(), 10 * MB, 10 * MB + s() * 10) for _ in range(6)]
+    assert got == [2_000, 4_000, 8_000, 10_000, 10_000, 10_000]
+
+def test_sizer_respects_bounds():
+    s = ChunkSizer(100 * MB, initial_rows=50_000, min_rows=500, max_rows=30_000)
+    assert s() == 30_000  # стартовый размер тоже в границах
+    assert s.update(30_000, 10 * MB, 10 * MB + 30_000 * MB) == 500  # строка дороже бюджета
+    s = ChunkSizer(100 * MB, initial_rows=2_000, min_rows=500)
+    assert s.update(2_000, 200 * MB, 210 * MB) == 500  # база уже выше бюджета
+    assert s.update(0, 0, 0) == 500  # пустой чанк ничего не меняет
+    assert ChunkSizer(100 * MB, initial_rows=100, min_rows=300)() == 300
+
+def test_sizer_uses_frames_and_smooths_down():
+    s = ChunkSizer(1024 * MB, initial_rows=1_000)
+    s.update(1_000, 100 * MB, 100 * MB, frames_bytes=1_000 * 2_000)  # RSS не вырос — берём размер кадров
+    assert s.per_row == 2_000
+    s.update(1_000, 100 * MB, 100 * MB + 1_000 * 500)
+    assert s.per_row == pytest.approx(0.7 * 2_000 + 0.3 * 500)  # падение — сглаженно
+    s.update(1_000, 100 * MB, 100 * MB + 1_000 * 4_000)
+    assert s.per_row == 4_000  # рост — сразу
+
+def test_frame_bytes_counts_nested_values():
+    s = pd.Series(["x" * 100] * 10, dtype="string")
+    df = pd.DataFrame({"a": s, "b": s})
+    assert frame_bytes([df]) == 2 * frame_bytes([s])
+    assert frame_bytes([{"k": s, "n": {"m": s}}]) == 2 * frame_bytes([s])
+    assert frame_bytes([[s, s]]) == 2 * frame_bytes([s])
+    codes = ["US"] * 1000
+    assert 8_000 < frame_bytes([codes]) < 9_000  # один общий объект строки
+    assert frame_bytes([None, 5, "text"]) == 0
+
+def test_process_dataframe_measures_intermediates(sample_df):
+    stats: dict = {}
+    out, changes = process_dataframe(sample_df, output_mode="extended", stats=stats, measure_bytes=True)
+    io_only = frame_bytes([sample_df, out, *(s for pair in changes.values() for s in pair)])
+    assert stats["frame_bytes"] > io_only
+    plain: dict = {}
+    process_dataframe(sample_df, stats=plain)
+    assert "frame_bytes" not in plain
+
+@pytest.mark.skipif(rss_bytes() is None, reason="RSS is not measurable here")
+def test_rss_sampler_catches_peak():
+    sampler = RssSampler(interval_s=0.005).start()
+    try:
+        base = sampler.reset()
+        blob = bytearray(64 * MB)
+        blob[::4096] = b"x" * len(blob[::4096])  # страницы действительно заняты
+        time.sleep(0.1)
+        del blob
+        assert sampler.reset() >= base + 48 * MB
+    finally:
+        sampler.stop()
+
+@pytest.mark.skipif(rss_bytes() is None, reason="RSS is not measurable here")
+def test_budget_keeps_small_chunk_rows(tmp_path, sample_df):
+    df = pd.concat([sample_df] * 40, ignore_index=True)
+    path = tmp_path / "in.csv"
+    df.to_csv(path, index=False)
+    # бюджет ниже базы процесса: чанк сжимается до минимума, а минимум — не выше chunk_rows
+    res = run_batch(str(path), output_path=str(tmp_path / "out.csv"), chunk_rows=300, memory_budget_mb=1,
+                    checkpoint_dir=str(tmp_path / "ckpt"))
+    sizes = [m["rows"] for m in res.chunk_metrics]
+    assert sum(sizes) == len(df) and max(sizes) == 300
+    assert all(m["frames_mb"] > 0 for m in res.chunk_metrics)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from addrnorm.io.writer import process_dataframe
+from addrnorm.normalizer import Normalizer
+
+def _via_normalizer(df: pd.DataFrame, **kw) -> pd.DataFrame:
+    nz = Normalizer(**kw)
+    rows = list(nz.normalize_iter(df.to_dict("records")))
+    return pd.DataFrame(rows).astype("string")
+
+@pytest.mark.parametrize("mode", ["addr-only", "extended"])
+@pytest.mark.parametrize("use_libpostal", [False, True])
+def test_normalize_iter_matches_process_dataframe(sample_df, stub_libpostal, mode, use_libpostal):
+    expected, _ = process_dataframe(sample_df, output_mode=mode, use_libpostal=use_libpostal)
+    got = _via_normalizer(sample_df, output_mode=mode, use_libpostal=use_libpostal)
+    pd.testing.assert_frame_equal(got, expected.astype("string").reset_index(drop=True))
+    assert (stub_libpostal.calls > 0) == use_libpostal
+
+def test_libpostal_changes_output(sample_df, stub_libpostal):
+    # заглушка действительно влияет на результат — сравнение выше не тривиально
+    plain = _via_normalizer(sample_df, output_mode="extended")
+    lp = _via_normalizer(sample_df, output_mode="extended", use_libpostal=True)
+    assert (plain["street"] != lp["street"]).any()
+
+def test_libpostal_error_keeps_local_values(sample_df, monkeypatch):
+    from addrnorm import normalizer
+
+    class Failing:
+        def parse(self, address):
+            raise ConnectionError("down")
+
+    monkeypatch.setattr(normalizer, "get_client", lambda *a, **kw: Failing())
+    plain = _via_normalizer(sample_df, output_mode="extended")
+    lp = _via_normalizer(sample_df, output_mode="extended", use_libpostal=True)
+    pd.testing.assert_frame_equal(plain, lp)
+
+def test_missing_columns_and_cache(sample_df):
+    nz = Normalizer(output_mode="extended")
+    row = nz.normalize_record({"country": "USA"})
+    assert row["country_norm"] == "United States" and row["street"] == ""
+    recs = sample_df.to_dict("records")
+    list(nz.normalize_iter(recs + recs))
+    assert nz.cache_info()["zip_country"].hits >= len(recs)
@@ -0,0 +1,39 @@
+from __future__ import annotations
+import gzip, os, stat
+
+import pandas as pd
+import pytest
+
+from addrnorm.io import output
+from addrnorm.io.output import atomic_file, write_csv_atomic
+
+def test_atomic_file_mode_follows_umask_without_touching_it(tmp_path, monkeypatch):
+    def no_umask(mask):
+        raise AssertionError("os.umask is process-wide and must not be called per file")
+    monkeypatch.setattr(os, "umask", no_umask)
+    path = tmp_path / "out.bin"
+    with atomic_file(str(path)) as f:
+        f.write(b"data")
+    assert path.read_bytes() == b"data"
+    if hasattr(os, "fchmod"):
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o666 & ~output._UMASK
+
+def test_umask_read_matches_process_umask():
+    mask = os.umask(0o022)
+    os.umask(mask)
+    assert output._read_umask() == mask
+
+def test_failed_write_leaves_no_file(tmp_path):
+    path = tmp_path / "out.csv"
+    with pytest.raises(RuntimeError):
+        with atomic_file(str(path)) as f:
+            f.write(b"partial")
+            raise RuntimeError("boom")
+    assert os.listdir(tmp_path) == []
+
+def test_gzip_output_round_trip(tmp_path):
+    df = pd.DataFrame({"a": ["1", "2", "3"], "b": ["x", "", "z"]})
+    path = tmp_path / "out.csv.gz"
+    write_csv_atomic(df, str(path), chunk_rows=2)  # два gzip-члена
+    with gzip.open(path, "rb") as f:
+        assert f.read() == df.to_csv(index=False).encode("utf-8")
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import gzip, io
+
+import pytest
+
+from addrnorm.io.reader import _PrefixedStream, detect_compression, detect_encoding, read_csv_any
+
+zstandard = pytest.importorskip("zstandard")
+
+CSV = "id,address,zip,locality,note\n1,Тверская ул. 1,125009,Москва,x\n2,\"Main St, 5\",10001,New York,y\n"
+
+class Upload(io.BytesIO):
+    """Как streamlit UploadedFile: бинарный буфер с именем."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+class OneWay(io.RawIOBase):
+    """Поток без seek (сокет, pipe)."""
+
+    def __init__(self, data: bytes):
+        self._buf = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._buf.read(len(b))
+        b[: len(chunk)] = chunk
+        return len(chunk)
+
+def _zstd(data: bytes, frames: int = 1) -> bytes:
+    cctx = zstandard.ZstdCompressor()
+    step = -(-len(data) // frames)
+    return b"".join(cctx.compress(data[i:i + step]) for i in range(0, len(data), step))
+
+@pytest.mark.parametrize("sample, expected", [
+    (b"\xef\xbb\xbfzip,city\n", "utf-8-sig"),
+    ("zip,city\n1,Köln\n".encode("utf-8"), "utf-8"),
+    ("Москва".encode("utf-8")[:-1], "utf-8"),  # многобайтовый символ обрезан границей префикса
+    ("город,улица\nМосква,Тверская\nЁлки".encode("cp1251"), "cp1251"),
+    ("city\nKöln\nSão Paulo\n".encode("latin-1"), "latin-1"),
+    (b"\xff\xfe\x80", "latin-1"),
+    (b"", "utf-8"),
+])
+def test_detect_encoding(sample, expected):
+    assert detect_encoding(sample) == expected
+
+@pytest.mark.parametrize("head, name, expected", [
+    (gzip.compress(b"x")[:4], None, "gzip"),
+    (b"\x28\xb5\x2f\xfd", "plain.csv", "zstd"),  # сигнатура важнее расширения
+    (b"id,a", "in.csv.gz", "gzip"),
+    (b"id,a", "IN.CSV.ZST", "zstd"),
+    (b"id,a", "in.csv.zstd", "zstd"),
+    (b"id,a", "in.csv", None),
+    (b"id,a", None, None),
+])
+def test_detect_compression(head, name, expected):
+    assert detect_compression(head, name) == expected
+
+def test_prefixed_stream_small_reads():
+    s = io.BufferedReader(_PrefixedStream(b"abc", io.BytesIO(b"defgh")), buffer_size=2)
+    assert [s.read(2) for _ in range(5)] == [b"ab", b"cd", b"ef", b"gh", b""]
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "cp1251"])
+@pytest.mark.parametrize("engine", ["pyarrow", "c"])
+def test_read_encodings(tmp_path, encoding, engine):
+    path = tmp_path / "in.csv"
+    path.write_bytes(CSV.encode(encoding))
+    df = read_csv_any(str(path), engine=engine)
+    assert list(df.columns) == ["id", "address", "zip", "locality", "note"]  # без BOM в имени колонки
+    assert df["locality"].tolist() == ["Москва", "New York"]
+    assert df["address"].tolist()[1] == "Main St, 5"
+    assert str(df["zip"].dtype) == "string" and df["zip"].tolist()[0] == "125009"
+
+def test_read_latin1(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_bytes("zip,locality\n50667,Köln\n".encode("latin-1"))
+    assert read_csv_any(str(path))["locality"].tolist() == ["Köln"]
+
+@pytest.mark.parametrize("frames", [1, 3])
+def test_read_zstd(tmp_path, frames):
+    data = _zstd(CSV.encode("utf-8"), frames)
+    path = tmp_path / "in.csv.zst"
+    path.write_bytes(data)
+    assert read_csv_any(str(path))["locality"].tolist() == ["Москва", "New York"]
+    # буфер без имени: по сигнатуре
+    assert read_csv_any(io.BytesIO(data))["zip"].tolist() == ["125009", "10001"]
+
+@pytest.mark.parametrize("compress", [None, "gzip", "zstd"])
+def test_read_uploaded_file(compress):
+    raw = CSV.encode("cp1251")
+    data = {"gzip": gzip.compress, "zstd": _zstd}.get(compress, lambda b: b)(raw)
+    up = Upload(data, "upload.csv" + {"gzip": ".gz", "zstd": ".zst"}.get(compress, ""))
+    df = read_csv_any(up)
+    assert df["locality"].tolist() == ["Москва", "New York"]
+    assert read_csv_any(OneWay(data))["locality"].tolist() == ["Москва", "New York"]
+
+def test_address_only_prunes_columns(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text(CSV, encoding="utf-8")
+    for engine in ("pyarrow", "c"):
+        df = read_csv_any(str(path), address_only=True, engine=engine)
+        assert sorted(df.columns) == ["address", "locality", "zip"]
+    assert list(read_csv_any(str(path), address_only=True, usecols=["id"]).columns) == ["id"]
+    # ни одной адресной колонки — читаем всё
+    path.write_text("id,note\n1,x\n", encoding="utf-8")
+    assert list(read_csv_any(str(path), address_only=True).columns) == ["id", "note"]
+
+def _bad_tail() -> bytes:
+    # первые 64 КБ — ASCII (выбрана utf-8), байт cp1251 — дальше префикса
+    return b"address,zip\n" + b"Main St 1,10001\n" * 5000 + b"Caf\xe9,75001\n"
+
+def test_pyarrow_falls_back_to_c(tmp_path):
+    data = _bad_tail()
+    path = tmp_path / "in.csv"
+    path.write_bytes(data)
+    df = read_csv_any(str(path), engine="pyarrow")
+    assert len(df) == 5001 and df["address"].iloc[-1] == "Caf�"
+    buf = io.BytesIO(b"junk" + data)
+    buf.seek(4)
+    df = read_csv_any(buf, engine="pyarrow")  # перечитывается с исходной позиции буфера
+    assert len(df) == 5001 and df["zip"].iloc[-1] == "75001"
+
+def test_unseekable_source_cannot_fall_back():
+    with pytest.raises(UnicodeDecodeError):
+        read_csv_any(OneWay(_bad_tail()), engine="pyarrow")
+    assert read_csv_any(OneWay(_bad_tail()), engine="c")["address"].iloc[-1] == "Caf�"
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+
+from addrnorm.io.writer import process_dataframe
+from addrnorm.libpostal.router import DEFAULT_THRESHOLDS, parse_thresholds
+from addrnorm.qa.dryrun import estimate_dataframe
+
+def test_parse_thresholds():
+    assert parse_thresholds(None) is None
+    assert parse_thresholds("") == parse_thresholds("default") == DEFAULT_THRESHOLDS
+    assert parse_thresholds("zip=1, country=0.5")["country"] == 0.5
+    for bad in ("zip", "zip=x", "house=1"):
+        with pytest.raises(ValueError):
+            parse_thresholds(bad)
+
+def test_bad_gate_ignored_without_libpostal(sample_df):
+    plain, _ = process_dataframe(sample_df, output_mode="extended")
+    out, _ = process_dataframe(sample_df, output_mode="extended", libpostal_thresholds="zip=oops")
+    assert out.equals(plain)
+    with pytest.raises(ValueError):
+        process_dataframe(sample_df, use_libpostal=True, libpostal_thresholds="zip=oops")
+
+def test_gate_routes_only_low_confidence_rows(sample_df, stub_libpostal):
+    stats: dict = {}
+    process_dataframe(sample_df, use_libpostal=True, libpostal_thresholds="default", stats=stats)
+    assert 0 < stats["libpostal_routed_rows"] < len(sample_df)
+    all_rows: dict = {}
+    process_dataframe(sample_df, use_libpostal=True, stats=all_rows)
+    assert all_rows["libpostal_routed_rows"] == len(sample_df)
+    assert stats["libpostal_calls"] + stats["libpostal_calls_avoided"] == all_rows["libpostal_calls"]
+
+def test_estimate_dataframe_positional_args_unchanged(sample_df):
+    # seed, memory_target_mb, workers — на прежних позициях; libpostal_thresholds добавлен в конец
+    rep = estimate_dataframe(sample_df, "extended", False, "http://localhost:8080", 100, 0, 64.0, 2)
+    assert rep.sample_rows <= len(sample_df) and max(rep.est_runtime_by_workers) == 2
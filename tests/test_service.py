@@ -0,0 +1,201 @@
+from __future__ import annotations
+import http.client, json, threading, time
+
+import pytest
+
+from addrnorm.service import batcher as batcher_mod
+from addrnorm.service.batcher import Metrics, MicroBatcher, QueueFull, process_records
+from addrnorm.service.server import NormalizeService, make_server
+
+REC_A = {"country": "US", "zip": "10001", "locality": "New York", "street": "5th Ave 1"}
+REC_B = {"country": "DE", "zip": "10115", "locality": "Berlin", "street": "Hauptstr. 2"}
+
+class _Recorder:
+    """process_fn для MicroBatcher: запоминает пакеты, может держать обработку до release."""
+
+    def __init__(self, block: bool = False):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, recs):
+        self.batches.append(list(recs))
+        self.started.set()
+        self.release.wait(5)
+        return [dict(r, seen=True) for r in recs]
+
+@pytest.fixture
+def make_batcher():
+    made = []
+
+    def make(fn, **kw):
+        b = MicroBatcher(fn, **kw)
+        made.append(b)
+        return b
+    yield make
+    for b in made:
+        b.close()
+
+@pytest.fixture
+def service():
+    svc = NormalizeService(request_timeout_ms=300)
+    yield svc
+    svc.close()
+
+def _blocked_batcher(svc, **kw) -> _Recorder:
+    """Подменяет батчер сервиса на тот, что держит обработку пакета до rec.release."""
+    svc.batcher.close()
+    rec = _Recorder(block=True)
+    svc.batcher = MicroBatcher(rec, metrics=svc.metrics, **{"max_batch_size": 1, "max_wait_ms": 0, **kw})
+    return rec
+
+def _record_futures(svc, monkeypatch) -> list:
+    futs = []
+    submit = svc.batcher.submit
+
+    def recording(r):
+        f = submit(r)
+        futs.append(f)
+        return f
+    monkeypatch.setattr(svc.batcher, "submit", recording)
+    return futs
+
+def test_batch_flushes_on_size(make_batcher):
+    rec = _Recorder()
+    b = make_batcher(rec, max_batch_size=3, max_wait_ms=2000)
+    t0 = time.monotonic()
+    futs = [b.submit({"i": i}) for i in range(3)]
+    assert [f.result(timeout=1)["i"] for f in futs] == [0, 1, 2]
+    assert time.monotonic() - t0 < 1.5  # не ждали окна
+    assert [len(x) for x in rec.batches] == [3]
+
+def test_batch_flushes_on_window(make_batcher):
+    rec = _Recorder()
+    b = make_batcher(rec, max_batch_size=100, max_wait_ms=100)
+    t0 = time.monotonic()
+    futs = [b.submit({"i": i}) for i in range(2)]
+    assert [f.result(timeout=2)["i"] for f in futs] == [0, 1]
+    assert time.monotonic() - t0 >= 0.09
+    assert [len(x) for x in rec.batches] == [2]
+
+def test_duplicates_normalized_once(monkeypatch):
+    seen = []
+    real = batcher_mod.process_dataframe
+
+    def recording(df, **kw):
+        seen.append(len(df))
+        return real(df, **kw)
+    monkeypatch.setattr(batcher_mod, "process_dataframe", recording)
+    recs = [dict(REC_A, id=1), REC_B, dict(REC_A, id=3)]
+    out = process_records(recs)
+    assert seen == [2]
+    assert [r.get("id") for r in out] == [1, None, 3]  # поля запроса возвращаются своей записи
+    assert out[0]["addr_norm"] == out[2]["addr_norm"] != out[1]["addr_norm"]
+    assert out == [dict(r, country_norm=o["country_norm"], addr_norm=o["addr_norm"]) for r, o in zip(recs, out)]
+    ext = process_records(recs, output_mode="extended")
+    assert seen == [2, 2] and ext[0] == ext[2] != ext[1]
+    assert process_records([]) == []
+
+def test_duplicates_in_batcher_get_own_results(make_batcher):
+    metrics = Metrics()
+    b = make_batcher(process_records, max_batch_size=3, max_wait_ms=2000, metrics=metrics)
+    futs = [b.submit(r) for r in (dict(REC_A, id=1), REC_B, dict(REC_A, id=3))]
+    res = [f.result(timeout=10) for f in futs]
+    assert [r.get("id") for r in res] == [1, None, 3]
+    assert res[0]["addr_norm"] == res[2]["addr_norm"]
+    assert (metrics.batches, metrics.batched_rows, metrics.unique_rows) == (1, 3, 2)
+
+def test_timeout_returns_504_and_cancels(service, monkeypatch):
+    rec = _blocked_batcher(service)
+    futs = _record_futures(service, monkeypatch)
+    code, body = service.normalize([{"i": 0}, {"i": 1}, {"i": 2}])
+    assert code == 504 and body == {"error": "timed out"}
+    assert futs[0].running()  # уже в обработке — отменить нельзя
+    assert all(f.cancelled() for f in futs[1:])
+    rec.release.set()
+    assert futs[0].result(timeout=2)["i"] == 0
+    time.sleep(0.3)
+    assert [[r["i"] for r in x] for x in rec.batches] == [[0]]  # отменённые не обрабатывались
+    snap = service.metrics.snapshot()
+    assert (snap["timeouts"], snap["requests"], snap["errors"]) == (1, 1, 1)
+
+def test_full_queue_returns_503_and_cancels(service, monkeypatch):
+    rec = _blocked_batcher(service, max_queue=2)
+    busy = service.batcher.submit({"i": "busy"})
+    assert rec.started.wait(2)  # батчер занят, очередь пуста
+    futs = _record_futures(service, monkeypatch)
+    code, body = service.normalize([{"i": 0}, {"i": 1}, {"i": 2}])
+    assert code == 503 and body == {"error": "queue is full"}
+    assert len(futs) == 2 and all(f.cancelled() for f in futs)
+    assert service.metrics.rejected == 1
+    rec.release.set()
+    busy.result(timeout=2)
+    time.sleep(0.3)
+    assert [[r["i"] for r in x] for x in rec.batches] == [["busy"]]
+
+def test_submit_raises_on_full_queue(make_batcher):
+    rec = _Recorder(block=True)
+    b = make_batcher(rec, max_batch_size=1, max_wait_ms=0, max_queue=1)
+    b.submit({"i": 0})
+    assert rec.started.wait(2)
+    b.submit({"i": 1})
+    with pytest.raises(QueueFull):
+        b.submit({"i": 2})
+    assert b.metrics.rejected == 1
+    rec.release.set()
+
+@pytest.mark.parametrize("payload", [[], "text", 5, None, [REC_A, 3], [[REC_A]]])
+def test_bad_payload_returns_400(service, payload):
+    code, body = service.normalize(payload)
+    assert code == 400 and "error" in body
+    assert service.metrics.requests == 0
+
+def test_single_and_list_payloads(service):
+    code, one = service.normalize(REC_A)
+    assert code == 200 and isinstance(one, dict) and one["addr_norm"]
+    code, many = service.normalize([REC_A, REC_B])
+    assert code == 200 and [r["addr_norm"] for r in many][0] == one["addr_norm"]
+    snap = service.metrics_snapshot()
+    assert (snap["requests"], snap["errors"], snap["timeouts"], snap["rejected"]) == (2, 0, 0, 0)
+    assert snap["queue_depth"] == 0 and snap["config"]["output_mode"] == "addr-only"
+
+def test_metrics_counters():
+    m = Metrics()
+    for ms in (10, 20, 30, 40):
+        m.observe_request(ms / 1000)
+    m.observe_request(0.5, ok=False)
+    m.observe_batch(4, 3)
+    m.observe_batch(6, 3)
+    m.inc("timeouts")
+    m.inc("rejected")
+    m.inc("rejected")
+    snap = m.snapshot()
+    assert (snap["requests"], snap["errors"], snap["timeouts"], snap["rejected"]) == (5, 1, 1, 2)
+    assert (snap["batches"], snap["avg_batch_size"], snap["dedup_ratio"]) == (2, 5.0, 0.4)
+    assert snap["latency_ms"] == {"p50": 30.0, "p90": 500.0, "p99": 500.0, "max": 500.0}
+    assert snap["throughput_rps"] > 0
+    empty = Metrics().snapshot()
+    assert (empty["avg_batch_size"], empty["dedup_ratio"], empty["latency_ms"]["max"]) == (0.0, 0.0, 0.0)
+
+def test_http_roundtrip(service):
+    httpd = make_server(service, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+
+        def call(method, path, body=None):
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read())
+        assert call("POST", "/normalize", json.dumps(REC_A))[0] == 200
+        assert call("POST", "/normalize", "{not json")[0] == 400
+        assert call("POST", "/normalize", "[]")[0] == 400
+        assert call("GET", "/nope")[0] == 404
+        status, snap = call("GET", "/metrics")
+        assert status == 200 and snap["requests"] == 1
+        assert call("GET", "/health")[1]["status"] == "ok"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
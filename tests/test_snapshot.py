@@ -0,0 +1,106 @@
+from __future__ import annotations
+import os, pickle
+
+import pytest
+
+from addrnorm.rules import registry, snapshot
+
+def _bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+def _no_yaml(monkeypatch):
+    """Любое чтение YAML — ошибка теста: профиль обязан прийти из снапшота."""
+    def boom(path):
+        raise AssertionError(f"YAML read: {path}")
+    monkeypatch.setattr(registry, "_safe_yaml", boom)
+
+def test_snapshot_written_and_reused(tmp_profile, monkeypatch):
+    snap = snapshot.snapshot_path(str(tmp_profile / registry.FILENAME))
+    assert os.path.isfile(snap)
+    fp = registry.get_profile_fingerprint()
+    _no_yaml(monkeypatch)
+    registry.reload_profile()
+    assert registry.get_country_index()["US"] == "United States"
+    assert registry.get_profile_fingerprint() == fp
+
+def test_touch_without_edit_keeps_snapshot(tmp_profile, monkeypatch):
+    _bump_mtime(tmp_profile / registry.FILENAME)
+    _bump_mtime(tmp_profile / registry.CONFIG_FILENAME)
+    _no_yaml(monkeypatch)
+    registry.reload_profile()
+    assert registry.profile_loaded()
+
+def test_edited_profile_invalidates(tmp_profile):
+    fp = registry.get_profile_fingerprint()
+    path = tmp_profile / registry.FILENAME
+    path.write_text(path.read_text(encoding="utf-8").replace("Germany", "Deutschland"), encoding="utf-8")
+    _bump_mtime(path)
+    registry.reload_profile()
+    assert registry.get_country_index()["DE"] == "Deutschland"
+    assert registry.get_profile_fingerprint() != fp
+
+def test_same_size_edit_invalidates(tmp_profile):
+    # размер тот же, mtime другой -> решает sha256
+    path = tmp_profile / registry.FILENAME
+    path.write_text(path.read_text(encoding="utf-8").replace("Germany", "Germanx"), encoding="utf-8")
+    _bump_mtime(path)
+    registry.reload_profile()
+    assert registry.get_country_index()["DE"] == "Germanx"
+
+def test_edited_config_invalidates(tmp_profile):
+    assert registry.get_templates()["default"][1] == ", "
+    path = tmp_profile / registry.CONFIG_FILENAME
+    path.write_text(path.read_text(encoding="utf-8") + '  separator: " | "\n', encoding="utf-8")
+    _bump_mtime(path)
+    registry.reload_profile()
+    assert registry.get_templates()["default"][1] == " | "
+
+def test_added_config_invalidates(tmp_profile):
+    path = tmp_profile / registry.CONFIG_FILENAME
+    path.unlink()
+    registry.reload_profile()
+    assert registry.get_templates()["default"] is None
+    path.write_text('templates:\n  default_order: [zip, country]\n', encoding="utf-8")
+    registry.reload_profile()
+    assert registry.get_templates()["default"][0] == (("zip",), ("country",))
+
+@pytest.mark.parametrize("content", [b"", b"not a pickle", b"\x80\x05\x95\xff\xff"])
+def test_corrupt_snapshot_falls_back(tmp_profile, content):
+    snap = snapshot.snapshot_path(str(tmp_profile / registry.FILENAME))
+    with open(snap, "wb") as f:
+        f.write(content)
+    registry.reload_profile()
+    assert registry.get_country_index()["US"] == "United States"
+    # снапшот пересобран и снова читается
+    assert snapshot.load(str(tmp_profile / registry.FILENAME), _sources(tmp_profile)) is not None
+
+def test_truncated_snapshot_falls_back(tmp_profile):
+    snap = snapshot.snapshot_path(str(tmp_profile / registry.FILENAME))
+    with open(snap, "rb") as f:
+        data = f.read()
+    with open(snap, "wb") as f:
+        f.write(data[: len(data) // 2])
+    registry.reload_profile()
+    assert registry.get_country_index()["DE"] == "Germany"
+    assert snapshot.load(str(tmp_profile / registry.FILENAME), _sources(tmp_profile)) is not None
+
+def test_snapshot_of_other_version_ignored(tmp_profile):
+    profile = str(tmp_profile / registry.FILENAME)
+    cached = snapshot.load(profile, _sources(tmp_profile))
+    payload = dict(cached["payload"], country_index={"US": "stale"})
+    snapshot.save(profile, cached["stamps"], payload)
+    registry.reload_profile()
+    assert registry.get_country_index()["US"] == "stale"  # актуальный снапшот действительно используется
+    snap = snapshot.snapshot_path(profile)
+    with open(snap, "rb") as f:
+        obj = pickle.load(f)
+    obj["version"] = snapshot.SNAPSHOT_VERSION + 1
+    with open(snap, "wb") as f:
+        pickle.dump(obj, f)
+    registry.reload_profile()
+    assert registry.get_country_index()["US"] == "United States"
+
+def _sources(cfg_dir):
+    profile = str(cfg_dir / registry.FILENAME)
+    return [profile, registry._street_abbr_path(profile), registry._config_path(profile)]
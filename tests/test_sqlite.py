@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from addrnorm.io import sqlite as sqlite_mod
+from addrnorm.io.sqlite import SqliteSink, SqliteSource, connect, row_hashes, sync_table
+from addrnorm.io.writer import process_dataframe
+
+COLS = ["address", "zip", "country", "region", "district", "locality", "street"]
+
+@pytest.fixture
+def db(tmp_path, sample_df):
+    """Таблица addr с дырявыми rowid (шаг 3, каждая пятая строка удалена) и лишней колонкой note."""
+    conn = connect(str(tmp_path / "db.sqlite"))
+    conn.execute(f"CREATE TABLE addr (id INTEGER PRIMARY KEY, {', '.join(COLS)}, note TEXT)")
+    rows = [(1 + 3 * i, *(r[c] or None for c in COLS), "n") for i, (_, r) in enumerate(sample_df.iterrows())]
+    with conn:
+        conn.executemany(f"INSERT INTO addr VALUES ({', '.join('?' * (len(COLS) + 2))})", rows)
+        conn.execute("DELETE FROM addr WHERE (id - 1) % 15 = 0")
+    yield conn
+    conn.close()
+
+def _ids(conn):
+    return [r[0] for r in conn.execute("SELECT id FROM addr ORDER BY id")]
+
+def _sink(conn, table="addr_norm"):
+    return pd.read_sql_query(f"SELECT * FROM {table} ORDER BY id", conn)
+
+@pytest.mark.parametrize("batch_size", [1, 7, 44, 1000])
+def test_keyset_batches_cover_table(db, batch_size):
+    src = SqliteSource(db, "addr")
+    assert src.columns == COLS  # note не читается, ключ — отдельно
+    batches = list(src.iter_batches(batch_size))
+    keys = [k for ks, _ in batches for k in ks]
+    assert keys == _ids(db) and len(keys) == 44
+    assert all(len(ks) == len(df) <= batch_size for ks, df in batches)
+    assert all(str(df[c].dtype) == "string" for _, df in batches for c in COLS)
+    # NULL -> ""
+    assert not any(df.isna().any().any() for _, df in batches)
+    after = keys[10]
+    assert [k for ks, _ in src.iter_batches(batch_size, after=after) for k in ks] == keys[11:]
+
+def test_source_validates_table(db):
+    with pytest.raises(ValueError):
+        SqliteSource(db, "nope")
+    with pytest.raises(ValueError):
+        SqliteSource(db, "addr", key="rowkey")
+
+def test_upsert_overwrites(db):
+    sink = SqliteSink(db, "out")
+    sink.upsert([1, 2], ["h1", "h2"], pd.DataFrame({"country_norm": ["A", "B"], "addr_norm": ["x", None]}))
+    sink.upsert([2, 3], ["h2b", "h3"], pd.DataFrame({"country_norm": ["B2", "C"], "addr_norm": ["y", "z"]}))
+    got = _sink(db, "out")
+    assert got[["id", "src_hash", "country_norm", "addr_norm"]].values.tolist() == [
+        [1, "h1", "A", "x"], [2, "h2b", "B2", "y"], [3, "h3", "C", "z"]]
+    assert sink.hashes_between(2, 3) == {2: "h2b", 3: "h3"}
+    assert sink.hashes_between(4, 9) == {}
+
+def test_row_hashes():
+    df = pd.DataFrame({"a": ["x", "", None], "b": ["y", "z", "z"]}, dtype="string")
+    h = row_hashes(df, ["a", "b"])
+    assert len(set(h)) == 2 and h[1] == h[2]  # NA и "" — одно и то же
+    assert row_hashes(df, ["a", "b"], salt="s") != h
+    assert row_hashes(df, ["b", "a"]) != h
+    # разделитель: ("xy", "") и ("x", "y") различаются
+    two = pd.DataFrame({"a": ["xy", "x"], "b": ["", "y"]}, dtype="string")
+    assert len(set(row_hashes(two, ["a", "b"]))) == 2
+
+def test_sync_skips_unchanged_rows(db):
+    first = sync_table(db, "addr", batch_size=10)
+    assert (first.scanned, first.processed, first.skipped, first.batches) == (44, 44, 0, 5)
+    got = _sink(db)
+    src = pd.concat([df for _, df in SqliteSource(db, "addr").iter_batches(1000)], ignore_index=True)
+    expected, _ = process_dataframe(src)
+    assert got["id"].tolist() == _ids(db)
+    assert got["addr_norm"].tolist() == expected["addr_norm"].fillna("").tolist()
+
+    again = sync_table(db, "addr", batch_size=10)
+    assert (again.processed, again.skipped) == (0, 44)
+
+    key = _ids(db)[20]
+    with db:
+        db.execute("UPDATE addr SET street = 'Completely New St 1' WHERE id = ?", (key,))
+        db.execute("UPDATE addr SET note = 'ignored' WHERE id = ?", (_ids(db)[3],))  # не адресная колонка
+    edited = sync_table(db, "addr", batch_size=10)
+    assert (edited.processed, edited.skipped) == (1, 43)
+    row = _sink(db).set_index("id").loc[key]
+    assert "Completely New St 1".lower() in row["addr_norm"].lower()
+
+def test_sync_force_reprocesses(db):
+    sync_table(db, "addr", batch_size=16)
+    res = sync_table(db, "addr", batch_size=16, force=True)
+    assert (res.processed, res.skipped) == (44, 0)
+    assert len(_sink(db)) == 44
+
+def test_sync_mode_change_invalidates(db):
+    sync_table(db, "addr")
+    res = sync_table(db, "addr", output_mode="extended")
+    assert res.processed == 44
+    got = _sink(db)
+    assert {"zip_norm", "locality_norm", "addr_norm"} <= set(got.columns)  # колонки добавлены в ту же таблицу
+    assert got["zip_norm"].notna().all()
+    assert sync_table(db, "addr", output_mode="extended").processed == 0
+
+def test_sync_profile_change_invalidates(db, monkeypatch):
+    sync_table(db, "addr")
+    monkeypatch.setattr(sqlite_mod, "get_profile_fingerprint", lambda: "another-profile")
+    assert sync_table(db, "addr").processed == 44
+    assert sync_table(db, "addr").processed == 0
+
+def test_sync_fields_sink(db):
+    res = sync_table(db, "addr", sink_table="zips", fields=["zip_norm", "zip_valid"])
+    got = _sink(db, "zips")
+    assert res.processed == 44
+    assert list(got.columns) == ["id", "src_hash", "zip_norm", "zip_valid", "updated_at"]
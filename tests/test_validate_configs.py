@@ -0,0 +1,53 @@
+from __future__ import annotations
+import importlib.util, os, re
+
+import pytest
+import yaml
+
+from addrnorm.parse.locality import _PARENS_RE
+from addrnorm.rules import registry
+from addrnorm.rules.regex_lint import check_pattern, lint_pattern
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _validator():
+    spec = importlib.util.spec_from_file_location("validate_configs", os.path.join(ROOT, "scripts", "validate_configs.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+@pytest.mark.parametrize("pattern", [r"^(a+)+$", r"^(\d+\s?)+$"])
+def test_lint_flags_nested_quantifiers(pattern):
+    assert any(i.severity == "danger" and i.code == "nested-quantifier" for i in lint_pattern(pattern))
+
+def test_locality_parens_pattern_passes():
+    assert lint_pattern(_PARENS_RE.pattern, _PARENS_RE.flags & ~re.UNICODE) == []
+    rep = check_pattern("locality._PARENS_RE", _PARENS_RE.pattern, _PARENS_RE.flags & ~re.UNICODE, budget_ms=50)
+    assert not rep.failed
+
+def test_load_yaml_is_strict(tmp_path):
+    bad = tmp_path / "bad.yaml"
+    bad.write_text("countries:\n  US: {patterns: [\n", encoding="utf-8")
+    with pytest.raises(yaml.YAMLError):
+        registry.load_yaml(str(bad))
+    lst = tmp_path / "list.yaml"
+    lst.write_text("- a\n- b\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        registry.load_yaml(str(lst))
+    empty = tmp_path / "empty.yaml"
+    empty.write_text("", encoding="utf-8")
+    assert registry.load_yaml(str(empty)) == {}
+
+def test_validator_fails_on_broken_zip_patterns(tmp_profile, capsys):
+    (tmp_profile / "zip_patterns.yaml").write_text("countries:\n  US: {patterns: [\n", encoding="utf-8")
+    assert _validator().main([]) == 1
+    assert "FAIL zip_patterns.yaml" in capsys.readouterr().out
+
+def test_validator_fails_on_backtracking_zip_pattern(tmp_profile, capsys):
+    (tmp_profile / "zip_patterns.yaml").write_text(
+        "countries:\n  US:\n    patterns: ['^(\\d+\\s?)+$']\n", encoding="utf-8")
+    assert _validator().main(["--strict"]) == 1
+    assert "FAIL zip_patterns.yaml.US[0]" in capsys.readouterr().out
+
+def test_validator_passes_on_clean_profile(tmp_profile):
+    assert _validator().main([]) == 0
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import gzip, json, os
+
+import pandas as pd
+import pytest
+
+from addrnorm.service.watcher import DONE, FAILED, PROCESSING, STATUS_FILE, FolderWatcher
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # чекпоинты — в tmp/data/checkpoints
+    inp, out = tmp_path / "in", tmp_path / "out"
+    inp.mkdir()
+    return inp, out
+
+@pytest.fixture
+def make_watcher(dirs):
+    made = []
+
+    def make(**kw):
+        inp, out = dirs
+        # spawn: fork из потока-диспетчера под pytest может унести в воркер захваченный замок вывода
+        kw = {"workers": 1, "max_queue": 10, "poll_interval_s": 0.02, "status_interval_s": 60.0,
+              "mp_context": "spawn", "chunk_rows": 20, **kw}
+        w = FolderWatcher(str(inp), str(out), **kw)
+        made.append(w)
+        return w
+    yield make
+    for w in made:
+        w.stop()
+        w.close()
+
+def _put(path, df, gz=False):
+    data = df.to_csv(index=False).encode("utf-8")
+    with (gzip.open if gz else open)(path, "wb") as f:
+        f.write(data)
+
+def test_once_processes_files_with_same_stem(dirs, make_watcher, sample_df):
+    inp, out = dirs
+    _put(inp / "a.csv", sample_df)
+    _put(inp / "a.csv.gz", sample_df, gz=True)
+    w = make_watcher(workers=2).start()
+    w.run(once=True)
+    w.close()
+    results = sorted(n for n in os.listdir(out) if n.endswith(".csv"))
+    assert results == ["a_norm.csv", "a_norm_1.csv"]
+    for name in results:
+        assert len(pd.read_csv(out / name, dtype="string")) == len(sample_df)
+        assert os.path.isfile(out / name.replace(".csv", ".examples.txt"))
+    assert not [n for n in os.listdir(out) if n.endswith(".part")]
+    assert sorted(os.listdir(inp / DONE)) == ["a.csv", "a.csv.gz"]
+    assert os.listdir(inp / PROCESSING) == []
+    status = json.loads((out / STATUS_FILE).read_text(encoding="utf-8"))
+    assert (status["files_done"], status["files_failed"]) == (2, 0)
+
+def test_claim_is_exclusive(dirs, make_watcher, sample_df):
+    inp, _ = dirs
+    names = [f"f{i}.csv" for i in range(5)]
+    for n in names:
+        _put(inp / n, sample_df.head(3))
+    w1, w2 = make_watcher(), make_watcher()
+    for n in names:
+        got = [w1._claim(n), w2._claim(n)]
+        assert sum(p is not None for p in got) == 1
+    assert sorted(os.listdir(inp / PROCESSING)) == names
+    assert not [n for n in os.listdir(inp) if n.endswith(".csv")]
+
+def test_output_names_reserved_across_watchers(dirs, make_watcher):
+    inp, out = dirs
+    w1, w2 = make_watcher(), make_watcher()
+    paths = [w1._reserve_output(str(inp / PROCESSING / "a.csv"), False)[0],
+             w2._reserve_output(str(inp / PROCESSING / "a.csv.gz"), False)[0],
+             w1._reserve_output(str(inp / PROCESSING / "a.csv.zst"), False)[0]]
+    assert [os.path.basename(p) for p in paths] == ["a_norm.csv", "a_norm_1.csv", "a_norm_2.csv"]
+    assert all(os.path.isfile(p + ".part") for p in paths)
+
+def test_recover_does_not_block_on_full_queue(dirs, make_watcher, sample_df):
+    inp, out = dirs
+    idle = make_watcher(max_queue=1)
+    names = [f"r{i}.csv" for i in range(4)]
+    for n in names:
+        _put(inp / PROCESSING / n, sample_df.head(5))
+    idle._recover()  # без потоков-диспетчеров: блокирующий put здесь бы повис
+    assert idle.jobs.qsize() == 1 and len(idle._recovery) == 3
+    idle.close()  # не начатые файлы остаются в processing
+    w = make_watcher(max_queue=1).start()
+    w.run(once=True)
+    w.close()
+    assert sorted(os.listdir(inp / DONE)) == names
+    assert sorted(n for n in os.listdir(out) if n.endswith(".csv")) == [f"r{i}_norm.csv" for i in range(4)]
+
+def _crash_in_processing(inp, out, df, monkeypatch):
+    """Файл в processing с чекпоинтом после первого чанка и недописанным big_norm.csv.part."""
+    from addrnorm.io import batch
+    src = inp / PROCESSING / "big.csv"
+    _put(src, df)
+    real = batch._write_state
+    calls = {"n": 0}
+
+    def write_state(ckpt_dir, state):
+        calls["n"] += 1
+        if calls["n"] > 1:
+            raise RuntimeError("crash")
+        real(ckpt_dir, state)
+    with monkeypatch.context() as m:
+        m.setattr(batch, "_write_state", write_state)
+        with pytest.raises(RuntimeError):
+            batch.run_batch(str(src), output_path=str(out / "big_norm.csv"), chunk_rows=20,
+                            checkpoint_dir=batch.checkpoint_dir_for(str(src), "addr-only"))
+    return src
+
+def test_recover_resumes_from_checkpoint(dirs, make_watcher, sample_df, monkeypatch):
+    inp, out = dirs
+    w = make_watcher()
+    _crash_in_processing(inp, out, sample_df, monkeypatch)
+    w.start()
+    w.run(once=True)
+    w.close()
+    assert os.listdir(inp / DONE) == ["big.csv"]
+    assert len(pd.read_csv(out / "big_norm.csv", dtype="string")) == len(sample_df)
+    assert not os.path.exists(out / "big_norm_1.csv")
+
+@pytest.mark.parametrize("changed", ["fields", "profile"])
+def test_recover_restarts_on_checkpoint_mismatch(dirs, make_watcher, sample_df, monkeypatch, request, changed):
+    inp, out = dirs
+    w = make_watcher(**({"fields": ["zip_norm"]} if changed == "fields" else {}))
+    src = _crash_in_processing(inp, out, sample_df, monkeypatch)
+    if changed == "profile":
+        request.getfixturevalue("tmp_profile")  # воркеры (spawn) получат другой профиль через окружение
+    w.start()
+    w.run(once=True)
+    w.close()
+    assert os.listdir(inp / DONE) == ["big.csv"] and not os.listdir(inp / FAILED)
+    res = pd.read_csv(out / "big_norm.csv", dtype="string")
+    assert len(res) == len(sample_df)
+    if changed == "fields":
+        assert list(res.columns) == ["zip_norm"]
+    assert sorted(os.listdir(out)) == ["big_norm.csv", "big_norm.examples.txt", STATUS_FILE]
+    from addrnorm.io.batch import checkpoint_dir_for
+    assert not os.path.exists(checkpoint_dir_for(str(src), "addr-only"))
+
+def test_failed_file_goes_to_failed(dirs, make_watcher, sample_df):
+    inp, out = dirs
+    (inp / "bad.csv.gz").write_bytes(b"not gzip at all")
+    _put(inp / "good.csv", sample_df.head(5))
+    w = make_watcher().start()
+    w.run(once=True)
+    w.close()
+    assert sorted(os.listdir(inp / FAILED)) == ["bad.csv.gz", "bad.csv.gz.error.txt"]
+    assert (inp / FAILED / "bad.csv.gz.error.txt").read_text(encoding="utf-8").strip()
+    assert os.listdir(inp / DONE) == ["good.csv"]
+    # недописанный результат не держит имя
+    assert sorted(os.listdir(out)) == ["good_norm.csv", "good_norm.examples.txt", STATUS_FILE]
+    assert w.status()["files_failed"] == 1
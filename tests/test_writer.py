@@ -0,0 +1,72 @@
+from __future__ import annotations
+import os
+
+import pandas as pd
+import pytest
+
+from addrnorm.io import writer
+from addrnorm.io.writer import FIELDS, field_plan, parse_fields, process_dataframe
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+def _changes_text(changes) -> str:
+    return "".join(k + "\n" + "\n".join(map(str, a.tolist())) + "\n" for k, (_, a) in changes.items())
+
+@pytest.mark.parametrize("mode", ["addr-only", "extended"])
+def test_default_output_matches_golden(sample_df, mode):
+    # golden_* получены конвейером до перехода на граф полей (тот же sample.csv)
+    out, changes = process_dataframe(sample_df, output_mode=mode)
+    with open(os.path.join(DATA_DIR, f"golden_{mode}.csv"), encoding="utf-8") as f:
+        assert out.to_csv(index=False) == f.read()
+    with open(os.path.join(DATA_DIR, f"golden_{mode}_changes.txt"), encoding="utf-8") as f:
+        assert _changes_text(changes) == f.read()
+
+@pytest.mark.parametrize("fields, plan", [
+    (["zip_norm"], ["country_in", "zip"]),
+    (["country_norm", "zip_norm"], ["country_in", "zip", "country"]),
+    (["zip_valid"], ["country_in", "zip", "country", "zip_valid"]),
+    (["street"], ["street"]),
+    (["district_norm", "street"], ["district", "street"]),
+    (["confidence"], ["country_in", "zip", "country", "zip_valid", "street", "locality", "confidence"]),
+    (["addr_norm"], ["country_in", "zip", "country", "region", "district", "locality", "street", "house", "assemble"]),
+])
+def test_field_plan(fields, plan):
+    assert field_plan(fields) == plan
+
+def test_field_plan_with_libpostal():
+    full = ["country_in", "zip", "country", "region", "district", "locality", "street", "house", "assemble"]
+    assert field_plan(["zip_norm"], use_libpostal=True) == full + ["libpostal"]
+    assert field_plan(["zip_norm"], use_libpostal=True, gated=True) == full + ["zip_valid", "confidence", "libpostal"]
+    # zip_valid libpostal не уточняет — граф тот же, что без него
+    assert field_plan(["zip_valid"], use_libpostal=True) == field_plan(["zip_valid"])
+
+def test_fields_compute_only_needed_stages(sample_df, monkeypatch):
+    def boom(*a, **kw):
+        raise AssertionError("stage must not run")
+    for name in ("normalize_region", "normalize_locality", "normalize_street", "assemble_columns"):
+        monkeypatch.setattr(writer, name, boom)
+    stats: dict = {}
+    out, changes = process_dataframe(sample_df, fields=["country_norm", "zip_norm", "zip_valid"], stats=stats)
+    assert list(out.columns) == ["country_norm", "zip_norm", "zip_valid"]
+    assert set(stats["stages"]) <= {"zip", "country", "output"}
+    assert set(changes) == {"country", "zip"}
+
+def test_fields_equal_full_run_columns(sample_df):
+    full, _ = process_dataframe(sample_df, output_mode="extended")
+    wanted = ["addr_norm", "zip_norm", "street", "region_norm"]
+    part, _ = process_dataframe(sample_df, fields=wanted)
+    pd.testing.assert_frame_equal(part, full[wanted])
+
+def test_all_fields_without_index(sample_df):
+    fields = [f for f in FIELDS if f != "zip_consistency"]
+    out, _ = process_dataframe(sample_df, fields=fields)
+    assert list(out.columns) == fields and len(out) == len(sample_df)
+    with pytest.raises(ValueError):
+        process_dataframe(sample_df, fields=["zip_consistency"])
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields("zip_norm, country_norm zip_norm") == ["zip_norm", "country_norm"]
+    assert parse_fields(" , ") is None
+    with pytest.raises(ValueError, match="zip"):
+        parse_fields("zip")